@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Asyncio HTTP Server
+Serves the calculator page, /calculate, /stats and the web_api routes from
+one event loop, with persistent HTTP/1.1 connections and pipelining, and
+timeouts that drop idle and slow (slowloris) clients
+"""
+
+import asyncio
+import contextvars
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from sessions import SESSION_HEADER, request_token
+from web_api import (JSON_TYPE, ROUTES, cache_stats, calculate_batch, calculation_response, handle, parse_body,
+                     parse_query, session_history)
+
+# A connection must deliver the next request's line and headers within this
+# many seconds of connecting or of the previous response. This is both the
+# keep-alive idle limit and the bound on a client dribbling out its headers.
+REQUEST_TIMEOUT = 15.0
+# Seconds allowed for reading a request body and for a client to accept a response
+BODY_TIMEOUT = 30.0
+WRITE_TIMEOUT = 30.0
+
+# Request line plus headers, and body, in bytes. Most bodies are small forms;
+# /matrix is sized for two of the largest linalg operands in the binary
+# matrix format and /statistics for web_api.MAX_VALUES numbers as text.
+# /calculate/batch has its own limit (--batch-max-bytes).
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = MAX_HEADER_BYTES
+BODY_LIMITS = {
+    '/matrix': 1 << 28,
+    '/statistics': 1 << 25,
+}
+
+# Pending connections the kernel queues before accept()
+BACKLOG = 1024
+
+# Buffered response bytes above which a connection waits for the client to read
+WRITE_HIGH_WATER = 1 << 16
+
+class RequestError(Exception):
+    """A request that cannot be framed; answered with `status`, then the connection closes"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _head(data):
+    """(method, target, version, {lowercase header name: value}) from a request head"""
+    lines = data.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise RequestError(400, f"Malformed request line {lines[0][:80]!r}") from None
+    if version not in ('HTTP/1.1', 'HTTP/1.0'):
+        raise RequestError(505, f"Unsupported protocol {version[:20]!r}")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, separator, value = line.partition(':')
+            if not separator:
+                raise RequestError(400, f"Malformed header {line[:80]!r}")
+            headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+def _content_length(headers, limit):
+    if 'transfer-encoding' in headers:
+        raise RequestError(501, "Chunked request bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError(400, "Invalid Content-Length") from None
+    if length < 0:
+        raise RequestError(400, "Invalid Content-Length")
+    if length > limit:
+        raise RequestError(413, f"Request bodies are limited to {limit} bytes")
+    return length
+
+
+def _keep_alive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        return 'close' not in connection
+    return 'keep-alive' in connection
+
+
+def _typed(status, content_type, body):
+    return status, [('Content-Type', content_type)], body
+
+
+def _json(status, payload):
+    return _typed(status, JSON_TYPE, json.dumps(payload).encode())
+
+
+def _response_head(status, headers, keep_alive):
+    head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    head += [f"{name}: {value}" for name, value in headers]
+    # As network_calculator sends on every response
+    head.append("Access-Control-Allow-Origin: *")
+    head.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    return ("\r\n".join(head) + "\r\n\r\n").encode('latin-1')
+
+
+def _response(status, headers, body, keep_alive):
+    """Response bytes from a status, [(header, value)] and the body"""
+    if status != 304:
+        headers = headers + [('Content-Length', len(body))]
+    return _response_head(status, headers, keep_alive) + body
+
+
+async def _drain(writer):
+    """Wait for the client to read once WRITE_HIGH_WATER bytes are buffered
+    (pipelined responses otherwise go out without a round trip each);
+    False if it does not read within WRITE_TIMEOUT or has gone away"""
+    if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+        try:
+            await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError):
+            return False
+    return True
+
+
+async def _stream(writer, status, headers, blocks, keep_alive, chunked):
+    """Write a response whose body is an async iterator of bytes blocks,
+    produced as it is sent; chunked framing for HTTP/1.1, otherwise the body
+    ends when the connection closes. Returns False if the connection failed."""
+    if chunked:
+        headers = headers + [('Transfer-Encoding', 'chunked')]
+    writer.write(_response_head(status, headers, keep_alive))
+    try:
+        async for block in blocks:
+            writer.write(b"%x\r\n%b\r\n" % (len(block), block) if chunked else block)
+            if not await _drain(writer):
+                return False
+    except Exception:
+        # Too late for an error status; closing mid-body tells the client it is incomplete
+        traceback.print_exc()
+        return False
+    finally:
+        await blocks.aclose()
+    if chunked:
+        writer.write(b"0\r\n\r\n")
+    return True
+
+
+class AsyncCalculatorServer:
+    """Serves a calculator web handler's page and API from one event loop.
+
+    The page, calculator, sessions, result cache, instrumentation and batch
+    limits are the class attributes of `handler`, a CalculatorHandler from
+    network_calculator or simple_web_calculator set up by its run_server. Requests are answered in
+    order on each connection, so pipelined requests get their responses in
+    the order they were sent.
+
+    Nothing slow runs on the event loop. The calculator, sessions and result
+    cache are not thread-safe, so /calculate, each block of a
+    /calculate/batch response, /history, /cache and /stats run one at a time
+    on a single calculator thread (see compute): a slow operation delays
+    other calculations, never other connections. The other API routes do
+    not touch the calculator and run in the default thread pool.
+    """
+
+    def __init__(self, handler):
+        self.page = handler.page
+        self.instrumentation = handler.instrumentation
+        # Used only from the calculator thread; each request records into
+        # its client's session
+        self.calculator = handler.calculator
+        self.sessions = handler.sessions
+        self.results = handler.results
+        self.batch_max_items = handler.batch_max_items
+        self.batch_max_bytes = handler.batch_max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='calculator')
+
+    async def compute(self, function, *args):
+        """function(*args) on the calculator thread, in a copy of the calling
+        task's context so the session in use is the request's own"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, function, *args)
+
+    async def blocks(self, payload):
+        """Async iterator over a streamed body, each block produced on the
+        calculator thread in one context kept for the whole response"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        try:
+            while True:
+                block = await loop.run_in_executor(self.executor, context.run, next, payload, None)
+                if block is None:
+                    return
+                yield block
+        finally:
+            # Ends the session's use() on the calculator thread, also when the client goes away
+            await loop.run_in_executor(self.executor, context.run, payload.close)
+
+    def body_limit(self, path):
+        """Largest request body accepted for `path`, in bytes"""
+        if path == '/calculate/batch':
+            return self.batch_max_bytes
+        return BODY_LIMITS.get(path, MAX_BODY_BYTES)
+
+    async def respond(self, method, path, query, headers, body):
+        """(status, [(header, value)], body) for one request; the body is
+        bytes, or an iterator of bytes blocks for a streamed response"""
+        if method == 'GET':
+            if path == '/':
+                return self.page.respond(headers.get('accept-encoding', ''), headers.get('if-none-match', ''))
+            if path == '/calculate':
+                return await self.compute(self.calculation, headers, parse_query(query))
+            if path == '/history':
+                return _json(*await self.compute(session_history, self.sessions, self.session_token(headers), query))
+            if path == '/stats':
+                if self.instrumentation is None:
+                    return _json(404, {'error': 'Instrumentation is off (start the server with --instrument)'})
+                return _json(200, await self.compute(self.instrumentation.snapshot))
+            if path == '/cache':
+                return _json(*await self.compute(cache_stats, self.results))
+        elif method == 'POST':
+            content_type = headers.get('content-type', '')
+            if path == '/calculate':
+                return await self.compute(self.calculation, headers, parse_body(content_type, body))
+            if path == '/calculate/batch':
+                return await self.compute(self.batch, headers, body)
+            if path in ROUTES:
+                loop = asyncio.get_running_loop()
+                return _typed(*await loop.run_in_executor(None, handle, path, content_type, body))
+        else:
+            return _json(501, {'error': f"Method {method} not supported"})
+        return _json(404, {'error': f"No route for {method} {path}"})
+
+    def calculation(self, headers, params):
+        """/calculate response (GET or POST) in the requesting client's session"""
+        session, session_headers = self.sessions.resolve(self.session_token(headers))
+        with self.sessions.use(session):
+            status, response_headers, body = calculation_response(
+                self.calculator, params, self.results, headers.get('if-none-match', ''))
+        return status, response_headers + session_headers, body
+
+    def batch(self, headers, body):
+        """/calculate/batch response in the requesting client's session; the
+        body is a generator of blocks, for blocks() to run"""
+        status, content_type, payload = calculate_batch(self.calculator, body, self.batch_max_items)
+        if status != 200:
+            return _typed(status, content_type, payload)
+        session, session_headers = self.sessions.resolve(self.session_token(headers))
+        return status, [('Content-Type', content_type)] + session_headers, self.sessions.stream(session, payload)
+
+    @staticmethod
+    def session_token(headers):
+        return request_token(headers.get('cookie'), headers.get(SESSION_HEADER.lower()))
+
+    async def serve_connection(self, reader, writer):
+        """Answer requests on one connection until the client closes it, asks
+        to close, times out or sends a request that cannot be framed"""
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    data = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    writer.write(_response(*_json(431, {'error': "Request headers too large"}), False))
+                    return
+                data = data.lstrip(b'\r\n')  # stray blank lines between requests are allowed
+                if not data:
+                    continue
+                try:
+                    method, target, version, headers = _head(data)
+                    path, _, query = target.partition('?')
+                    length = _content_length(headers, self.body_limit(path))
+                except RequestError as e:
+                    writer.write(_response(*_json(e.status, {'error': str(e)}), False))
+                    return
+                keep_alive = _keep_alive(version, headers)
+                if length and headers.get('expect', '').lower() == '100-continue':
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b''
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                try:
+                    response = await self.respond(method, path, query, headers, body)
+                except Exception:
+                    traceback.print_exc()
+                    response = _json(500, {'error': "Internal server error"})
+                status, response_headers, payload = response
+                if isinstance(payload, bytes):
+                    writer.write(_response(status, response_headers, payload, keep_alive))
+                else:
+                    chunked = version == 'HTTP/1.1'
+                    keep_alive = keep_alive and chunked
+                    if not await _stream(writer, status, response_headers, self.blocks(payload), keep_alive,
+                                         chunked):
+                        return
+                if not await _drain(writer):
+                    return
+        except asyncio.CancelledError:
+            # Server shutdown; a connection task that ends cancelled gets its
+            # traceback logged by asyncio.streams on some Python versions
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, ready=None):
+        """Accept connections on (host, port) until cancelled"""
+        server = await asyncio.start_server(self.serve_connection, host, port,
+                                            limit=MAX_HEADER_BYTES, backlog=BACKLOG, reuse_address=True)
+        if ready is not None:
+            ready()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def raise_file_limit():
+    """Raise the soft open-file limit to the hard limit, since every idle
+    connection holds a descriptor; returns the new limit (None where the
+    resource module is unavailable)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    return soft
+
+
+def serve_async(address, handler, ready=None):
+    """Serve `handler`'s page and API on `address` from an asyncio event loop
+    until Ctrl+C (which raises KeyboardInterrupt to the caller). `ready` is
+    called once the socket is listening."""
+    raise_file_limit()
+    host, port = address
+    asyncio.run(AsyncCalculatorServer(handler).serve(host, port, ready))
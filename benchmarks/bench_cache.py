@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Result Cache Benchmark
+ns per /calculate response handled in-process: without the result cache,
+from it (a hit) and through it on a miss, for the cheapest operation up to
+a large factorial
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import print_results, result, time_calls
+from precision import create_calculator
+from sessions import SessionHistory, SessionStore
+from web_api import calculation_response, result_cache
+
+CASES = {
+    'add': {'operation': 'add', 'num1': '2', 'num2': '3'},
+    'sqrt': {'operation': 'sqrt', 'num1': '2'},
+    'power': {'operation': 'power', 'num1': '3', 'num2': '200'},
+    'factorial': {'operation': 'factorial', 'num1': '3000'},
+}
+
+
+def run(quick=False):
+    number, repeat = (2000, 3) if quick else (20000, 5)
+    # Set up as the servers do: one engine recording into a session
+    sessions = SessionStore()
+    calculator = create_calculator('float', history=SessionHistory())
+    cache = result_cache()
+
+    def miss(params):
+        cache.clear()
+        calculation_response(calculator, params, cache)
+
+    results = []
+    with sessions.use(sessions.create()):
+        for name, params in CASES.items():
+            timings = {
+                'uncached': time_calls(calculation_response, (calculator, params), number, repeat),
+                'hit': time_calls(calculation_response, (calculator, params, cache), number, repeat),
+                'miss': time_calls(miss, (params,), number, repeat),
+            }
+            for path, samples in timings.items():
+                results.append(result(f"cache.{name}.{path}", 'ns', samples))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Concurrency Benchmark
+Operations per second when threads share one calculator: ConcurrentCalculator
+(per-thread history shards) against a Calculator behind one global lock, and
+a check that no history entry is lost
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import print_results, result
+from calculator import Calculator, ConcurrentCalculator
+
+
+class LockedCalculator:
+    """The alternative to sharding: every call takes one global lock"""
+
+    def __init__(self, history_capacity):
+        self.calculator = Calculator(history_capacity)
+        self.history = self.calculator.history
+        self.lock = threading.Lock()
+
+    def add(self, a, b):
+        with self.lock:
+            return self.calculator.add(a, b)
+
+
+def gil_enabled():
+    check = getattr(sys, '_is_gil_enabled', None)
+    return True if check is None else check()
+
+
+def stress(calc, threads, calls):
+    """Run `calls` additions on each of `threads` threads at once; returns ops/s"""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(k):
+        add = calc.add
+        barrier.wait()
+        for i in range(calls):
+            add(k, i)
+
+    workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.join()
+    return threads * calls / (time.perf_counter() - start)
+
+
+def run(quick=False):
+    calls, repeat = (20000, 3) if quick else (100000, 5)
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    results = []
+    for label, factory in (('sharded', ConcurrentCalculator), ('locked', LockedCalculator)):
+        for threads in counts:
+            rates = []
+            for _ in range(repeat):
+                calc = factory(history_capacity=threads * calls)
+                rates.append(stress(calc, threads, calls))
+                if len(calc.history) != threads * calls:
+                    raise RuntimeError(f"{label}: {len(calc.history)} of {threads * calls} entries recorded")
+            results.append(result(f"concurrency.add.{label}.{threads}_threads", 'ops/s', rates,
+                                  higher_is_better=True, threads=threads, gil=gil_enabled()))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
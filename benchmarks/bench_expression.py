@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Expression Benchmark
+Evaluations per second for a cached compiled expression versus the
+one-operation-per-call Calculator path
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import result, time_calls
+from calculator import Calculator
+from expression import compile_expression
+
+EXPRESSION = "2*sin(x) + log(y, 3)"
+
+
+def rate(function, count):
+    """Calls per second for `function` over `count` calls"""
+    start = time.perf_counter()
+    for i in range(count):
+        function(0.5, 9.0)
+    return count / (time.perf_counter() - start)
+
+
+def paths(calc):
+    """The ways of evaluating EXPRESSION, keyed by label"""
+    def per_op(x, y):
+        return calc.add(calc.multiply(2, calc.sine(x)), calc.logarithm(y, 3))
+
+    compiled = compile_expression(EXPRESSION)
+    return {
+        "calculator ops (4 calls)": per_op,
+        "Calculator.evaluate (cached)": lambda x, y: calc.evaluate(EXPRESSION, x=x, y=y),
+        "compiled callable": compiled.function,
+        "parse + compile every call": lambda x, y: compile_expression.__wrapped__(EXPRESSION)(x, y),
+    }
+
+
+def run(quick=False):
+    number, repeat = (2000, 5) if quick else (20000, 7)
+    results = []
+    for label, function in paths(Calculator(history_capacity=0)).items():
+        key = label.split(" (")[0].replace(" ", "_").replace("+", "and").replace(".", "_").lower()
+        calls = number // 10 if label.startswith("parse") else number
+        results.append(result(f"expression.{key}", 'ns', time_calls(function, (0.5, 9.0), calls, repeat)))
+    return results
+
+
+def main(count=100000):
+    results = {}
+    for name, function in paths(Calculator(history_capacity=0)).items():
+        results[name] = rate(function, count // 10 if name.startswith("parse") else count)
+    baseline = results["calculator ops (4 calls)"]
+    print(f"Expression: {EXPRESSION}")
+    for name, value in results.items():
+        print(f"{name:32} {value:14,.0f} evals/s  ({value / baseline:5.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Fast Math Benchmark
+Throughput of the fastmath approximations against NumPy's exact functions
+and per-value Calculator calls, with the measured error of each
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import fastmath
+from benchmarks.harness import print_results, result, time_calls
+from calculator import Calculator
+
+# fastmath name -> (NumPy exact function, Calculator method, argument range)
+CASES = {
+    'sin': (np.sin, 'sine', (-1e5, 1e5)),
+    'cos': (np.cos, 'cosine', (-1e5, 1e5)),
+    'tan': (np.tan, 'tangent', (-1e5, 1e5)),
+    'ln': (np.log, 'natural_log', (1e-3, 1e6)),
+    'log': (np.log10, 'logarithm', (1e-3, 1e6)),
+}
+
+
+def run(quick=False):
+    size, repeat = (100000, 3) if quick else (1000000, 5)
+    calc = Calculator(history_capacity=0)
+    rng = np.random.default_rng(0)
+    results = []
+    for name, (exact, method, (low, high)) in CASES.items():
+        x = rng.uniform(low, high, size)
+        fast = fastmath.FUNCTIONS[name][0]
+        per_value = getattr(calc, method)
+        values = x[:size // 100].tolist()
+        timings = {
+            'fast': [t / size for t in time_calls(fast, (x,), 1, repeat)],
+            'numpy': [t / size for t in time_calls(exact, (x,), 1, repeat)],
+            'calculator': [t / len(values) for t in time_calls(lambda: [per_value(v) for v in values],
+                                                               (), 1, repeat)],
+        }
+        for label, samples in timings.items():
+            results.append(result(f"fastmath.{name}.{label}", 'ns', samples))
+        error, bound, _ = fastmath.check_accuracy(name, samples=size // 10)
+        results.append(result(f"fastmath.{name}.max_error", 'units', [error], bound=bound))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+History Benchmark
+History memory and recording cost as the number of entries grows
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import print_results, result
+from history import OP_ADD, HistoryStore
+
+SIZES = (1000, 10000, 100000)
+
+
+def fill(store, count):
+    record = store.record
+    for i in range(count):
+        record(OP_ADD, float(i), 2.5, i + 2.5)
+
+
+def run(quick=False):
+    repeat = 3 if quick else 5
+    sizes = SIZES[:2] if quick else SIZES
+    results = []
+    for size in sizes:
+        footprints = []
+        for _ in range(repeat):
+            tracemalloc.start()
+            store = HistoryStore(capacity=size)
+            fill(store, size)
+            footprints.append(tracemalloc.get_traced_memory()[0])
+            tracemalloc.stop()
+            del store
+        # Timed separately because tracemalloc slows every allocation
+        record_ns = []
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            fill(HistoryStore(capacity=size), size)
+            record_ns.append((time.perf_counter_ns() - start) / size)
+        results.append(result(f"history.record.{size}", 'ns', record_ns))
+        results.append(result(f"history.bytes_per_entry.{size}", 'B',
+                              [footprint / size for footprint in footprints]))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+HTTP Benchmark
+End-to-end throughput and p50/p99 latency of the web servers on localhost,
+with a new connection per request and with connections kept alive
+"""
+
+import http.client
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.harness import print_results, result
+
+# result name -> (module, extra command line arguments)
+SERVERS = {
+    'simple_web_calculator': ('simple_web_calculator', ()),
+    'network_calculator': ('network_calculator', ()),
+    # Pre-fork mode, one worker per CPU
+    'network_calculator.prefork': ('network_calculator', ('--workers',)),
+    # One asyncio event loop with HTTP/1.1 keep-alive
+    'network_calculator.async': ('network_calculator', ('--async',)),
+}
+
+BATCH_SIZE = 100
+
+# name -> (method, path, body, extra headers)
+REQUESTS = {
+    'calculate': ('POST', '/calculate', urllib.parse.urlencode(
+        {'operation': 'add', 'num1': '2', 'num2': '3'}), {}),
+    # BATCH_SIZE operations per request
+    'calculate.batch': ('POST', '/calculate/batch', "\n".join(
+        json.dumps({'operation': 'add', 'operands': [i, 3]}) for i in range(BATCH_SIZE)),
+        {'Content-Type': 'application/x-ndjson'}),
+    # A large factorial answered from the server's result cache after the warm-up
+    'calculate.cached': ('GET', '/calculate?' + urllib.parse.urlencode(
+        {'operation': 'factorial', 'num1': '3000'}), None, {}),
+    'page': ('GET', '/', None, {}),
+    'page.gzip': ('GET', '/', None, {'Accept-Encoding': 'gzip'}),
+    # A browser revalidating its cached copy; "*" matches any ETag, so this gets a 304
+    'page.revalidate': ('GET', '/', None, {'If-None-Match': '*'}),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serving(module, args=(), startup_timeout=10.0):
+    """Run `module`'s server in a subprocess and yield its port"""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, f"{module}.py"), '--port', str(port), *args],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"{module} did not start on port {port}")
+                time.sleep(0.05)
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def request(connection, method, path, body, headers):
+    """Send one request; returns latency in seconds"""
+    if body:
+        headers = {'Content-Type': 'application/x-www-form-urlencoded', **headers}
+    start = time.perf_counter()
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    response.read()
+    if response.status not in (200, 304):
+        raise RuntimeError(f"{method} {path} returned {response.status}")
+    return time.perf_counter() - start
+
+
+def _client(port, spec, count, keep_alive):
+    """Latencies of `count` requests, each on a fresh connection or all on one
+    kept-alive connection (http.client reconnects if the server closes it)"""
+    if keep_alive:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            return [request(connection, *spec) for _ in range(count)]
+        finally:
+            connection.close()
+    latencies = []
+    for _ in range(count):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            latencies.append(request(connection, *spec))  # connects lazily, so this includes connect()
+        finally:
+            connection.close()
+    return latencies
+
+
+def load(port, spec, count, concurrency, keep_alive=False):
+    """Issue `count` requests from `concurrency` client processes (threads
+    would share one GIL and cap the rate a multi-process server is driven at).
+
+    Returns (per-request latencies in seconds, requests per second).
+    """
+    per_client = count // concurrency
+    with multiprocessing.Pool(concurrency) as pool:
+        start = time.perf_counter()
+        batches = pool.starmap(_client, [(port, spec, per_client, keep_alive)] * concurrency)
+        elapsed = time.perf_counter() - start
+    latencies = [latency for batch in batches for latency in batch]
+    return latencies, len(latencies) / elapsed
+
+
+def run(quick=False, concurrency=None):
+    concurrency = concurrency or max(4, os.cpu_count() or 1)
+    count, repeat = (200, 3) if quick else (1000, 5)
+    results = []
+    for server, (module, args) in SERVERS.items():
+        with serving(module, args) as port:
+            for (name, spec), keep_alive in itertools.product(REQUESTS.items(), (False, True)):
+                label = f"{name}.keepalive" if keep_alive else name
+                load(port, spec, max(count // 10, concurrency), concurrency, keep_alive)  # warm up
+                latencies, rates = [], []
+                for _ in range(repeat):
+                    samples, rate = load(port, spec, count, concurrency, keep_alive)
+                    latencies.extend(sample * 1000 for sample in samples)
+                    rates.append(rate)
+                results.append(result(f"http.{server}.{label}.throughput", 'req/s', rates,
+                                      higher_is_better=True, concurrency=concurrency))
+                results.append(result(f"http.{server}.{label}.latency", 'ms', latencies,
+                                      concurrency=concurrency))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Integration Benchmark
+Time per integral with the integrand evaluated on node arrays versus one
+compiled scalar call per node
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.harness import print_results, result, time_calls
+from expression import compile_expression
+from integrate import METHODS, integrate, integrate_expression
+
+# label -> (integrand, a, b)
+CASES = {
+    'smooth': ("sin(x)^2 + log(x + 2, 3)", 0.0, 10.0),
+    'oscillating': ("sin(1/x)", 0.001, 1.0),
+    'singular': ("1/sqrt(x)", 0.0, 1.0),
+    'infinite': ("e^(-x^2)", float('-inf'), float('inf')),
+}
+
+
+def scalar(expression):
+    """The integrand as one compiled scalar call per node"""
+    function = compile_expression(expression).function
+    return lambda x: np.fromiter(map(function, x.tolist()), dtype=np.float64, count=x.size)
+
+
+def run(quick=False):
+    number, repeat = (3, 3) if quick else (10, 5)
+    results = []
+    for label, (expression, a, b) in CASES.items():
+        for method in METHODS:
+            integral = integrate_expression(expression, a, b, method=method)
+            timings = {
+                'vectorized': time_calls(integrate_expression, (expression, a, b, 'x', method), number, repeat),
+                'scalar': time_calls(integrate, (scalar(expression), a, b, method), number, repeat),
+            }
+            for path, samples in timings.items():
+                results.append(result(f"integrate.{label}.{method}.{path}", 'ns', samples,
+                                      evaluations=integral.evaluations, converged=integral.converged))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Linear Algebra Benchmark
+ns per /matrix request handled in-process, JSON against the binary matrix
+format, with the bare LAPACK call for reference
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.harness import print_results, result, time_calls
+from linalg import CONTENT_TYPE, compute, encode
+from web_api import JSON_TYPE, handle
+
+
+def run(quick=False):
+    sizes, number, repeat = ((64, 256), 3, 3) if quick else ((64, 256, 1024), 5, 5)
+    rng = np.random.default_rng(0)
+    results = []
+    for n in sizes:
+        a = rng.standard_normal((n, n)) + n * np.eye(n)
+        b = rng.standard_normal(n)
+        binary = encode('solve', {'a': a, 'b': b})
+        text = json.dumps({'operation': 'solve', 'operands': [a.tolist(), b.tolist()]}).encode()
+        timings = {
+            'compute': time_calls(compute, ('solve', a, b), number, repeat),
+            'binary': time_calls(handle, ('/matrix', CONTENT_TYPE, binary), number, repeat),
+            'json': time_calls(handle, ('/matrix', JSON_TYPE, text), number, repeat),
+        }
+        for path, samples in timings.items():
+            results.append(result(f"linalg.solve.{n}.{path}", 'ns', samples,
+                                  request_bytes=len(binary if path == 'binary' else text)))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
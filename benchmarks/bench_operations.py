@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Operation Benchmark
+Per-operation Calculator latency with and without history recording
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import print_results, result, time_calls
+from calculator import OPERATION_LIST, Calculator
+
+# Representative operands inside every operation's domain
+ARGUMENTS = {
+    'factorial': (10,),
+    'logarithm': (100.0, 10.0),
+    'powmod': (7, 560, 561),
+}
+
+
+def run(quick=False):
+    number, repeat = (2000, 5) if quick else (20000, 7)
+    recording = Calculator()
+    silent = Calculator(history_capacity=0)
+    results = []
+    for op in OPERATION_LIST:
+        args = ARGUMENTS.get(op.method, (7.0, 3.0)[:op.arity])
+        for label, calc in (("history", recording), ("no_history", silent)):
+            samples = time_calls(getattr(calc, op.method), args, number, repeat)
+            results.append(result(f"operations.{op.method}.{label}", 'ns', samples))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Precision Benchmark
+Cost of each numeric mode and Decimal precision tier relative to float
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import result, time_calls
+from precision import create_calculator
+
+TIERS = [
+    ("float", None),
+    ("decimal", 28),
+    ("decimal", 50),
+    ("decimal", 100),
+    ("decimal", 1000),
+    ("fraction", 28),
+]
+
+OPERATIONS = [
+    ("add", (1.1, 2.2)),
+    ("multiply", (1.1, 2.2)),
+    ("divide", (1.0, 3.0)),
+    ("square_root", (2.0,)),
+    ("sine", (0.5,)),
+    ("natural_log", (2.0,)),
+]
+
+
+def time_per_call(function, args, count):
+    """Mean seconds per call over `count` calls"""
+    start = time.perf_counter()
+    for i in range(count):
+        function(*args)
+    return (time.perf_counter() - start) / count
+
+
+def run(quick=False):
+    number, repeat = (200, 3) if quick else (2000, 5)
+    results = []
+    for mode, precision in TIERS:
+        calc = create_calculator(mode, precision or 28, history_capacity=0)
+        label = mode if precision is None else f"{mode}{precision}"
+        calls = number if precision is None or precision <= 100 else max(number // 20, 10)
+        for name, args in OPERATIONS:
+            results.append(result(f"precision.{label}.{name}", 'ns',
+                                  time_calls(getattr(calc, name), args, calls, repeat)))
+    return results
+
+
+def main(count=2000):
+    print(f"{'mode':16}" + "".join(f"{name:>14}" for name, _ in OPERATIONS))
+    float_times = None
+    for mode, precision in TIERS:
+        calc = create_calculator(mode, precision or 28, history_capacity=0)
+        label = mode if precision is None else f"{mode}/{precision}"
+        # Heavy tiers get fewer iterations so the run stays short
+        calls = count if precision is None or precision <= 100 else max(count // 20, 10)
+        times = [time_per_call(getattr(calc, name), args, calls) for name, args in OPERATIONS]
+        if float_times is None:
+            float_times = times
+            cells = [f"{t * 1e9:11.0f} ns" for t in times]
+        else:
+            cells = [f"{t / base:12.1f}x" for t, base in zip(times, float_times)]
+        print(f"{label:16}" + "".join(f"{cell:>14}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tabulation Benchmark
+ns per grid point for whole-grid tabulation, lazy chunks and streamed CSV,
+against one Calculator call per point
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import print_results, result, time_calls
+from calculator import Calculator
+from tabulate import parse_range, tabulate, tabulate_chunks, write_csv
+
+
+def drain(chunks):
+    for _ in chunks:
+        pass
+
+
+def run(quick=False):
+    points, repeat = (100000, 3) if quick else (1000000, 5)
+    x = parse_range(f"x=0:2*pi:{points}j")
+    calc = Calculator(history_capacity=0)
+    values = x.values[:points // 100].tolist()
+    timings = {
+        'grid': [t / points for t in time_calls(tabulate, ('sin', x), 1, repeat)],
+        'chunks': [t / points for t in time_calls(lambda: drain(tabulate_chunks('sin', x)), (), 1, repeat)],
+        'csv': [t / points for t in time_calls(lambda: write_csv(io.StringIO(), 'sin', x), (), 1, repeat)],
+        'calculator': [t / len(values) for t in time_calls(lambda: [calc.sine(v) for v in values],
+                                                           (), 1, repeat)],
+    }
+    return [result(f"tabulate.sin.{label}", 'ns', samples) for label, samples in timings.items()]
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark Harness
+Timing loops, run-to-run statistics and baseline comparison shared by the
+benchmark suites
+"""
+
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A result is flagged when it is this much worse than the baseline...
+DEFAULT_THRESHOLD = 0.10
+# ...and the change is larger than this many run-to-run standard deviations
+NOISE_SIGMAS = 3.0
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return math.nan
+    position = (len(sorted_values) - 1) * fraction
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def summarize(samples):
+    """min/median/mean/stdev/p50/p99 of a list of samples"""
+    ordered = sorted(samples)
+    return {
+        'samples': len(ordered),
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.fmean(ordered),
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'p50': percentile(ordered, 0.50),
+        'p99': percentile(ordered, 0.99),
+        'max': ordered[-1],
+    }
+
+
+def result(name, unit, samples, higher_is_better=False, **extra):
+    """Build a result record; `value` (the median) is what gets compared"""
+    stats = summarize(samples)
+    record = {
+        'name': name,
+        'unit': unit,
+        'value': stats['median'],
+        'higher_is_better': higher_is_better,
+        'stats': stats,
+    }
+    record.update(extra)
+    return record
+
+
+def time_calls(function, args=(), number=10000, repeat=7, warmup=1):
+    """Nanoseconds per call of function(*args), one sample per repeat.
+
+    Each sample times `number` back-to-back calls, so timer overhead is
+    amortized; the spread across repeats is the run-to-run noise.
+    """
+    samples = []
+    for round_ in range(warmup + repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            function(*args)
+        elapsed = time.perf_counter_ns() - start
+        if round_ >= warmup:
+            samples.append(elapsed / number)
+    return samples
+
+
+def environment():
+    """Machine and interpreter details stored alongside results"""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def save(path, results):
+    """Write a results file (the same format is used for baselines)"""
+    with open(path, 'w') as file:
+        json.dump({'environment': environment(), 'results': results}, file, indent=2)
+        file.write('\n')
+
+
+def load(path):
+    """Read a results or baseline file"""
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare results against baseline records by name.
+
+    Returns (name, unit, old, new, change, regressed) rows; `change` is
+    positive when the new result is worse. A row regresses when it is worse
+    by more than `threshold` and by more than the measured noise.
+    """
+    previous = {record['name']: record for record in baseline}
+    rows = []
+    for record in results:
+        old = previous.get(record['name'])
+        if old is None or not old['value']:
+            continue
+        new_value, old_value = record['value'], old['value']
+        change = (new_value - old_value) / old_value
+        if record['higher_is_better']:
+            change = -change
+        noise = max(record['stats']['stdev'], old['stats']['stdev']) * NOISE_SIGMAS / old_value
+        rows.append((record['name'], record['unit'], old_value, new_value, change,
+                     change > threshold and change > noise))
+    return rows
+
+
+def format_value(value, unit):
+    if unit == 'ns':
+        return f"{value:,.0f} ns" if value >= 100 else f"{value:.2f} ns"
+    if unit == 'ms':
+        return f"{value:,.3f} ms"
+    return f"{value:,.1f} {unit}"
+
+
+def print_results(results, out=sys.stdout):
+    """Print one line per result"""
+    for record in results:
+        stats = record['stats']
+        spread = f"±{stats['stdev'] / record['value'] * 100:4.1f}%" if record['value'] else ""
+        line = f"{record['name']:52} {format_value(record['value'], record['unit']):>18} {spread:>7}"
+        if record['unit'] == 'ms':
+            line += f"   p99 {format_value(stats['p99'], 'ms')}"
+        print(line, file=out)
+
+
+def print_comparison(rows, out=sys.stdout):
+    """Print a baseline comparison, marking regressions"""
+    for name, unit, old, new, change, regressed in rows:
+        marker = "REGRESSION" if regressed else ""
+        print(f"{name:52} {format_value(old, unit):>16} -> {format_value(new, unit):>16} "
+              f"{change * 100:+7.1f}%  {marker}", file=out)
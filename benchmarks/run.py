@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark Runner
+Runs the benchmark suites, writes JSON results and flags regressions against
+a saved baseline
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import (
+    DEFAULT_THRESHOLD, compare, load, print_comparison, print_results, save,
+)
+
+# Suite name -> module with a run(quick=False) function returning result records
+SUITES = {
+    'operations': 'benchmarks.bench_operations',
+    'history': 'benchmarks.bench_history',
+    'expression': 'benchmarks.bench_expression',
+    'precision': 'benchmarks.bench_precision',
+    'fastmath': 'benchmarks.bench_fastmath',
+    'integrate': 'benchmarks.bench_integrate',
+    'tabulate': 'benchmarks.bench_tabulate',
+    'linalg': 'benchmarks.bench_linalg',
+    'concurrency': 'benchmarks.bench_concurrency',
+    'cache': 'benchmarks.bench_cache',
+    'http': 'benchmarks.bench_http',
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the calculator benchmark suites")
+    parser.add_argument("suites", nargs="*", metavar="SUITE",
+                        help=f"suites to run (default: all of {', '.join(SUITES)})")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for smoke runs")
+    parser.add_argument("--output", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against a saved results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"relative slowdown that counts as a regression (default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    for name in args.suites or SUITES:
+        print(f"== {name}", file=sys.stderr)
+        suite = importlib.import_module(SUITES[name]).run(quick=args.quick)
+        print_results(suite)
+        results.extend(suite)
+
+    if args.output:
+        save(args.output, results)
+    if args.baseline:
+        rows = compare(results, load(args.baseline), args.threshold)
+        print(f"\nCompared with {args.baseline}:")
+        print_comparison(rows)
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,29 +4,69 @@ Advanced Calculator - Performs all basic math operations
 Supports: +, -, *, /, **, sqrt, %, factorial, trigonometric functions
 """
 
+import argparse
 import math
+from collections import namedtuple
 import sys
+import time
+
+from history import (
+    DEFAULT_CAPACITY, HistoryStore, ShardedHistory, OP_ABSOLUTE, OP_ADD, OP_CODES, OP_COSINE,
+    OP_DIVIDE, OP_EXPRESSION, OP_FACTORIAL, OP_INTEGRAL, OP_LOGARITHM, OP_MODULO,
+    OP_MATRIX, OP_MULTIPLY, OP_NATURAL_LOG, OP_POWER, OP_POWMOD, OP_SINE, OP_SOLVE, OP_SQUARE_ROOT,
+    OP_SUBTRACT, OP_TANGENT,
+)
+from expression import compile_expression, equation_source
+from factorial import FACTORIALS, MAX_POWER_BITS, format_number, power_bits, power_size_error
+from history_log import HistoryLog
+from instrumentation import Instrumentation, format_snapshot
+
+# Largest n whose factorial fits in a float
+FLOAT_FACTORIAL_LIMIT = 170
+
+def is_whole(value):
+    """True for integers and integral floats, Decimals or Fractions (not inf or nan)"""
+    kind = type(value)
+    if kind is int:
+        return True
+    if kind is float:
+        return value.is_integer()
+    try:
+        return value == int(value)
+    except (OverflowError, ValueError, TypeError):
+        return False
 
 class Calculator:
-    def __init__(self):
-        self.history = []
+    mode = 'float'
+    # Optional instrumentation.Instrumentation; dispatch times operations through it
+    instrumentation = None
+
+    def __init__(self, history_capacity=DEFAULT_CAPACITY, exact_factorial=True, history=None):
+        # `history` shares an existing store, such as a persistent history_log.HistoryLog
+        self.history = HistoryStore(history_capacity) if history is None else history
+        self.exact_factorial = exact_factorial
+        self.factorials = FACTORIALS
+    
+    def parse_number(self, text):
+        """Parse user input into this calculator's number type"""
+        return float(text)
     
     def add(self, a, b):
         """Addition: a + b"""
         result = a + b
-        self.history.append(f"{a} + {b} = {result}")
+        self.history.record(OP_ADD, a, b, result)
         return result
     
     def subtract(self, a, b):
         """Subtraction: a - b"""
         result = a - b
-        self.history.append(f"{a} - {b} = {result}")
+        self.history.record(OP_SUBTRACT, a, b, result)
         return result
     
     def multiply(self, a, b):
         """Multiplication: a * b"""
         result = a * b
-        self.history.append(f"{a} * {b} = {result}")
+        self.history.record(OP_MULTIPLY, a, b, result)
         return result
     
     def divide(self, a, b):
@@ -34,13 +74,50 @@ class Calculator:
         if b == 0:
             return "Error: Division by zero!"
         result = a / b
-        self.history.append(f"{a} / {b} = {result}")
+        self.history.record(OP_DIVIDE, a, b, result)
         return result
     
     def power(self, a, b):
-        """Power: a ** b"""
-        result = a ** b
-        self.history.append(f"{a} ** {b} = {result}")
+        """Power: a ** b, exact when a and b are integral and b >= 0.
+
+        The size of an exact result is estimated first, so results over
+        MAX_POWER_BITS are refused instead of allocated.
+        """
+        if is_whole(a) and is_whole(b) and b >= 0:
+            a, b = int(a), int(b)
+            if abs(a).bit_length() * b > MAX_POWER_BITS:  # cheap upper bound first
+                error = power_size_error(power_bits(a, b))
+                if error:
+                    return error
+            result = a ** b
+        else:
+            if a < 0 and not is_whole(b):
+                return "Error: Negative base with fractional exponent!"
+            try:
+                result = a ** b
+            except ZeroDivisionError:
+                return "Error: Division by zero!"
+            except OverflowError:
+                return "Error: Result too large!"
+        self.history.record(OP_POWER, a, b, result)
+        return result
+    
+    def powmod(self, a, b, m):
+        """Modular power: a ** b mod m, by three-argument pow.
+
+        Intermediate values stay below m, so any exponent is cheap. A negative
+        b uses the inverse of a modulo m.
+        """
+        if not (is_whole(a) and is_whole(b) and is_whole(m)):
+            return "Error: Modular power only for integers!"
+        a, b, m = int(a), int(b), int(m)
+        if m == 0:
+            return "Error: Modulo by zero!"
+        try:
+            result = pow(a, b, m)
+        except ValueError:
+            return f"Error: {a} has no inverse modulo {m}!"
+        self.history.record(OP_POWMOD, a, [b, m], result)
         return result
     
     def square_root(self, a):
@@ -48,7 +125,7 @@ class Calculator:
         if a < 0:
             return "Error: Cannot calculate square root of negative number!"
         result = math.sqrt(a)
-        self.history.append(f"√{a} = {result}")
+        self.history.record(OP_SQUARE_ROOT, a, 0.0, result)
         return result
     
     def modulo(self, a, b):
@@ -56,37 +133,40 @@ class Calculator:
         if b == 0:
             return "Error: Modulo by zero!"
         result = a % b
-        self.history.append(f"{a} % {b} = {result}")
+        self.history.record(OP_MODULO, a, b, result)
         return result
     
     def factorial(self, a):
-        """Factorial: a!"""
+        """Factorial: a! (exact; capped at 170 when exact_factorial is off)"""
         if a < 0:
             return "Error: Factorial of negative number!"
         if not isinstance(a, int) or a != int(a):
             return "Error: Factorial only for integers!"
-        if a > 170:  # Prevent overflow
+        if not self.exact_factorial and a > FLOAT_FACTORIAL_LIMIT:  # Float-sized results only
             return "Error: Number too large for factorial!"
-        result = math.factorial(int(a))
-        self.history.append(f"{int(a)}! = {result}")
+        error = self.factorials.limit_error(a)
+        if error:
+            return error
+        result = self.factorials.factorial(int(a))
+        self.history.record(OP_FACTORIAL, int(a), 0.0, result)
         return result
     
     def sine(self, a):
         """Sine: sin(a) in radians"""
         result = math.sin(a)
-        self.history.append(f"sin({a}) = {result}")
+        self.history.record(OP_SINE, a, 0.0, result)
         return result
     
     def cosine(self, a):
         """Cosine: cos(a) in radians"""
         result = math.cos(a)
-        self.history.append(f"cos({a}) = {result}")
+        self.history.record(OP_COSINE, a, 0.0, result)
         return result
     
     def tangent(self, a):
         """Tangent: tan(a) in radians"""
         result = math.tan(a)
-        self.history.append(f"tan({a}) = {result}")
+        self.history.record(OP_TANGENT, a, 0.0, result)
         return result
     
     def logarithm(self, a, base=10):
@@ -96,7 +176,7 @@ class Calculator:
         if base <= 0 or base == 1:
             return "Error: Invalid logarithm base!"
         result = math.log(a, base)
-        self.history.append(f"log_{base}({a}) = {result}")
+        self.history.record(OP_LOGARITHM, a, base, result)
         return result
     
     def natural_log(self, a):
@@ -104,15 +184,125 @@ class Calculator:
         if a <= 0:
             return "Error: Natural logarithm of non-positive number!"
         result = math.log(a)
-        self.history.append(f"ln({a}) = {result}")
+        self.history.record(OP_NATURAL_LOG, a, 0.0, result)
         return result
     
     def absolute(self, a):
         """Absolute value: |a|"""
         result = abs(a)
-        self.history.append(f"|{a}| = {result}")
+        self.history.record(OP_ABSOLUTE, a, 0.0, result)
         return result
-    
+
+    def evaluate(self, expression, **variables):
+        """Expression: evaluate an infix expression such as "2*sin(x) + log(y, 3)\"
+
+        Compiled expressions are cached, so repeated expressions skip parsing.
+        Only the variables the expression uses are read from `variables`.
+        """
+        try:
+            compiled = compile_expression(expression)
+            values = [variables[name] for name in compiled.variables]
+            result = compiled.function(*values)
+        except KeyError as e:
+            return f"Error: Missing value for variable {e.args[0]!r}"
+        except (ValueError, ArithmeticError, TypeError) as e:
+            return f"Error: {e}"
+        if self.history.capacity:
+            self.history.record(OP_EXPRESSION, expression, dict(zip(compiled.variables, values)), result)
+        return result
+
+    def integrate(self, expression, a, b, variable='x', method='gauss-kronrod', max_evals=None,
+                  **variables):
+        """Integral: ∫ expression d(variable) from a to b, with the other variables fixed.
+
+        The integrand is evaluated on NumPy node arrays (see integrate), at
+        most `max_evals` times. Returns the value; the error estimate is
+        printed by the CLI and returned by integrate.integrate_expression.
+        """
+        from integrate import DEFAULT_MAX_EVALS, integrate_expression  # NumPy is only needed here
+
+        try:
+            integral = integrate_expression(
+                expression, float(a), float(b), variable, method,
+                max_evals=DEFAULT_MAX_EVALS if max_evals is None else max_evals,
+                **{name: float(value) for name, value in variables.items()})
+        except (ValueError, ArithmeticError, TypeError) as e:
+            return f"Error: {e}"
+        if not integral.converged:
+            return (f"Error: Integral did not converge in {integral.evaluations} evaluations "
+                    f"(estimate {integral.value!r} ± {integral.error:.2g})")
+        if self.history.capacity:
+            self.history.record(OP_INTEGRAL, expression,
+                                {'variable': variable, 'from': float(a), 'to': float(b)}, integral.value)
+        return integral.value
+
+    def solve(self, equation, method='brent', a=None, b=None, x0=None, variable='x',
+              max_iterations=None, **variables):
+        """Solve: root of an equation such as "x^3 - 2*x = 5" (see solver).
+
+        'brent' needs a bracket [a, b] with a sign change, 'newton' a starting
+        point x0, and 'all' returns the list of every root found in [a, b].
+        """
+        from solver import DEFAULT_MAX_ITERATIONS, solve_equation  # NumPy is only needed here
+
+        try:
+            solution = solve_equation(
+                equation, method, a, b, x0, variable,
+                max_iterations=DEFAULT_MAX_ITERATIONS if max_iterations is None else max_iterations,
+                **{name: float(value) for name, value in variables.items()})
+        except (ValueError, ArithmeticError, TypeError) as e:
+            return f"Error: {e}"
+        if method == 'all':
+            result = solution.roots.tolist()
+        elif not solution.converged:
+            return (f"Error: No root found: {solution.reason} after {solution.iterations} "
+                    f"iteration(s) (last x = {solution.root!r})")
+        else:
+            result = solution.root
+        if self.history.capacity:
+            self.history.record(OP_SOLVE, equation, {'variable': variable, 'method': method}, result)
+        return result
+
+    def matrix(self, operation, *operands):
+        """Matrix: a linear algebra operation such as 'determinant', 'inverse',
+        'solve' or 'svd' (see linalg.OPERATIONS) on arrays, nested lists or
+        text such as "1 2; 3 4".
+
+        Returns {result name: array or scalar}. History keeps the operand
+        shapes and a summary (scalars, and the shapes of array results).
+        """
+        from linalg import as_matrix, compute, shape_text, summarize  # NumPy is only needed for matrices
+
+        try:
+            # as_matrix does not copy float64 arrays, so compute reuses these
+            matrices = [as_matrix(operand) for operand in operands]
+            results = compute(operation, *matrices)
+        except (ValueError, TypeError) as e:
+            return f"Error: {e}"
+        if self.history.capacity:
+            shapes = [shape_text(matrix.shape) for matrix in matrices]
+            self.history.record(OP_MATRIX, operation, shapes, summarize(results))
+        return results
+
+    def batch(self, operation, a, b=None, fast_math=False):
+        """Vectorized batch: apply an operation to whole arrays in one pass.
+
+        `operation` is a registry name such as 'divide', 'sqrt' or 'logarithm'. Returns a
+        BatchResult of (values, errors) where errors is a per-element mask of
+        domain errors. Records one summary entry in history per batch.
+        `fast_math` trades a few ULPs for speed in trig and logs (see fastmath).
+        """
+        from vectorized import evaluate_batch  # NumPy is only needed for batches
+
+        op = OPERATIONS.get(operation)
+        if op is None or op.vectorized is None:
+            raise ValueError(f"Unknown batch operation: {operation}")
+        batch_result = evaluate_batch(op.vectorized, a, b, op.domain, fast_math)
+        count = batch_result.values.size
+        errors = int(batch_result.errors.sum())
+        self.history.record_batch(op.code, count, errors)
+        return batch_result
+
     def show_history(self):
         """Display calculation history"""
         if not self.history:
@@ -127,11 +317,103 @@ class Calculator:
         self.history.clear()
         print("History cleared!")
 
-def get_number(prompt):
+class ConcurrentCalculator(Calculator):
+    """Calculator that many threads can share.
+
+    Operations keep no state of their own beyond history, which is a
+    ShardedHistory: each thread records into its own shard without
+    locking, reads merge the shards into a snapshot, and clear_history()
+    is atomic. Other numeric modes get the same by passing
+    history=ShardedHistory() to precision.create_calculator.
+    """
+
+    def __init__(self, history_capacity=DEFAULT_CAPACITY, exact_factorial=True):
+        super().__init__(exact_factorial=exact_factorial, history=ShardedHistory(history_capacity))
+
+    def history_snapshot(self):
+        """Raw (op, a, b, result, timestamp) entries from every thread, oldest first"""
+        return self.history.snapshot()
+
+# ---------------------------------------------------------------------------
+# Operation registry: one table shared by the CLI, web servers, Streamlit,
+# batch mode, caching and instrumentation
+# ---------------------------------------------------------------------------
+
+Operation = namedtuple('Operation', [
+    'name',          # front-end name: 'add', 'sqrt', 'sin', ...
+    'method',        # Calculator method implementing it
+    'code',          # history op code
+    'title',         # display name
+    'symbol',        # short symbol shown in the CLI menu
+    'arity',         # maximum number of operands
+    'required',      # operands that must be given (logarithm's base is optional)
+    'integer_only',  # operands are integers (factorial)
+    'pure',          # result depends only on the operands
+    'domain',        # predicate for valid operands, usable on scalars and NumPy arrays
+    'vectorized',    # kernel name in vectorized.KERNELS, or None
+    'prompts',       # CLI prompts, one per operand
+])
+
+def _operation(name, method, title, symbol, prompts, required=None, integer_only=False,
+               domain=None, vectorized=True):
+    return Operation(name, method, OP_CODES[method], title, symbol, len(prompts),
+                     len(prompts) if required is None else required, integer_only, True,
+                     domain, method if vectorized else None, prompts)
+
+_TWO_NUMBERS = ("Enter first number: ", "Enter second number: ")
+_ANGLE = ("Enter angle in radians: ",)
+_NUMBER = ("Enter number: ",)
+
+# In CLI menu order
+OPERATION_LIST = [
+    _operation('add', 'add', "Addition", "+", _TWO_NUMBERS),
+    _operation('subtract', 'subtract', "Subtraction", "-", _TWO_NUMBERS),
+    _operation('multiply', 'multiply', "Multiplication", "*", _TWO_NUMBERS),
+    _operation('divide', 'divide', "Division", "/", _TWO_NUMBERS,
+               domain=lambda a, b: b != 0),
+    _operation('power', 'power', "Power", "**", ("Enter base: ", "Enter exponent: ")),
+    _operation('powmod', 'powmod', "Modular Power", "pow", ("Enter base: ", "Enter exponent: ", "Enter modulus: "),
+               integer_only=True, vectorized=False),
+    _operation('sqrt', 'square_root', "Square Root", "√", _NUMBER,
+               domain=lambda a, b: a >= 0),
+    _operation('modulo', 'modulo', "Modulo", "%", _TWO_NUMBERS,
+               domain=lambda a, b: b != 0),
+    _operation('factorial', 'factorial', "Factorial", "!", ("Enter integer: ",), integer_only=True,
+               domain=lambda a, b: (a >= 0) & (a % 1 == 0)),
+    _operation('sin', 'sine', "Sine", "sin", _ANGLE),
+    _operation('cos', 'cosine', "Cosine", "cos", _ANGLE),
+    _operation('tan', 'tangent', "Tangent", "tan", _ANGLE),
+    _operation('log', 'logarithm', "Logarithm", "log", ("Enter number: ", "Enter base (default 10): "),
+               required=1, domain=lambda a, b: (a > 0) & (b > 0) & (b != 1)),
+    _operation('ln', 'natural_log', "Natural Logarithm", "ln", _NUMBER,
+               domain=lambda a, b: a > 0),
+    _operation('abs', 'absolute', "Absolute Value", "|x|", _NUMBER),
+]
+
+# Front-end names and method names both resolve with a single lookup
+OPERATIONS = {op.name: op for op in OPERATION_LIST}
+OPERATIONS.update({op.method: op for op in OPERATION_LIST})
+
+def dispatch(calc, operation, *operands):
+    """Run a registry operation (name or Operation) on a calculator.
+
+    Extra operands beyond the operation's arity are ignored, so callers with a
+    fixed (num1, num2) pair can pass both. Unknown names return "Invalid operation".
+    """
+    op = OPERATIONS.get(operation) if isinstance(operation, str) else operation
+    if op is None:
+        return "Invalid operation"
+    method = getattr(calc, op.method)
+    meter = calc.instrumentation
+    if meter is None:
+        return method(*operands[:op.arity])
+    return meter.call(op.method, method, *operands[:op.arity])
+
+def get_number(prompt, parse=float):
     """Get a valid number from user input"""
     while True:
         try:
-            return float(input(prompt))
+            return parse(input(prompt))
         except ValueError:
             print("Invalid input! Please enter a valid number.")
 
@@ -143,34 +425,240 @@ def get_integer(prompt):
         except ValueError:
             print("Invalid input! Please enter a valid integer.")
 
+# CLI menu number -> operation
+MENU = {str(number): op for number, op in enumerate(OPERATION_LIST, 1)}
+
 def display_menu():
     """Display the calculator menu"""
     print("\n" + "="*50)
     print("           ADVANCED CALCULATOR")
     print("="*50)
-    print("1.  Addition (+)")
-    print("2.  Subtraction (-)")
-    print("3.  Multiplication (*)")
-    print("4.  Division (/)")
-    print("5.  Power (**)")
-    print("6.  Square Root (√)")
-    print("7.  Modulo (%)")
-    print("8.  Factorial (!)")
-    print("9.  Sine (sin)")
-    print("10. Cosine (cos)")
-    print("11. Tangent (tan)")
-    print("12. Logarithm (log)")
-    print("13. Natural Logarithm (ln)")
-    print("14. Absolute Value (|x|)")
-    print("15. Show History")
-    print("16. Clear History")
+    for number, op in enumerate(OPERATION_LIST, 1):
+        print(f"{f'{number}.':<4}{op.title} ({op.symbol})")
+    print("16. Show History")
+    print("17. Clear History")
+    print("18. Evaluate Expression")
+    print("19. Operation Stats")
+    print("20. Integrate Expression")
+    print("21. Solve Equation")
     print("0.  Exit")
     print("="*50)
 
-def main():
+class BatchError(Exception):
+    """Raised to stop a batch run under the 'stop' error policy"""
+
+def parse_operand(text, calc, integer=False):
+    """Parse an operand; integer operations get an int when the text is one"""
+    if integer:
+        try:
+            return int(text)
+        except ValueError:
+            pass  # let the operation report its own domain error
+    return calc.parse_number(text)
+
+def read_operations(lines):
+    """Split input lines into (line number, name, operand texts), skipping blanks and # comments"""
+    for number, line in enumerate(lines, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        yield number, fields[0].lower(), fields[1:]
+
+def evaluate_operations(operations, calc):
+    """Yield (line number, result) for each parsed operation; failures become "Error: ..." strings"""
+    for number, name, operands in operations:
+        op = OPERATIONS.get(name)
+        if op is None:
+            yield number, f"Error: Unknown operation '{name}'"
+            continue
+        if not op.required <= len(operands) <= op.arity:
+            yield number, f"Error: '{name}' takes {op.arity} operand(s), got {len(operands)}"
+            continue
+        try:
+            values = [parse_operand(text, calc, op.integer_only) for text in operands]
+            yield number, dispatch(calc, op, *values)
+        except (ValueError, ArithmeticError, TypeError) as e:
+            yield number, f"Error: {e}"
+
+def format_results(results, on_error, stats):
+    """Render results as output lines, applying the error policy"""
+    for number, result in results:
+        stats['operations'] += 1
+        if isinstance(result, str) and result.startswith("Error"):
+            stats['errors'] += 1
+            if on_error == 'stop':
+                raise BatchError(f"line {number}: {result}")
+            if on_error == 'skip':
+                continue
+            yield result
+        else:
+            yield format_number(result)
+
+def write_lines(lines, out, buffer_lines):
+    """Write lines, flushing every `buffer_lines` lines"""
+    pending = []
+    for line in lines:
+        pending.append(line)
+        if len(pending) >= buffer_lines:
+            pending.append('')
+            out.write('\n'.join(pending))
+            out.flush()
+            pending.clear()
+    if pending:
+        pending.append('')
+        out.write('\n'.join(pending))
+        out.flush()
+
+def run_batch(calc, source, out, on_error='continue', buffer_lines=1024):
+    """Stream operations from `source` lines to `out`; returns a stats dict.
+
+    Every stage is a generator, so memory stays constant however long the input is.
+    """
+    stats = {'operations': 0, 'errors': 0}
+    start = time.perf_counter()
+    try:
+        results = evaluate_operations(read_operations(source), calc)
+        write_lines(format_results(results, on_error, stats), out, buffer_lines)
+    finally:
+        stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def batch_main(args, calc):
+    """Entry point for --batch"""
+    source = sys.stdin if args.batch == '-' else open(args.batch, encoding='utf-8')
+    try:
+        stats = run_batch(calc, source, sys.stdout, args.on_error, args.buffer)
+    except BatchError as e:
+        print(f"Batch stopped at {e}", file=sys.stderr)
+        return 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    if args.stats:
+        rate = stats['operations'] / stats['seconds'] if stats['seconds'] else 0.0
+        print(f"{stats['operations']} operations, {stats['errors']} errors "
+              f"in {stats['seconds']:.3f}s ({rate:,.0f} ops/s)", file=sys.stderr)
+        if calc.instrumentation is not None:
+            for line in format_snapshot(calc.instrumentation.snapshot()):
+                print(line, file=sys.stderr)
+    return 0
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Advanced Calculator")
+    parser.add_argument("--mode", choices=("float", "decimal", "fraction"), default="float",
+                        help="numeric mode: fast floats (default), Decimal or exact Fraction")
+    parser.add_argument("--precision", type=int, default=28,
+                        help="significant digits for decimal mode and irrational fraction results")
+    parser.add_argument("--history-file", metavar="PATH",
+                        help="keep history in a persistent log at PATH (kept across runs)")
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                       help="read operations such as 'add 3 4' one per line from FILE (default stdin) "
+                            "and stream results to stdout")
+    batch.add_argument("--on-error", choices=("continue", "skip", "stop"), default="continue",
+                       help="print errors inline (continue), omit them (skip) or abort (stop)")
+    batch.add_argument("--buffer", type=int, default=1024, metavar="LINES",
+                       help="output lines to buffer between flushes (1 = unbuffered)")
+    batch.add_argument("--stats", action="store_true",
+                       help="report operation count, throughput and per-operation timings "
+                            "on stderr when done")
+    statistics = parser.add_argument_group("statistics")
+    statistics.add_argument("--summarize", nargs="?", const="-", metavar="FILE",
+                            help="print count, sum, product, mean, variance, min/max and quantiles "
+                                 "of the numbers in FILE (default stdin), in one pass")
+    tables = parser.add_argument_group("tabulation")
+    tables.add_argument("--tabulate", metavar="TARGET",
+                        help="write a CSV table of an operation (e.g. sin, power) or an expression "
+                             "(e.g. 'x^2 + y') over the --range grid to stdout")
+    tables.add_argument("--range", action="append", default=[], metavar="SPEC", dest="ranges",
+                        help="one grid axis as [name=]start:stop[:step] or start:stop:Nj for N points, "
+                             "e.g. x=0:2*pi:65j (repeat for more dimensions)")
+    matrices = parser.add_argument_group("linear algebra")
+    matrices.add_argument("--matrix", nargs="+", metavar=("OPERATION", "OPERAND"),
+                          help="run a matrix operation (determinant, inverse, solve, multiply, "
+                               "transpose, qr, cholesky, svd, eigen, rank) on operands given as "
+                               "files (.npy files are memory-mapped) or text such as '1 2; 3 4'")
+    return parser.parse_args(argv)
+
+def summarize_main(args):
+    """Entry point for --summarize"""
+    from stream_stats import parse_numbers, summarize  # NumPy is only needed for statistics
+
+    source = sys.stdin if args.summarize == '-' else open(args.summarize, encoding='utf-8')
+    try:
+        summary = summarize(parse_numbers(source))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    quantiles = summary.pop('quantiles')
+    for name, value in list(summary.items()) + list(quantiles.items()):
+        print(f"{name}: {value}")
+    return 0
+
+def tabulate_main(args):
+    """Entry point for --tabulate"""
+    from tabulate import parse_ranges, write_csv  # NumPy is only needed for tables
+
+    try:
+        write_csv(sys.stdout, args.tabulate, *parse_ranges(args.ranges))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+def matrix_main(args):
+    """Entry point for --matrix"""
+    import os
+
+    import numpy as np  # NumPy is only needed for matrices
+    from linalg import compute, load, shape_text
+
+    operation, *operands = args.matrix
+    try:
+        results = compute(operation, *(load(operand) if os.path.exists(operand) else operand
+                                       for operand in operands))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for name, value in results.items():
+        if np.ndim(value):
+            print(f"# {name} ({shape_text(np.shape(value))})")
+            np.savetxt(sys.stdout, np.atleast_2d(value), fmt="%.17g")
+        else:
+            print(f"{name}: {value}")
+    return 0
+
+def main(argv=None):
     """Main calculator function"""
-    calc = Calculator()
+    from precision import create_calculator
     
+    args = parse_args(argv)
+    if args.summarize:
+        return summarize_main(args)
+    if args.tabulate:
+        return tabulate_main(args)
+    if args.matrix:
+        return matrix_main(args)
+    history = HistoryLog(args.history_file) if args.history_file else None
+    try:
+        if args.batch:
+            calc = create_calculator(args.mode, args.precision, history_capacity=0, history=history)
+            if args.stats:
+                calc.instrumentation = Instrumentation()
+            return batch_main(args, calc)
+        calc = create_calculator(args.mode, args.precision, history=history)
+        calc.instrumentation = Instrumentation()
+        interactive(calc)
+    finally:
+        if history is not None:
+            history.close()
+
+def interactive(calc):
+    """Run the menu loop"""
     print("Welcome to the Advanced Calculator!")
     print("This calculator supports all basic and advanced math operations.")
     
@@ -178,97 +666,75 @@ def main():
         display_menu()
         
         try:
-            choice = input("\nEnter your choice (0-16): ").strip()
+            choice = input("\nEnter your choice (0-21): ").strip()
             
             if choice == "0":
                 print("Thank you for using the calculator! Goodbye!")
                 break
             
-            elif choice == "1":  # Addition
-                a = get_number("Enter first number: ")
-                b = get_number("Enter second number: ")
-                result = calc.add(a, b)
-                print(f"Result: {result}")
-            
-            elif choice == "2":  # Subtraction
-                a = get_number("Enter first number: ")
-                b = get_number("Enter second number: ")
-                result = calc.subtract(a, b)
-                print(f"Result: {result}")
-            
-            elif choice == "3":  # Multiplication
-                a = get_number("Enter first number: ")
-                b = get_number("Enter second number: ")
-                result = calc.multiply(a, b)
-                print(f"Result: {result}")
-            
-            elif choice == "4":  # Division
-                a = get_number("Enter first number: ")
-                b = get_number("Enter second number: ")
-                result = calc.divide(a, b)
-                print(f"Result: {result}")
+            elif choice in MENU:
+                op = MENU[choice]
+                if op.integer_only:
+                    values = [get_integer(prompt) for prompt in op.prompts]
+                else:
+                    values = [get_number(prompt, calc.parse_number) for prompt in op.prompts]
+                result = dispatch(calc, op, *values)
+                print(f"Result: {format_number(result)}")
             
-            elif choice == "5":  # Power
-                a = get_number("Enter base: ")
-                b = get_number("Enter exponent: ")
-                result = calc.power(a, b)
-                print(f"Result: {result}")
-            
-            elif choice == "6":  # Square Root
-                a = get_number("Enter number: ")
-                result = calc.square_root(a)
-                print(f"Result: {result}")
-            
-            elif choice == "7":  # Modulo
-                a = get_number("Enter first number: ")
-                b = get_number("Enter second number: ")
-                result = calc.modulo(a, b)
-                print(f"Result: {result}")
-            
-            elif choice == "8":  # Factorial
-                a = get_integer("Enter integer: ")
-                result = calc.factorial(a)
-                print(f"Result: {result}")
-            
-            elif choice == "9":  # Sine
-                a = get_number("Enter angle in radians: ")
-                result = calc.sine(a)
-                print(f"Result: {result}")
-            
-            elif choice == "10":  # Cosine
-                a = get_number("Enter angle in radians: ")
-                result = calc.cosine(a)
-                print(f"Result: {result}")
+            elif choice == "16":  # Show History
+                calc.show_history()
             
-            elif choice == "11":  # Tangent
-                a = get_number("Enter angle in radians: ")
-                result = calc.tangent(a)
-                print(f"Result: {result}")
+            elif choice == "17":  # Clear History
+                calc.clear_history()
             
-            elif choice == "12":  # Logarithm
-                a = get_number("Enter number: ")
-                base = get_number("Enter base (default 10): ")
-                result = calc.logarithm(a, base)
-                print(f"Result: {result}")
+            elif choice == "18":  # Evaluate Expression
+                expression = input("Enter expression (e.g. 2*sin(x) + log(y, 3)): ").strip()
+                try:
+                    names = compile_expression(expression).variables
+                except ValueError as e:
+                    print(f"Result: Error: {e}")
+                    continue
+                values = {name: get_number(f"Enter {name}: ") for name in names}
+                result = calc.evaluate(expression, **values)
+                print(f"Result: {format_number(result)}")
             
-            elif choice == "13":  # Natural Logarithm
-                a = get_number("Enter number: ")
-                result = calc.natural_log(a)
-                print(f"Result: {result}")
+            elif choice == "19":  # Operation Stats
+                for line in format_snapshot(calc.instrumentation.snapshot()):
+                    print(line)
             
-            elif choice == "14":  # Absolute Value
-                a = get_number("Enter number: ")
-                result = calc.absolute(a)
-                print(f"Result: {result}")
+            elif choice == "20":  # Integrate Expression
+                expression = input("Enter integrand in x (e.g. sin(x)^2): ").strip()
+                try:
+                    names = compile_expression(expression).variables
+                except ValueError as e:
+                    print(f"Result: Error: {e}")
+                    continue
+                a = get_number("Enter lower limit (inf allowed): ")
+                b = get_number("Enter upper limit (inf allowed): ")
+                values = {name: get_number(f"Enter {name}: ") for name in names if name != 'x'}
+                result = calc.integrate(expression, a, b, **values)
+                print(f"Result: {format_number(result)}")
             
-            elif choice == "15":  # Show History
-                calc.show_history()
-            
-            elif choice == "16":  # Clear History
-                calc.clear_history()
+            elif choice == "21":  # Solve Equation
+                equation = input("Enter equation in x (e.g. x^3 - 2*x = 5): ").strip()
+                try:
+                    names = compile_expression(equation_source(equation)).variables
+                except ValueError as e:
+                    print(f"Result: Error: {e}")
+                    continue
+                method = input("Method - brent, newton or all roots (default brent): ").strip().lower()
+                method = method or 'brent'
+                values = {name: get_number(f"Enter {name}: ") for name in names if name != 'x'}
+                if method == 'newton':
+                    result = calc.solve(equation, method, x0=get_number("Enter starting point: "), **values)
+                else:
+                    a = get_number("Enter lower end of the interval: ")
+                    b = get_number("Enter upper end of the interval: ")
+                    result = calc.solve(equation, method, a, b, **values)
+                print(f"Result: x = {format_number(result)}")
             
             else:
-                print("Invalid choice! Please enter a number between 0-16.")
+                print("Invalid choice! Please enter a number between 0-21.")
         
         except KeyboardInterrupt:
             print("\n\nCalculator interrupted. Goodbye!")
@@ -277,4 +743,4 @@ def main():
             print(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Expression Engine
+Parses infix expressions such as "2*sin(x) + log(y, 3)" and compiles them to
+Python callables, with an LRU cache of compiled expressions keyed by source
+"""
+
+import math
+import re
+from functools import lru_cache
+
+from factorial import FACTORIALS, MAX_POWER_BITS, power_bits, power_size_error
+
+CACHE_SIZE = 256
+# Nesting levels allowed in an expression: parentheses, function calls,
+# unary signs and powers. Deeper input would overflow the parser's stack or
+# Python's compiler, so it is refused as malformed.
+MAX_DEPTH = 100
+
+
+class ExpressionError(ValueError):
+    """Raised for malformed expressions and missing variables"""
+
+
+# ---------------------------------------------------------------------------
+# Functions available inside expressions (same domain rules as Calculator)
+# ---------------------------------------------------------------------------
+
+def _divide(a, b):
+    if b == 0:
+        raise ValueError("Division by zero!")
+    return a / b
+
+
+def _modulo(a, b):
+    if b == 0:
+        raise ValueError("Modulo by zero!")
+    return a % b
+
+
+def _sqrt(a):
+    if a < 0:
+        raise ValueError("Cannot calculate square root of negative number!")
+    return math.sqrt(a)
+
+
+def _factorial(a):
+    if a < 0:
+        raise ValueError("Factorial of negative number!")
+    if a != int(a):
+        raise ValueError("Factorial only for integers!")
+    return FACTORIALS.factorial(int(a))
+
+
+def _power(a, b):
+    # Same domain rules as Calculator.power: no complex results (array operands,
+    # from vectorized, are left to NumPy) ...
+    if type(b) is float and not b.is_integer() and type(a) in (int, float) and a < 0:
+        raise ValueError("Negative base with fractional exponent!")
+    # ... and integer literals stay exact, so refuse a power over
+    # MAX_POWER_BITS before computing it
+    if type(a) is int and type(b) is int and b > 0 and abs(a).bit_length() * b > MAX_POWER_BITS:
+        error = power_size_error(power_bits(a, b))
+        if error:
+            raise ValueError(error.removeprefix("Error: "))
+    return a ** b
+
+
+def _log(a, base=10):
+    if a <= 0:
+        raise ValueError("Logarithm of non-positive number!")
+    if base <= 0 or base == 1:
+        raise ValueError("Invalid logarithm base!")
+    return math.log(a, base)
+
+
+def _ln(a):
+    if a <= 0:
+        raise ValueError("Natural logarithm of non-positive number!")
+    return math.log(a)
+
+
+# name -> (callable, minimum arity, maximum arity)
+FUNCTIONS = {
+    'sqrt': (_sqrt, 1, 1),
+    'sin': (math.sin, 1, 1),
+    'cos': (math.cos, 1, 1),
+    'tan': (math.tan, 1, 1),
+    'log': (_log, 1, 2),
+    'ln': (_ln, 1, 1),
+    'abs': (abs, 1, 1),
+    'factorial': (_factorial, 1, 1),
+    'pow': (_power, 2, 2),
+    'mod': (_modulo, 2, 2),
+}
+
+CONSTANTS = {
+    'pi': math.pi,
+    'e': math.e,
+}
+
+# ---------------------------------------------------------------------------
+# Tokenizer and parser
+# ---------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>[A-Za-z][A-Za-z0-9_]*)
+      | (?P<op>\*\*|[-+*/%^!(),])
+    )""", re.VERBOSE)
+
+
+def tokenize(source):
+    """Split an expression into (kind, text) tokens"""
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = _TOKEN.match(source, position)
+        if not match:
+            raise ExpressionError(f"Unexpected character {source[position:].lstrip()[:1]!r} "
+                                  f"at position {position}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    tokens.append(('end', ''))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing a tuple AST.
+
+    Nodes: ('num', value), ('var', name), ('neg', node), ('fact', node),
+    ('bin', op, left, right) and ('call', name, [args]).
+    """
+
+    def __init__(self, source):
+        self.tokens = tokenize(source)
+        self.index = 0
+        self.depth = 0
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, text):
+        kind, value = self.take()
+        if value != text:
+            raise ExpressionError(f"Expected {text!r} but found {value or 'end of input'!r}")
+
+    def nested(self, rule):
+        """rule() one nesting level deeper, up to MAX_DEPTH"""
+        if self.depth >= MAX_DEPTH:
+            raise ExpressionError(f"Expression nested more than {MAX_DEPTH} levels deep")
+        self.depth += 1
+        try:
+            return rule()
+        finally:
+            self.depth -= 1
+
+    def parse(self):
+        node = self.sum()
+        if self.peek()[0] != 'end':
+            raise ExpressionError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def sum(self):
+        node = self.term()
+        while self.peek()[1] in ('+', '-'):
+            op = self.take()[1]
+            node = ('bin', op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek()[1] in ('*', '/', '%'):
+            op = self.take()[1]
+            node = ('bin', op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek()[1] == '-':
+            self.take()
+            return ('neg', self.nested(self.unary))
+        if self.peek()[1] == '+':
+            self.take()
+            return self.nested(self.unary)
+        return self.power()
+
+    def power(self):
+        node = self.postfix()
+        if self.peek()[1] in ('**', '^'):
+            self.take()
+            node = ('bin', '**', node, self.nested(self.unary))  # right associative
+        return node
+
+    def postfix(self):
+        node = self.atom()
+        while self.peek()[1] == '!':
+            self.take()
+            node = ('fact', node)
+        return node
+
+    def atom(self):
+        kind, text = self.take()
+        if kind == 'number':
+            if text.isdigit():
+                return ('num', int(text))
+            value = float(text)
+            if not math.isfinite(value):
+                raise ExpressionError(f"Number out of range: {text}")
+            return ('num', value)
+        if kind == 'name':
+            if self.peek()[1] == '(':
+                return self.call(text)
+            if text in CONSTANTS:
+                return ('num', CONSTANTS[text])
+            return ('var', text)
+        if text == '(':
+            node = self.nested(self.sum)
+            self.expect(')')
+            return node
+        raise ExpressionError(f"Unexpected {text or 'end of input'!r}")
+
+    def call(self, name):
+        if name not in FUNCTIONS:
+            raise ExpressionError(f"Unknown function '{name}'")
+        self.expect('(')
+        args = []
+        if self.peek()[1] != ')':
+            args.append(self.nested(self.sum))
+            while self.peek()[1] == ',':
+                self.take()
+                args.append(self.nested(self.sum))
+        self.expect(')')
+        _, low, high = FUNCTIONS[name]
+        if not low <= len(args) <= high:
+            raise ExpressionError(f"Function '{name}' takes {low if low == high else f'{low}-{high}'} "
+                                  f"argument(s), got {len(args)}")
+        return ('call', name, args)
+
+
+def parse(source):
+    """Parse an expression into its AST"""
+    return _Parser(source).parse()
+
+
+# ---------------------------------------------------------------------------
+# Compiler
+# ---------------------------------------------------------------------------
+
+def _variables(node, found):
+    kind = node[0]
+    if kind == 'var':
+        if node[1] not in found:
+            found.append(node[1])
+    elif kind in ('neg', 'fact'):
+        _variables(node[1], found)
+    elif kind == 'bin':
+        _variables(node[2], found)
+        _variables(node[3], found)
+    elif kind == 'call':
+        for arg in node[2]:
+            _variables(arg, found)
+    return found
+
+
+def _emit(node, slots):
+    """Generate Python source for a node; helpers and variables are renamed
+    so user names can never collide with Python keywords or builtins"""
+    kind = node[0]
+    if kind == 'num':
+        return repr(node[1])
+    if kind == 'var':
+        return slots[node[1]]
+    if kind == 'neg':
+        return f"(-{_emit(node[1], slots)})"
+    if kind == 'fact':
+        return f"_f_factorial({_emit(node[1], slots)})"
+    if kind == 'bin':
+        op, left, right = node[1], _emit(node[2], slots), _emit(node[3], slots)
+        if op == '/':
+            return f"_f_divide({left}, {right})"
+        if op == '%':
+            return f"_f_modulo({left}, {right})"
+        if op == '**':
+            return f"_f_power({left}, {right})"
+        return f"({left} {op} {right})"
+    args = ", ".join(_emit(arg, slots) for arg in node[2])
+    return f"_f_{node[1]}({args})"
+
+
+class CompiledExpression:
+    """A parsed and compiled expression, callable with variable values.
+
+    Call positionally in `variables` order, or by keyword (extra keywords are
+    ignored). `function` is the raw compiled callable for hot loops.
+    """
+
+    __slots__ = ('source', 'tree', 'variables', 'function')
+
+    def __init__(self, source, tree, variables, function):
+        self.source = source
+        self.tree = tree
+        self.variables = variables
+        self.function = function
+
+    def __call__(self, *args, **kwargs):
+        if len(args) != len(self.variables):
+            try:
+                args += tuple(kwargs[name] for name in self.variables[len(args):])
+            except KeyError as e:
+                raise ExpressionError(f"Missing value for variable {e.args[0]!r}") from None
+            if len(args) != len(self.variables):
+                raise ExpressionError(f"Expression takes {len(self.variables)} value(s), "
+                                      f"got {len(args)}")
+        return self.function(*args)
+
+    def bind(self, variable, **values):
+        """One-argument function of `variable`, with every other variable the
+        expression uses fixed from `values` (extra values are ignored)"""
+        slots = []
+        for name in self.variables:
+            if name == variable:
+                slots.append(None)
+            elif name in values:
+                slots.append(values[name])
+            else:
+                raise ExpressionError(f"Missing value for variable {name!r}")
+        function = self.function
+        if slots == [None]:
+            return function
+        if None not in slots:
+            return lambda x: function(*slots)
+        position = slots.index(None)
+        before, after = slots[:position], slots[position + 1:]
+        return lambda x: function(*before, x, *after)
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r}, variables={self.variables})"
+
+
+def _namespace():
+    namespace = {f"_f_{name}": function for name, (function, _, _) in FUNCTIONS.items()}
+    namespace['_f_divide'] = _divide
+    namespace['_f_modulo'] = _modulo
+    namespace['_f_power'] = _power
+    namespace['__builtins__'] = {}
+    return namespace
+
+
+_NAMESPACE = _namespace()
+
+
+def _compile(source, helpers=_NAMESPACE):
+    """Compile `source` against `helpers`, the _f_* function namespace"""
+    tree = parse(source)
+    namespace = dict(helpers)
+    try:
+        variables = tuple(_variables(tree, []))
+        slots = {name: f"_v{i}" for i, name in enumerate(variables)}
+        code = f"def _expression({', '.join(slots.values())}):\n    return {_emit(tree, slots)}\n"
+        exec(compile(code, f"<expression {source!r}>", 'exec'), namespace)
+    except (RecursionError, SyntaxError, MemoryError):
+        # Long operator chains nest without parentheses in the source
+        raise ExpressionError("Expression is too deeply nested") from None
+    return CompiledExpression(source, tree, variables, namespace['_expression'])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_expression(source):
+    """Compile an expression, reusing the cached result for repeated source text.
+
+    Cache statistics are available from compile_expression.cache_info().
+    """
+    return _compile(source)
+
+
+def equation_source(equation):
+    """Expression source whose roots solve `equation`: "lhs = rhs" becomes
+    "(lhs) - (rhs)"; an expression without "=" is solved for zero"""
+    sides = equation.split('=')
+    if len(sides) > 2:
+        raise ExpressionError("An equation may contain only one '='")
+    if len(sides) == 1:
+        return equation
+    lhs, rhs = (side.strip() for side in sides)
+    if not lhs or not rhs:
+        raise ExpressionError("Both sides of the equation are needed")
+    return f"({lhs}) - ({rhs})"
+
+
+def evaluate(source, **variables):
+    """Evaluate an expression with the given variable values"""
+    return compile_expression(source)(**variables)
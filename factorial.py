@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Factorial Engine
+Exact big-integer factorials with a memoized table, plus cheap lgamma-based
+size estimates for callers that only need the magnitude, and the size
+guard for exact integer powers
+"""
+
+import bisect
+import math
+import sys
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_N = 100000
+DEFAULT_MEMO_BITS = 1 << 28  # ~32 MB of memoized factorials
+
+# Largest exact integer power, in bits (about 630,000 digits)
+MAX_POWER_BITS = 1 << 21
+
+# Below this math.factorial is cheaper than any table lookup bookkeeping
+SMALL_N = 1000
+
+_LOG10_2 = math.log10(2)
+
+
+def range_product(low, high):
+    """Product of the integers low..high (inclusive) by binary splitting.
+
+    Splitting keeps the operands of each multiplication balanced, which is
+    what makes big-integer products fast (Karatsuba works best on equal sizes).
+    """
+    if low > high:
+        return 1
+    if high - low < 16:
+        result = low
+        for k in range(low + 1, high + 1):
+            result *= k
+        return result
+    middle = (low + high) // 2
+    return range_product(low, middle) * range_product(middle + 1, high)
+
+
+def log10_factorial(n):
+    """log10(n!) via lgamma, without computing n!"""
+    return math.lgamma(n + 1) / math.log(10)
+
+
+def estimate_factorial(n):
+    """Approximate n! as (mantissa, exponent) with n! ≈ mantissa * 10**exponent"""
+    if n < 2:
+        return 1.0, 0
+    log_value = log10_factorial(n)
+    exponent = math.floor(log_value)
+    return 10 ** (log_value - exponent), exponent
+
+
+def factorial_digits(n):
+    """Approximate number of decimal digits in n! (exact except at rare boundaries)"""
+    if n < 2:
+        return 1
+    return math.floor(log10_factorial(n)) + 1
+
+
+def power_bits(base, exponent):
+    """Bit length of the integer base ** exponent (exponent >= 0), estimated
+    from log2(base) so the power itself is never computed"""
+    base = abs(base)
+    if base < 2 or exponent == 0:
+        return base.bit_length()
+    if exponent > MAX_POWER_BITS:  # base >= 2, so at least `exponent` bits
+        return exponent
+    return math.floor(exponent * math.log2(base)) + 1
+
+
+def power_size_error(bits):
+    """Error string for a power of `bits` bits that is over MAX_POWER_BITS, else None"""
+    if bits <= MAX_POWER_BITS:
+        return None
+    limit = math.floor(MAX_POWER_BITS * _LOG10_2)
+    if bits > 1 << 53:  # an exact exponent can be too large for a float estimate
+        return f"Error: Result would have more than {limit:,} digits!"
+    return f"Error: Result would have about {math.ceil(bits * _LOG10_2):,} digits (limit {limit:,})!"
+
+
+def _max_str_digits():
+    getter = getattr(sys, 'get_int_max_str_digits', None)
+    return (getter() if getter else 0) or 4300
+
+
+def format_number(value, max_digits=None):
+    """str(value), except integers too long to print are summarized as
+    "≈1.234567890e+35659 (35660 digits)" instead of raising ValueError"""
+    if type(value) is not int:
+        return str(value)
+    if max_digits is None:
+        max_digits = _max_str_digits()
+    bits = abs(value).bit_length()
+    if bits * _LOG10_2 < max_digits - 1:
+        return str(value)
+    shift = max(bits - 64, 0)
+    log_value = math.log10(abs(value) >> shift) + shift * _LOG10_2
+    exponent = math.floor(log_value)
+    mantissa = 10 ** (log_value - exponent)
+    sign = '-' if value < 0 else ''
+    return f"≈{sign}{mantissa:.10f}e+{exponent} ({exponent + 1} digits)"
+
+
+class FactorialEngine:
+    """Exact factorials with a bounded memo table.
+
+    Cold values come from math.factorial (a binary-splitting product in C).
+    Requests near a memoized value are extended incrementally with
+    range_product, so sweeps like 5000!, 5001!, ... cost one small product
+    each. The table is bounded by total bits and evicts least recently used.
+    The table is locked, so one engine can serve many threads; products are
+    computed outside the lock.
+    """
+
+    def __init__(self, max_n=DEFAULT_MAX_N, memo_bits=DEFAULT_MEMO_BITS):
+        self.max_n = max_n
+        self.memo_bits = memo_bits
+        self._memo = OrderedDict()
+        self._keys = []
+        self._bits = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.incremental = 0
+        self.misses = 0
+
+    def limit_error(self, n):
+        """Calculator error string for an `n` over max_n, else None; `n` may be
+        any number, so huge Decimals and Fractions are refused before int()"""
+        if n > self.max_n:
+            return f"Error: Factorial limited to n <= {self.max_n}!"
+        return None
+
+    def factorial(self, n):
+        """Exact n! for 0 <= n <= max_n"""
+        if n < 0:
+            raise ValueError("Factorial of negative number!")
+        error = self.limit_error(n)
+        if error:
+            raise ValueError(error.removeprefix("Error: "))
+        if n < SMALL_N:
+            return math.factorial(n)
+
+        memo = self._memo
+        with self._lock:
+            if n in memo:
+                memo.move_to_end(n)
+                self.hits += 1
+                return memo[n]
+            index = bisect.bisect_left(self._keys, n) - 1
+            base = self._keys[index] if index >= 0 else 0
+            if base and base * 2 >= n:
+                memo.move_to_end(base)
+                base_value = memo[base]
+            else:
+                base = 0
+
+        if base:
+            # Extending from a memoized neighbour is cheaper than starting over
+            result = base_value * range_product(base + 1, n)
+            self.incremental += 1
+        else:
+            result = math.factorial(n)
+            self.misses += 1
+        with self._lock:
+            self._remember(n, result)
+        return result
+
+    def _remember(self, n, value):
+        bits = value.bit_length()
+        if bits > self.memo_bits or n in self._memo:  # another thread got there first
+            return
+        while self._bits + bits > self.memo_bits:
+            old, old_value = self._memo.popitem(last=False)
+            self._keys.pop(bisect.bisect_left(self._keys, old))
+            self._bits -= old_value.bit_length()
+        self._memo[n] = value
+        bisect.insort(self._keys, n)
+        self._bits += bits
+
+    def clear(self):
+        """Drop the memo table"""
+        with self._lock:
+            self._memo.clear()
+            self._keys.clear()
+            self._bits = 0
+
+    def stats(self):
+        """Memo table counters"""
+        return {
+            'entries': len(self._memo),
+            'bits': self._bits,
+            'hits': self.hits,
+            'incremental': self.incremental,
+            'misses': self.misses,
+        }
+
+
+# Shared by every Calculator so the memo survives short-lived instances
+FACTORIALS = FactorialEngine()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Fast Approximate Math
+Vectorized NumPy approximations for bulk trig and log evaluation, each with
+a stated maximum error and an accuracy check against the math module
+"""
+
+import math
+
+import numpy as np
+
+# Work on cache-sized slices with preallocated scratch buffers, so each of
+# the ~25 passes of the polynomial runs over data already in cache
+CHUNK = 8192
+
+# Cody-Waite split of pi: PI_HI has 33 significant bits, so m * PI_HI is exact
+# for half-integers |m| < 2**19, and x - m*pi is computed to within an ulp
+INVERSE_PI = 0.3183098861837907
+PI_HI = 3.1415926534682512
+PI_LO = 1.2154201013012384e-10
+
+# Trig arguments beyond this (and inf/nan) fall back to NumPy's exact functions
+TRIG_LIMIT = 2.0 ** 18 * math.pi
+
+# Odd Taylor series of sin on [-pi/2, pi/2]; the first omitted term is below 2**-59
+SIN_COEFFICIENTS = (
+    -0.16666666666666666, 0.008333333333333333, -0.0001984126984126984,
+    2.7557319223985893e-06, -2.505210838544172e-08, 1.6059043836821613e-10,
+    -7.647163731819816e-13, 2.8114572543455206e-15, -8.22063524662433e-18,
+    1.9572941063391263e-20,
+)
+
+# Stated maximum error of each function, in units of 2**-52 * max(1, |f(x)|):
+# ULPs of the result where |f(x)| >= 1, a fixed absolute error below that.
+# check_accuracy() measures the real error against the math module.
+MAX_ERROR = {
+    'sin': 2.0,
+    'cos': 2.0,
+    'tan': 2.0,
+    'ln': 1.0,
+    'log': 2.0,
+}
+
+
+def _sine_chunk(x, offset, out, k, r, r2, p):
+    """out = sin(x) (offset 0) or cos(x) (offset 0.5) for one chunk.
+
+    x = (k + offset)*pi + r with |r| <= pi/2, so the result is
+    +-sin(r) with the sign set by the parity of k.
+    """
+    np.multiply(x, INVERSE_PI, out=k)
+    if offset:
+        k -= offset
+    np.rint(k, out=k)
+    if offset:
+        k += offset
+    np.multiply(k, -PI_HI, out=r)
+    r += x
+    np.multiply(k, -PI_LO, out=p)
+    r += p
+    if offset:
+        k -= offset
+
+    np.multiply(r, r, out=r2)
+    np.multiply(r2, SIN_COEFFICIENTS[-1], out=p)
+    for coefficient in SIN_COEFFICIENTS[-2::-1]:
+        p += coefficient
+        p *= r2
+    p *= r
+    p += r
+
+    # (-1)**k for sine, (-1)**(k + 1) for cosine: k/2 - floor(k/2) is 0 or 1/2
+    k *= 0.5
+    np.floor(k, out=r2)
+    k -= r2
+    if offset:
+        k *= 4.0
+        k -= 1.0
+    else:
+        k *= -4.0
+        k += 1.0
+    np.multiply(p, k, out=out)
+
+
+def _sine(x, offset, exact):
+    x = np.asarray(x, dtype=np.float64)
+    flat = np.ascontiguousarray(x).ravel()
+    out = np.empty_like(flat)
+    scratch = [np.empty(min(CHUNK, flat.size)) for _ in range(4)]
+    with np.errstate(all='ignore'):
+        for start in range(0, flat.size, CHUNK):
+            chunk = flat[start:start + CHUNK]
+            size = chunk.size
+            _sine_chunk(chunk, offset, out[start:start + size], *(buffer[:size] for buffer in scratch))
+        outside = ~(np.abs(flat) <= TRIG_LIMIT)
+        if outside.any():
+            out[outside] = exact(flat[outside])
+    return out.reshape(x.shape)
+
+
+def sin(x):
+    """Approximate sine; error <= MAX_ERROR['sin']"""
+    return _sine(x, 0.0, np.sin)
+
+
+def cos(x):
+    """Approximate cosine; error <= MAX_ERROR['cos']"""
+    return _sine(x, 0.5, np.cos)
+
+
+# NumPy's own tan and log are SIMD-vectorized and already faster than any
+# polynomial built from NumPy array passes, so fast mode uses them directly;
+# their bounds are still stated and checked like the approximations'.
+
+def tan(x):
+    """Tangent (NumPy); error <= MAX_ERROR['tan']"""
+    return np.tan(np.asarray(x, dtype=np.float64))
+
+
+def ln(x):
+    """Natural logarithm (NumPy); error <= MAX_ERROR['ln']"""
+    return np.log(np.asarray(x, dtype=np.float64))
+
+
+def log(x, base=10.0):
+    """Logarithm to `base` as ln(x) / ln(base); error <= MAX_ERROR['log']"""
+    return ln(x) / ln(base)
+
+
+# name -> (fast function, scalar reference from math)
+FUNCTIONS = {
+    'sin': (sin, math.sin),
+    'cos': (cos, math.cos),
+    'tan': (tan, math.tan),
+    'ln': (ln, math.log),
+    'log': (log, math.log10),
+}
+
+# Sampling ranges for check_accuracy: (low, high, logarithmic spacing)
+DOMAINS = {
+    'sin': (-TRIG_LIMIT, TRIG_LIMIT, False),
+    'cos': (-TRIG_LIMIT, TRIG_LIMIT, False),
+    'tan': (-TRIG_LIMIT, TRIG_LIMIT, False),
+    'ln': (1e-300, 1e300, True),
+    'log': (1e-300, 1e300, True),
+}
+
+
+def error_units(approximate, exact):
+    """Error in units of 2**-52 * max(1, |exact|), the scale MAX_ERROR uses"""
+    scale = np.spacing(np.maximum(np.abs(exact), 1.0))
+    return np.abs(approximate - exact) / scale
+
+
+def check_accuracy(name, samples=200000, seed=0):
+    """Measure the worst error of one function against the math module.
+
+    Samples the function's domain (log-uniformly for logarithms) plus a
+    tenth as many arguments near 0 (trig) or 1 (logs), where cancellation
+    is worst. Returns (maximum error, stated bound, worst argument).
+    """
+    approximate, reference = FUNCTIONS[name]
+    low, high, logarithmic = DOMAINS[name]
+    rng = np.random.default_rng(seed)
+    if logarithmic:
+        x = np.exp(rng.uniform(math.log(low), math.log(high), samples))
+        near = 1.0 + rng.uniform(-0.5, 0.5, samples // 10)
+    else:
+        x = rng.uniform(low, high, samples)
+        near = rng.uniform(-4.0, 4.0, samples // 10)
+    x = np.concatenate([x, near])
+    exact = np.fromiter(map(reference, x.tolist()), dtype=np.float64, count=x.size)
+    errors = error_units(approximate(x), exact)
+    worst = int(np.argmax(errors))
+    return float(errors[worst]), MAX_ERROR[name], float(x[worst])
+
+
+def accuracy_report(samples=200000):
+    """check_accuracy for every function; returns {name: (error, bound, worst x)}"""
+    return {name: check_accuracy(name, samples) for name in FUNCTIONS}
+
+
+if __name__ == "__main__":
+    failed = False
+    for name, (error, bound, worst) in accuracy_report().items():
+        status = "ok" if error <= bound else "EXCEEDS BOUND"
+        failed |= error > bound
+        print(f"{name:4} max error {error:6.3f} (bound {bound}) at x={worst!r}  {status}")
+    raise SystemExit(1 if failed else 0)
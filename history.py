@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Calculation History Store
+Bounded, columnar ring buffer for Calculator history entries, and a sharded
+variant for calculators shared between threads
+"""
+
+import csv
+import heapq
+import itertools
+import threading
+import time
+from array import array
+from collections import deque
+
+from factorial import format_number
+
+# Operation codes stored in the op column
+OP_ADD = 0
+OP_SUBTRACT = 1
+OP_MULTIPLY = 2
+OP_DIVIDE = 3
+OP_POWER = 4
+OP_SQUARE_ROOT = 5
+OP_MODULO = 6
+OP_FACTORIAL = 7
+OP_SINE = 8
+OP_COSINE = 9
+OP_TANGENT = 10
+OP_LOGARITHM = 11
+OP_NATURAL_LOG = 12
+OP_ABSOLUTE = 13
+OP_EXPRESSION = 14
+OP_INTEGRAL = 15
+OP_SOLVE = 16
+OP_MATRIX = 17
+OP_POWMOD = 18
+
+# Set on the op code of batch summary records
+BATCH_FLAG = 0x80
+
+# Calculator method name -> op code
+OP_CODES = {
+    'add': OP_ADD,
+    'subtract': OP_SUBTRACT,
+    'multiply': OP_MULTIPLY,
+    'divide': OP_DIVIDE,
+    'power': OP_POWER,
+    'square_root': OP_SQUARE_ROOT,
+    'modulo': OP_MODULO,
+    'factorial': OP_FACTORIAL,
+    'sine': OP_SINE,
+    'cosine': OP_COSINE,
+    'tangent': OP_TANGENT,
+    'logarithm': OP_LOGARITHM,
+    'natural_log': OP_NATURAL_LOG,
+    'absolute': OP_ABSOLUTE,
+    'evaluate': OP_EXPRESSION,
+    'integrate': OP_INTEGRAL,
+    'solve': OP_SOLVE,
+    'matrix': OP_MATRIX,
+    'powmod': OP_POWMOD,
+}
+OP_NAMES = {code: name for name, code in OP_CODES.items()}
+
+def _bindings(variables):
+    return ", ".join(f"{name}={value}" for name, value in variables.items())
+
+
+# Text templates, only applied when history is displayed or exported
+FORMATS = {
+    OP_ADD: lambda a, b, r: f"{a} + {b} = {r}",
+    OP_SUBTRACT: lambda a, b, r: f"{a} - {b} = {r}",
+    OP_MULTIPLY: lambda a, b, r: f"{a} * {b} = {r}",
+    OP_DIVIDE: lambda a, b, r: f"{a} / {b} = {r}",
+    OP_POWER: lambda a, b, r: f"{a} ** {b} = {r}",
+    OP_SQUARE_ROOT: lambda a, b, r: f"√{a} = {r}",
+    OP_MODULO: lambda a, b, r: f"{a} % {b} = {r}",
+    OP_FACTORIAL: lambda a, b, r: f"{a}! = {r}",
+    OP_SINE: lambda a, b, r: f"sin({a}) = {r}",
+    OP_COSINE: lambda a, b, r: f"cos({a}) = {r}",
+    OP_TANGENT: lambda a, b, r: f"tan({a}) = {r}",
+    OP_LOGARITHM: lambda a, b, r: f"log_{b}({a}) = {r}",
+    OP_NATURAL_LOG: lambda a, b, r: f"ln({a}) = {r}",
+    OP_ABSOLUTE: lambda a, b, r: f"|{a}| = {r}",
+    OP_EXPRESSION: lambda a, b, r: f"{a} = {r}" if not b else f"{a} [{_bindings(b)}] = {r}",
+    OP_INTEGRAL: lambda a, b, r: f"∫ {a} d{b['variable']} from {b['from']} to {b['to']} = {r}",
+    OP_SOLVE: lambda a, b, r: f"{a} ⇒ {b['variable']} = {r} ({b['method']})",
+    OP_MATRIX: lambda a, b, r: f"{a}({', '.join(b)}) → {_bindings(r)}",
+    OP_POWMOD: lambda a, b, r: f"{a} ** {format_number(b[0])} mod {format_number(b[1])} = {r}",
+}
+
+DEFAULT_CAPACITY = 10000
+
+# ShardedHistory folds finished threads' shards into its archive once it
+# holds this many shards, or twice the number left after the last fold
+PRUNE_SHARDS = 32
+
+# Flag bits: which columns hold integers, and whether the entry is boxed
+A_INT = 1
+B_INT = 2
+RESULT_INT = 4
+BOXED = 8
+
+_MAX_EXACT_INT = 2 ** 53
+
+
+def _int_flag(value, bit):
+    """Flag for a non-float value: `bit` if it fits a double exactly, else BOXED"""
+    if type(value) is int and -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT:
+        return bit
+    return BOXED
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return float('nan')
+
+
+def _printable(value):
+    return format_number(value) if type(value) is int else value
+
+
+def format_entry(op, a, b, result):
+    """Render one history entry as text"""
+    if op & BATCH_FLAG:
+        name = OP_NAMES.get(op & ~BATCH_FLAG, 'unknown')
+        return f"{name}[batch] n={a} errors={b}"
+    if type(result) is int or type(a) is int or type(b) is int:
+        # Integers too long for str() are summarized instead of raising
+        a, b, result = _printable(a), _printable(b), _printable(result)
+    return FORMATS[op](a, b, result)
+
+
+class HistoryStore:
+    """Ring buffer of (op, a, b, result, timestamp) records kept in typed arrays.
+
+    Floats and small integers are stored unboxed; anything else (big
+    integers, Decimals, strings) is kept in a side table. Text is only
+    produced when entries are iterated, indexed or exported. A capacity of
+    0 disables recording.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, clock=time.time):
+        if capacity < 0:
+            raise ValueError("History capacity must be non-negative")
+        self.capacity = capacity
+        self.clock = clock
+        self.evicted = 0
+        self._count = 0
+        self._init_columns()
+
+    def _init_columns(self):
+        self._ops = array('B')
+        self._flags = array('B')
+        self._a = array('d')
+        self._b = array('d')
+        self._result = array('d')
+        self._time = array('d')
+        self._boxed = {}
+        self._size = 0
+        self._next = 0
+
+    def _grow(self):
+        """Extend the columns geometrically, up to capacity"""
+        allocated = len(self._ops)
+        extra = min(self.capacity - allocated, max(allocated, 64))
+        self._ops.frombytes(bytes(extra))
+        self._flags.frombytes(bytes(extra))
+        zeros = bytes(8 * extra)
+        for column in (self._a, self._b, self._result, self._time):
+            column.frombytes(zeros)
+
+    def record(self, op, a, b, result):
+        """Append one entry, evicting the oldest when full"""
+        if not self.capacity:
+            return
+        flags = 0
+        if type(a) is not float:
+            flags |= _int_flag(a, A_INT)
+        if type(b) is not float:
+            flags |= _int_flag(b, B_INT)
+        if type(result) is not float:
+            flags |= _int_flag(result, RESULT_INT)
+
+        slot = self._next
+        if self._size == self.capacity:
+            self.evicted += 1
+            if self._boxed:
+                self._boxed.pop(slot, None)
+        else:
+            if slot == len(self._ops):
+                self._grow()
+            self._size += 1
+        if flags & BOXED:
+            self._boxed[slot] = (a, b, result)
+            a, b, result = _as_float(a), _as_float(b), _as_float(result)
+        self._ops[slot] = op
+        self._flags[slot] = flags
+        self._a[slot] = a
+        self._b[slot] = b
+        self._result[slot] = result
+        self._time[slot] = self.clock()
+
+        slot += 1
+        self._next = slot if slot < self.capacity else 0
+        self._count += 1
+
+    def record_batch(self, op, count, errors):
+        """Append one summary entry for a vectorized batch"""
+        self.record(op | BATCH_FLAG, count, errors, float('nan'))
+
+    def _slots(self):
+        """Physical slots from oldest to newest"""
+        size = self._size
+        start = self._next if size == self.capacity else 0
+        for i in range(size):
+            yield (start + i) % size
+
+    def _entry(self, slot):
+        flags = self._flags[slot]
+        if flags & BOXED:
+            a, b, result = self._boxed[slot]
+        else:
+            a, b, result = self._a[slot], self._b[slot], self._result[slot]
+            if flags & A_INT:
+                a = int(a)
+            if flags & B_INT:
+                b = int(b)
+            if flags & RESULT_INT:
+                result = int(result)
+        return self._ops[slot], a, b, result, self._time[slot]
+
+    def entries(self):
+        """Yield raw (op, a, b, result, timestamp) tuples, oldest first"""
+        for slot in self._slots():
+            yield self._entry(slot)
+
+    def last(self):
+        """The newest raw (op, a, b, result, timestamp) entry, or None"""
+        if not self._size:
+            return None
+        return self._entry((self._next - 1) % self.capacity)
+
+    def numbered(self, start=0, stop=None):
+        """Yield (number, op, a, b, result, timestamp) for the entries still
+        held whose number is in [start, stop). Entries are numbered 0, 1, ...
+        in recording order, so `recorded` is the next entry's number and a
+        number is a stable cursor for paging through history."""
+        first = self._count - self._size
+        start = max(start, first)
+        stop = self._count if stop is None else min(stop, self._count)
+        origin = self._next if self._size == self.capacity else 0
+        for number in range(start, stop):
+            yield (number,) + self._entry((origin + number - first) % self._size)
+
+    @property
+    def recorded(self):
+        """Total entries recorded since creation; a clear does not reset it"""
+        return self._count
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for op, a, b, result, _ in self.entries():
+            yield format_entry(op, a, b, result)
+
+    def __getitem__(self, index):
+        size = self._size
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("history index out of range")
+        start = self._next if size == self.capacity else 0
+        op, a, b, result, _ = self._entry((start + index) % size)
+        return format_entry(op, a, b, result)
+
+    def clear(self):
+        """Drop all entries. Entry numbers carry on, so a client paging with
+        numbered(start) sees the entries recorded after the clear; the
+        dropped ones count as evicted."""
+        self.evicted += self._size
+        self._init_columns()
+
+    @property
+    def nbytes(self):
+        """Memory allocated for the columns (excluding boxed values)"""
+        columns = (self._ops, self._flags, self._a, self._b, self._result, self._time)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def export_csv(self, file):
+        """Write entries as CSV rows to an open text file"""
+        writer = csv.writer(file)
+        writer.writerow(["timestamp", "operation", "a", "b", "result", "text"])
+        for op, a, b, result, timestamp in self.entries():
+            name = OP_NAMES.get(op & ~BATCH_FLAG, 'unknown')
+            if op & BATCH_FLAG:
+                name += '[batch]'
+            writer.writerow([timestamp, name, a, b, result, format_entry(op, a, b, result)])
+
+
+class _Shard(HistoryStore):
+    """One thread's HistoryStore, with a global sequence number per entry.
+
+    Only the owning thread writes. `version` is odd while a write is in
+    progress, so readers on other threads can copy the columns and retry
+    if a write overlapped (a seqlock); the writer never waits.
+    """
+
+    def __init__(self, capacity, clock, owner):
+        self.version = 0
+        self.owner = owner
+        self.total = 0       # entries ever recorded
+        self.cleared_at = 0  # the ShardedHistory cutoff this shard last caught up with
+        super().__init__(capacity, clock)
+
+    def _init_columns(self):
+        super()._init_columns()
+        self._seq = array('Q')
+
+    def _grow(self):
+        super()._grow()
+        self._seq.frombytes(bytes(8 * (len(self._ops) - len(self._seq))))
+
+    def append(self, seq, cutoff, op, a, b, result):
+        self.version += 1
+        try:
+            if self.cleared_at != cutoff:
+                # Entries from before a clear are invisible already; drop them now
+                self.clear()
+                self.cleared_at = cutoff
+            self.record(op, a, b, result)
+            self._seq[(self._next - 1) % self.capacity] = seq
+            self.total += 1
+        finally:
+            self.version += 1
+
+    def copy(self):
+        """A consistent copy of this shard, safe to read from any thread"""
+        while True:
+            version = self.version
+            if not version & 1:
+                state = dict(self.__dict__)
+                columns = {name: state[name][:] for name in
+                           ('_ops', '_flags', '_a', '_b', '_result', '_time', '_seq')}
+                boxed = dict(state['_boxed'])
+                if self.version == version:
+                    break
+            time.sleep(0)  # let the owner finish its write
+        copy = object.__new__(_Shard)
+        copy.__dict__.update(state, _boxed=boxed, **columns)
+        return copy
+
+    def restore(self, seq, entry):
+        """Append a raw entry copied from another shard, keeping its timestamp"""
+        op, a, b, result, timestamp = entry
+        self.record(op, a, b, result)
+        slot = (self._next - 1) % self.capacity
+        self._seq[slot] = seq
+        self._time[slot] = timestamp
+
+    def sequenced(self, cutoff, limit):
+        """Yield (seq, slot) for entries with cutoff < seq < limit, oldest first"""
+        seq = self._seq
+        for slot in self._slots():
+            if cutoff < seq[slot] < limit:
+                yield seq[slot], slot
+
+
+def _tagged(sequenced, index):
+    """(seq, index, slot) for a shard's (seq, slot) pairs, so entries merged
+    across shards remember which shard they came from"""
+    for seq, slot in sequenced:
+        yield seq, index, slot
+
+
+class ShardedHistory:
+    """History for a Calculator shared between threads.
+
+    Every thread records into its own shard (a HistoryStore), so recording
+    takes no lock and threads never contend. Entries get a global sequence
+    number, and reads merge the shards by it, keeping the newest `capacity`.
+    clear() only moves a cutoff, which is atomic. Older entries become
+    invisible at once, and each shard drops them on its next write. Reads
+    are snapshots: entries recorded after a read starts are not included.
+
+    Shards of finished threads are folded into one archive shard of the
+    newest `capacity` entries as new threads register, so a thread per
+    request does not leave a shard per request behind.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, clock=time.time):
+        if capacity < 0:
+            raise ValueError("History capacity must be non-negative")
+        self.capacity = capacity
+        self.clock = clock
+        self._sequence = itertools.count(1)  # next() is atomic
+        self._cutoff = 0
+        self._recorded_base = 0
+        self._local = threading.local()
+        self._shards = []  # the archive (owner None), if any, then one shard per thread
+        self._prune_at = PRUNE_SHARDS
+        self._lock = threading.Lock()  # guards _shards; taken once per thread, not per entry
+
+    def _shard(self):
+        shard = _Shard(self.capacity, self.clock, threading.current_thread())
+        shard.cleared_at = self._cutoff
+        with self._lock:
+            self._shards.append(shard)
+            if len(self._shards) >= self._prune_at:
+                self._prune()
+                self._prune_at = max(PRUNE_SHARDS, 2 * len(self._shards))
+        self._local.shard = shard
+        return shard
+
+    def _prune(self):
+        """Fold finished threads' shards into the archive (with _lock held).
+
+        Their owners can no longer write, so they are read without retries.
+        The new archive replaces them in a single list assignment, so a
+        concurrent reader sees either the old shards or the new archive.
+        """
+        archive = None
+        live, finished = [], []
+        for shard in self._shards:
+            if shard.owner is None:
+                archive = shard
+            elif shard.owner.is_alive():
+                live.append(shard)
+            else:
+                finished.append(shard)
+        if not finished:
+            return
+        if archive is not None:
+            finished.append(archive)
+        cutoff, limit = self._cutoff, next(self._sequence)
+        streams = [_tagged(shard.sequenced(cutoff, limit), index) for index, shard in enumerate(finished)]
+        folded = _Shard(self.capacity, self.clock, None)
+        for seq, index, slot in deque(heapq.merge(*streams), maxlen=self.capacity):
+            folded.restore(seq, finished[index]._entry(slot))
+        # recorded counts every entry ever recorded, not only those kept
+        folded.total = sum(shard.total for shard in finished)
+        self._shards = [folded] + live
+
+    def record(self, op, a, b, result):
+        """Append one entry to the calling thread's shard"""
+        if not self.capacity:
+            return
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard.append(next(self._sequence), self._cutoff, op, a, b, result)
+
+    def record_batch(self, op, count, errors):
+        """Append one summary entry for a vectorized batch"""
+        self.record(op | BATCH_FLAG, count, errors, float('nan'))
+
+    def _merged(self):
+        """[(shard copy, slot)] for the visible entries, oldest first"""
+        cutoff, limit = self._cutoff, next(self._sequence)
+        copies = [shard.copy() for shard in list(self._shards)]
+        streams = [_tagged(copy.sequenced(cutoff, limit), index) for index, copy in enumerate(copies)]
+        newest = deque(heapq.merge(*streams), maxlen=self.capacity)
+        return [(copies[index], slot) for _, index, slot in newest]
+
+    def snapshot(self):
+        """Raw (op, a, b, result, timestamp) entries at this moment, oldest first"""
+        return [copy._entry(slot) for copy, slot in self._merged()]
+
+    def entries(self):
+        """Yield raw (op, a, b, result, timestamp) tuples, oldest first"""
+        return iter(self.snapshot())
+
+    def last(self):
+        """The newest raw (op, a, b, result, timestamp) entry, or None"""
+        newest = None
+        for shard in list(self._shards):
+            copy = shard.copy()
+            if copy._size:
+                slot = (copy._next - 1) % copy.capacity
+                if copy._seq[slot] > self._cutoff and (newest is None or copy._seq[slot] > newest[0]):
+                    newest = copy._seq[slot], copy, slot
+        return None if newest is None else newest[1]._entry(newest[2])
+
+    @property
+    def recorded(self):
+        """Total entries recorded since creation or the last clear"""
+        return sum(shard.total for shard in list(self._shards)) - self._recorded_base
+
+    def __len__(self):
+        return len(self._merged())
+
+    def __iter__(self):
+        for op, a, b, result, _ in self.snapshot():
+            yield format_entry(op, a, b, result)
+
+    def __getitem__(self, index):
+        op, a, b, result, _ = self.snapshot()[index]
+        return format_entry(op, a, b, result)
+
+    def clear(self):
+        """Drop all entries, atomically for every thread"""
+        with self._lock:
+            self._cutoff = next(self._sequence)
+            # The archive and finished threads' shards only hold old entries
+            self._shards = [shard for shard in self._shards
+                            if shard.owner is not None and shard.owner.is_alive()]
+            self._recorded_base = sum(shard.total for shard in self._shards)
+            self._prune_at = max(PRUNE_SHARDS, 2 * len(self._shards))
+
+    @property
+    def nbytes(self):
+        """Memory allocated for all shards' columns (excluding boxed values)"""
+        return sum(shard.nbytes + shard._seq.itemsize * len(shard._seq) for shard in list(self._shards))
+
+    # Only needs entries()
+    export_csv = HistoryStore.export_csv
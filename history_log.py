@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Persistent History Log
+Append-only binary log of Calculator history with fixed-width records,
+memory-mapped reads and a side index by timestamp and operation code
+"""
+
+import bisect
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from decimal import Decimal
+from fractions import Fraction
+
+from factorial import format_number
+from history import (
+    A_INT, B_INT, BATCH_FLAG, BOXED, OP_CODES, OP_NAMES, RESULT_INT, _int_flag, format_entry,
+)
+
+MAGIC = b'CALCHIST'
+INDEX_MAGIC = b'CALCIDX1'
+VERSION = 1
+
+# File header: magic, version, record size
+HEADER = struct.Struct('<8sHH20x')
+# One record: timestamp, a, b, result, blob offset, blob length, op code, flags
+RECORD = struct.Struct('<ddddQIBB2x')
+
+# Index file header: magic, records indexed, last timestamp, sparse entries, op lists
+INDEX_HEADER = struct.Struct('<8sQdQI')
+
+# The sparse time index keeps every INDEX_STRIDE-th timestamp
+INDEX_STRIDE = 256
+
+# NumPy view of the record layout, for zero-copy column access
+RECORD_FIELDS = [
+    ('timestamp', '<f8'), ('a', '<f8'), ('b', '<f8'), ('result', '<f8'),
+    ('blob_offset', '<u8'), ('blob_length', '<u4'), ('op', 'u1'), ('flags', 'u1'), ('pad', 'V2'),
+]
+
+
+def _persistable(value):
+    """JSON-safe form of a boxed value; exactness is kept where it is cheap"""
+    if type(value) is int:
+        return value if value.bit_length() < 10000 else format_number(value)
+    if isinstance(value, (Decimal, Fraction)):
+        return str(value)
+    if isinstance(value, dict):
+        return {name: _persistable(item) for name, item in value.items()}
+    return value
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return float('nan')
+
+
+class HistoryLog:
+    """Append-only history log on disk, usable wherever a HistoryStore is.
+
+    Records are RECORD.size bytes in `path`. Values that do not fit a double
+    (big integers, Decimals, expressions) are written as JSON to `path.blob`
+    and referenced by offset. Appends go through a buffered file, so the
+    hot path is one struct.pack and a buffer copy; reads flush and map the
+    file. The index (one postings list per op code and a sparse time index)
+    is kept in memory, saved to `path.idx` on flush/close and caught up from
+    the log on open. Timestamps are clamped to be non-decreasing so time
+    ranges can be found by binary search.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.evicted = 0
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, version, size = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or size != RECORD.size:
+                self._file.close()
+                raise ValueError(f"{path} is not a version {VERSION} history log")
+        else:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self._file.flush()
+        self._blob = open(path + '.blob', 'a+b')
+        self._blob_size = self._blob.seek(0, os.SEEK_END)
+
+        # Ignore a torn final record from a crash mid-write
+        size = self._file.seek(0, os.SEEK_END)
+        self._count = (size - HEADER.size) // RECORD.size
+        self._file.truncate(HEADER.size + self._count * RECORD.size)
+        self._file.seek(HEADER.size + self._count * RECORD.size)
+
+        self._map = None
+        self._mapped = 0
+        self._load_index()
+
+    # -- index --------------------------------------------------------------
+
+    def _reset_index(self):
+        self._by_op = {}
+        self._sparse_times = array('d')
+        self._indexed = 0
+        self._last_time = float('-inf')
+
+    def _load_index(self):
+        """Read the saved index if it matches this log, then index any newer records"""
+        self._reset_index()
+        try:
+            with open(self.path + '.idx', 'rb') as file:
+                magic, indexed, last_time, sparse, ops = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+                # A log truncated or rewritten since the index was saved is re-scanned
+                if (magic == INDEX_MAGIC and indexed <= self._count
+                        and (not indexed or self._time(indexed - 1) == last_time)):
+                    times = array('d')
+                    times.frombytes(file.read(8 * sparse))
+                    by_op = {}
+                    for _ in range(ops):
+                        op, length = struct.unpack('<BQ', file.read(9))
+                        postings = array('Q')
+                        postings.frombytes(file.read(8 * length))
+                        by_op[op] = postings
+                    self._sparse_times, self._by_op = times, by_op
+                    self._indexed, self._last_time = indexed, last_time
+        except (OSError, struct.error, ValueError):
+            self._reset_index()
+        self._catch_up()
+
+    def _catch_up(self):
+        if self._indexed == self._count:
+            return
+        view = self._view()
+        for number in range(self._indexed, self._count):
+            timestamp, _, _, _, _, _, op, _ = RECORD.unpack_from(view, HEADER.size + number * RECORD.size)
+            self._index(number, op, timestamp)
+            self._last_time = max(self._last_time, timestamp)
+        self._indexed = self._count
+
+    def _index(self, number, op, timestamp):
+        postings = self._by_op.get(op)
+        if postings is None:
+            postings = self._by_op[op] = array('Q')
+        postings.append(number)
+        if not number % INDEX_STRIDE:
+            self._sparse_times.append(timestamp)
+
+    def save_index(self):
+        """Write the index to `path.idx` so the next open skips the scan"""
+        with open(self.path + '.idx', 'wb') as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, self._indexed, self._last_time,
+                                         len(self._sparse_times), len(self._by_op)))
+            file.write(self._sparse_times.tobytes())
+            for op, postings in self._by_op.items():
+                file.write(struct.pack('<BQ', op, len(postings)))
+                file.write(postings.tobytes())
+
+    # -- writing ------------------------------------------------------------
+
+    @property
+    def capacity(self):
+        """Unbounded (nonzero, so callers that skip recording at 0 keep recording)"""
+        return sys.maxsize
+
+    def record(self, op, a, b, result):
+        """Append one entry"""
+        flags = 0
+        if type(a) is not float:
+            flags |= _int_flag(a, A_INT)
+        if type(b) is not float:
+            flags |= _int_flag(b, B_INT)
+        if type(result) is not float:
+            flags |= _int_flag(result, RESULT_INT)
+
+        offset = length = 0
+        if flags & BOXED:
+            blob = json.dumps([_persistable(a), _persistable(b), _persistable(result)],
+                              default=str).encode()
+            offset, length = self._blob_size, len(blob)
+            self._blob.write(blob)
+            self._blob_size += length
+            a, b, result = _as_float(a), _as_float(b), _as_float(result)
+
+        timestamp = self.clock()
+        if timestamp < self._last_time:
+            timestamp = self._last_time
+        self._last_time = timestamp
+        self._file.write(RECORD.pack(timestamp, a, b, result, offset, length, op, flags))
+        self._index(self._count, op, timestamp)
+        self._count += 1
+        self._indexed = self._count
+
+    def record_batch(self, op, count, errors):
+        """Append one summary entry for a vectorized batch"""
+        self.record(op | BATCH_FLAG, count, errors, float('nan'))
+
+    def flush(self):
+        """Push buffered appends to the OS and save the index"""
+        self._file.flush()
+        self._blob.flush()
+        self.save_index()
+
+    def clear(self):
+        """Drop all entries: the log, blob and index are truncated"""
+        self._unmap()
+        self._file.truncate(HEADER.size)
+        self._file.seek(HEADER.size)
+        self._blob.truncate(0)
+        self._blob_size = 0
+        self._count = 0
+        self._reset_index()
+        self.save_index()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._unmap()
+        self._file.close()
+        self._blob.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- reading ------------------------------------------------------------
+
+    def _unmap(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a caller still holds a view; the map is freed with it
+            self._map = None
+            self._mapped = 0
+
+    def _view(self):
+        """The log mapped into memory, remapped when records were appended"""
+        if self._mapped != self._count:
+            self._file.flush()
+            self._unmap()
+            self._map = mmap.mmap(self._file.fileno(), HEADER.size + self._count * RECORD.size,
+                                  access=mmap.ACCESS_READ)
+            self._mapped = self._count
+        return self._map
+
+    def _entry(self, number):
+        view = self._view()
+        timestamp, a, b, result, offset, length, op, flags = RECORD.unpack_from(
+            view, HEADER.size + number * RECORD.size)
+        if flags & BOXED:
+            self._blob.flush()
+            a, b, result = json.loads(os.pread(self._blob.fileno(), length, offset))
+        else:
+            if flags & A_INT:
+                a = int(a)
+            if flags & B_INT:
+                b = int(b)
+            if flags & RESULT_INT:
+                result = int(result)
+        return op, a, b, result, timestamp
+
+    def _time(self, number):
+        return RECORD.unpack_from(self._view(), HEADER.size + number * RECORD.size)[0]
+
+    def _first_at(self, timestamp):
+        """Number of the first record at or after `timestamp`"""
+        block = bisect.bisect_left(self._sparse_times, timestamp)
+        low = max(block - 1, 0) * INDEX_STRIDE
+        high = min(block * INDEX_STRIDE, self._count)
+        while low < high:
+            middle = (low + high) // 2
+            if self._time(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, op=None, since=None, until=None):
+        """Yield (op, a, b, result, timestamp) entries, oldest first.
+
+        `op` is an op code or Calculator method name (batch summaries are
+        separate codes, op | BATCH_FLAG); `since`/`until` bound the timestamp
+        as [since, until). Only matching records are read.
+        """
+        low = 0 if since is None else self._first_at(since)
+        high = self._count if until is None else self._first_at(until)
+        if op is None:
+            numbers = range(low, high)
+        else:
+            postings = self._by_op.get(OP_CODES[op] if isinstance(op, str) else op, ())
+            numbers = postings[bisect.bisect_left(postings, low):bisect.bisect_left(postings, high)]
+        for number in numbers:
+            yield self._entry(number)
+
+    def count(self, op=None, since=None, until=None):
+        """Number of entries `query` would yield, from the index alone"""
+        low = 0 if since is None else self._first_at(since)
+        high = self._count if until is None else self._first_at(until)
+        if op is None:
+            return high - low
+        postings = self._by_op.get(OP_CODES[op] if isinstance(op, str) else op, ())
+        return bisect.bisect_left(postings, high) - bisect.bisect_left(postings, low)
+
+    def records(self):
+        """Zero-copy memoryview of the packed records (RECORD layout)"""
+        return memoryview(self._view())[HEADER.size:]
+
+    def columns(self):
+        """NumPy structured array over the mapped records, without copying"""
+        import numpy as np  # only needed for columnar access
+
+        return np.frombuffer(self._view(), dtype=np.dtype(RECORD_FIELDS),
+                             count=self._count, offset=HEADER.size)
+
+    def entries(self):
+        """Yield raw (op, a, b, result, timestamp) tuples, oldest first"""
+        return self.query()
+
+    def last(self):
+        """The newest raw (op, a, b, result, timestamp) entry, or None"""
+        return self._entry(self._count - 1) if self._count else None
+
+    @property
+    def recorded(self):
+        """Total entries in the log"""
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for op, a, b, result, _ in self.entries():
+            yield format_entry(op, a, b, result)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("history index out of range")
+        op, a, b, result, _ = self._entry(index)
+        return format_entry(op, a, b, result)
+
+    @property
+    def nbytes(self):
+        """Bytes on disk for the records and boxed values"""
+        return self._count * RECORD.size + self._blob_size
+
+    def export_csv(self, file, **query):
+        """Write entries (optionally filtered as in `query`) as CSV rows to an open text file"""
+        writer = csv.writer(file)
+        writer.writerow(["timestamp", "operation", "a", "b", "result", "text"])
+        for op, a, b, result, timestamp in self.query(**query):
+            name = OP_NAMES.get(op & ~BATCH_FLAG, 'unknown')
+            if op & BATCH_FLAG:
+                name += '[batch]'
+            writer.writerow([timestamp, name, a, b, result, format_entry(op, a, b, result)])
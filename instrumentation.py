@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Operation Instrumentation
+Per-operation call counts, error counts and latency histograms for a
+Calculator, cheap enough to leave enabled under load
+"""
+
+import time
+
+# Latency bucket i holds calls that took [2**(i-1), 2**i) nanoseconds; 64
+# buckets cover every duration perf_counter_ns can report
+BUCKETS = 65
+
+
+class OperationStats:
+    """Counters for one operation; the histogram is allocated once, up front"""
+
+    __slots__ = ('calls', 'errors', 'total_ns', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.buckets = [0] * BUCKETS
+
+    def quantile(self, fraction):
+        """Approximate latency quantile in ns, interpolated within its bucket"""
+        if not self.calls:
+            return 0.0
+        rank = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                low = 1 << (index - 1) if index else 0
+                return low + (low or 1) * (rank - seen) / count
+            seen += count
+        return 0.0
+
+    def snapshot(self):
+        calls = self.calls
+        return {
+            'calls': calls,
+            'errors': self.errors,
+            'error_rate': self.errors / calls if calls else 0.0,
+            'mean_ns': self.total_ns / calls if calls else 0.0,
+            'p50_ns': self.quantile(0.50),
+            'p90_ns': self.quantile(0.90),
+            'p99_ns': self.quantile(0.99),
+            'histogram': {1 << index: count for index, count in enumerate(self.buckets) if count},
+        }
+
+
+class Instrumentation:
+    """Per-operation counters for the calls routed through `call`.
+
+    Attach one to a calculator (`calc.instrumentation = Instrumentation()`)
+    and calculator.dispatch times every registry operation. A call costs two
+    clock reads and a few integer increments; nothing is kept per call.
+    Several calculators may share one instance. Updates are not locked, so
+    counts from concurrent threads are approximate.
+    """
+
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+        self.started = time.time()
+        self.operations = {}
+
+    def stats(self, name):
+        """The OperationStats for `name`, created on first use"""
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+        return stats
+
+    def call(self, name, function, *args):
+        """Call function(*args), recording its latency and outcome under `name`.
+
+        "Error: ..." results and raised exceptions both count as errors.
+        """
+        stats = self.operations.get(name) or self.stats(name)
+        clock = self.clock
+        start = clock()
+        try:
+            result = function(*args)
+        except BaseException:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = clock() - start
+            stats.calls += 1
+            stats.total_ns += elapsed
+            stats.buckets[elapsed.bit_length()] += 1
+        if result.__class__ is str and result.startswith("Error"):
+            stats.errors += 1
+        return result
+
+    def snapshot(self):
+        """Plain-dict view of every operation's counters, safe to serialize as JSON"""
+        return {
+            'uptime_s': time.time() - self.started,
+            'operations': {name: stats.snapshot() for name, stats in sorted(self.operations.items())},
+        }
+
+    def reset(self):
+        """Zero all counters"""
+        self.operations.clear()
+        self.started = time.time()
+
+
+def format_snapshot(snapshot):
+    """Render a snapshot as text table lines"""
+    lines = [f"{'operation':14}{'calls':>10}{'errors':>8}{'err %':>7}"
+             f"{'mean µs':>10}{'p50 µs':>9}{'p99 µs':>9}"]
+    for name, stats in snapshot['operations'].items():
+        lines.append(f"{name:14}{stats['calls']:>10}{stats['errors']:>8}"
+                     f"{stats['error_rate'] * 100:>7.1f}{stats['mean_ns'] / 1000:>10.2f}"
+                     f"{stats['p50_ns'] / 1000:>9.2f}{stats['p99_ns'] / 1000:>9.2f}")
+    return lines
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Linear Algebra
+Matrix operations backed by NumPy/LAPACK (determinant, inverse, solve,
+products and decompositions), a compact binary wire format for matrices and
+short summaries of results for history
+"""
+
+import math
+import re
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Binary matrix message: MAGIC, a label (the operation name), then named
+# float64 arrays. Layout (little-endian):
+#   magic 8s | label length u16 | label | entry count u16
+#   per entry: name length u16 | name | ndim u8 | ndim x u32 shape
+#   zero padding to a multiple of 8 bytes, then every entry's data, row-major
+MAGIC = b'CALCMTX1'
+CONTENT_TYPE = 'application/x-calc-matrix'
+_LENGTH = struct.Struct('<H')
+
+# Largest operand accepted, in elements (4096 x 4096 doubles is 128 MiB)
+MAX_ELEMENTS = 4096 * 4096
+
+MatrixOperation = namedtuple('MatrixOperation', [
+    'function',     # function(*operands) -> {result name: array or scalar}
+    'arity',        # number of operands
+    'square',       # whether the first operand must be square
+    'description',
+])
+
+
+class LinearAlgebraError(ValueError):
+    """Raised for malformed matrices, mismatched shapes and singular systems"""
+
+
+# ---------------------------------------------------------------------------
+# Operations
+# ---------------------------------------------------------------------------
+
+def _determinant(a):
+    sign, log_abs = np.linalg.slogdet(a)
+    # slogdet never overflows; the determinant itself may be +-inf or 0
+    with np.errstate(over='ignore', under='ignore'):
+        determinant = float(sign * np.exp(log_abs))
+    return {'determinant': determinant, 'sign': float(sign), 'log_abs_determinant': float(log_abs)}
+
+
+def _inverse(a):
+    return {'inverse': np.linalg.inv(a)}
+
+
+def _solve(a, b):
+    return {'x': np.linalg.solve(a, b)}
+
+
+def _multiply(a, b):
+    return {'product': a @ b}
+
+
+def _transpose(a):
+    return {'transpose': a.T}
+
+
+def _qr(a):
+    q, r = np.linalg.qr(a)
+    return {'q': q, 'r': r}
+
+
+def _cholesky(a):
+    return {'l': np.linalg.cholesky(a)}
+
+
+def _svd(a):
+    u, s, vt = np.linalg.svd(a, full_matrices=False)
+    return {'u': u, 's': s, 'vt': vt}
+
+
+def _eigen(a):
+    """Symmetric matrices use eigh (real, sorted); others eig, with the
+    imaginary parts returned separately when there are any"""
+    if np.array_equal(a, a.T):
+        values, vectors = np.linalg.eigh(a)
+        return {'values': values, 'vectors': vectors}
+    values, vectors = np.linalg.eig(a)
+    results = {'values': values.real, 'vectors': vectors.real}
+    if np.iscomplexobj(values) and values.imag.any():
+        results.update(values_imag=values.imag, vectors_imag=vectors.imag)
+    return results
+
+
+def _rank(a):
+    return {'rank': int(np.linalg.matrix_rank(a))}
+
+
+OPERATIONS = {
+    'determinant': MatrixOperation(_determinant, 1, True, "det(A), with its sign and log|det(A)|"),
+    'inverse': MatrixOperation(_inverse, 1, True, "A⁻¹"),
+    'solve': MatrixOperation(_solve, 2, True, "x with A x = b (b a vector or matrix)"),
+    'multiply': MatrixOperation(_multiply, 2, False, "A B"),
+    'transpose': MatrixOperation(_transpose, 1, False, "Aᵀ"),
+    'qr': MatrixOperation(_qr, 1, False, "A = Q R"),
+    'cholesky': MatrixOperation(_cholesky, 1, True, "A = L Lᵀ for symmetric positive definite A"),
+    'svd': MatrixOperation(_svd, 1, False, "A = U diag(s) Vᵀ (reduced)"),
+    'eigen': MatrixOperation(_eigen, 1, True, "eigenvalues and eigenvectors"),
+    'rank': MatrixOperation(_rank, 1, False, "numerical rank"),
+}
+OPERATIONS['det'] = OPERATIONS['determinant']
+OPERATIONS['inv'] = OPERATIONS['inverse']
+OPERATIONS['matmul'] = OPERATIONS['multiply']
+
+
+def as_matrix(value):
+    """float64 array from an array, nested lists or text such as "1 2; 3 4".
+
+    Arrays that are already float64 (including read-only views of a
+    request body or a memory-mapped .npy file) are used without copying.
+    """
+    if isinstance(value, str):
+        value = parse_matrix(value)
+    try:
+        matrix = np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise LinearAlgebraError("Matrices must be rectangular arrays of numbers") from None
+    if matrix.ndim not in (1, 2):
+        raise LinearAlgebraError(f"Expected a vector or matrix, got {matrix.ndim} dimensions")
+    if matrix.size > MAX_ELEMENTS:
+        raise LinearAlgebraError(f"Matrix of {matrix.size} elements exceeds the {MAX_ELEMENTS} limit")
+    return matrix
+
+
+_ROWS = re.compile(r"[;\n]")
+_FIELDS = re.compile(r"[\s,]+")
+
+
+def parse_matrix(text):
+    """Rows separated by ';' or new lines, entries by spaces or commas"""
+    rows = [[float(field) for field in _FIELDS.split(row.strip()) if field]
+            for row in _ROWS.split(text) if row.strip()]
+    if len(rows) == 1:
+        return np.array(rows[0])
+    if len({len(row) for row in rows}) > 1:
+        raise LinearAlgebraError("Matrix rows must all have the same length")
+    return np.array(rows)
+
+
+def compute(operation, *operands):
+    """Run a matrix operation; returns {result name: array or scalar}"""
+    op = OPERATIONS.get(operation)
+    if op is None:
+        raise LinearAlgebraError(f"Unknown matrix operation '{operation}' "
+                                 f"(use {', '.join(sorted(OPERATIONS))})")
+    if len(operands) != op.arity:
+        raise LinearAlgebraError(f"'{operation}' takes {op.arity} operand(s), got {len(operands)}")
+    matrices = [as_matrix(operand) for operand in operands]
+    first = matrices[0]
+    if op.function is not _multiply and first.ndim != 2:
+        raise LinearAlgebraError(f"'{operation}' needs a matrix, got a vector")
+    if op.square and first.shape[0] != first.shape[1]:
+        raise LinearAlgebraError(f"'{operation}' needs a square matrix, got {shape_text(first.shape)}")
+    if op.arity == 2:
+        second = matrices[1]
+        inner = first.shape[-1] if op.function is _multiply else first.shape[0]
+        if inner != second.shape[0]:
+            raise LinearAlgebraError(f"Shapes {shape_text(first.shape)} and {shape_text(second.shape)} "
+                                     f"do not match for '{operation}'")
+    try:
+        return op.function(*matrices)
+    except np.linalg.LinAlgError as e:
+        raise LinearAlgebraError(str(e)) from None
+
+
+# ---------------------------------------------------------------------------
+# Summaries, for history and logs
+# ---------------------------------------------------------------------------
+
+def shape_text(shape):
+    return "×".join(str(n) for n in shape) if shape else "scalar"
+
+
+def summarize(results):
+    """Short form of a result: scalars as they are, arrays by shape"""
+    return {name: value if np.isscalar(value) else shape_text(np.shape(value))
+            for name, value in results.items()}
+
+
+# ---------------------------------------------------------------------------
+# Binary wire format
+# ---------------------------------------------------------------------------
+
+def _text(buffer, offset):
+    (length,) = _LENGTH.unpack_from(buffer, offset)
+    offset += _LENGTH.size
+    return bytes(buffer[offset:offset + length]).decode(), offset + length
+
+
+def encode(label, entries):
+    """Binary message from a label and {name: array or scalar}"""
+    arrays = [(name, np.asarray(value, dtype='<f8', order='C')) for name, value in entries.items()]
+    header = [MAGIC, _LENGTH.pack(len(label.encode())), label.encode(), _LENGTH.pack(len(arrays))]
+    for name, array in arrays:
+        header += [_LENGTH.pack(len(name.encode())), name.encode(),
+                   struct.pack(f'<B{array.ndim}I', array.ndim, *array.shape)]
+    size = sum(len(part) for part in header)
+    header.append(b'\0' * (-size % 8))
+    return b''.join(header + [memoryview(array).cast('B') for _, array in arrays])
+
+
+def decode(buffer):
+    """(label, {name: array}) from a binary message.
+
+    The arrays are read-only views into `buffer`, not copies.
+    """
+    buffer = memoryview(buffer)
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise LinearAlgebraError("Not a matrix message")
+    try:
+        label, offset = _text(buffer, len(MAGIC))
+        (count,) = _LENGTH.unpack_from(buffer, offset)
+        offset += _LENGTH.size
+        shapes = []
+        for _ in range(count):
+            name, offset = _text(buffer, offset)
+            ndim = buffer[offset]
+            shape = struct.unpack_from(f'<{ndim}I', buffer, offset + 1)
+            offset += 1 + 4 * ndim
+            shapes.append((name, shape))
+        offset += -offset % 8
+        entries = {}
+        for name, shape in shapes:
+            size = math.prod(shape)
+            if size > MAX_ELEMENTS:
+                raise LinearAlgebraError(f"Matrix of {size} elements exceeds the {MAX_ELEMENTS} limit")
+            entries[name] = np.frombuffer(buffer, dtype='<f8', count=size, offset=offset).reshape(shape)
+            offset += 8 * size
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        if isinstance(e, LinearAlgebraError):
+            raise
+        raise LinearAlgebraError("Truncated or malformed matrix message") from None
+    return label, entries
+
+
+def load(path):
+    """Matrix from a file: .npy is memory-mapped (no copy), anything else is
+    read as text rows (spaces, commas or ';' between entries)"""
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    with open(path, encoding='utf-8') as file:
+        return parse_matrix(file.read())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Memoization Layer
+Opt-in result cache for pure Calculator operations, with LRU/TTL eviction
+and hit, miss and eviction counters
+"""
+
+import math
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from calculator import OPERATION_LIST
+
+DEFAULT_MAXSIZE = 1024
+
+# Calculator methods whose result depends only on their operands
+PURE_OPERATIONS = tuple(op.method for op in OPERATION_LIST if op.pure)
+
+# Cheap operations (add, multiply, ...) cost less to recompute than to look up
+DEFAULT_MEMOIZED = (
+    'power', 'square_root', 'factorial', 'sine', 'cosine', 'tangent', 'logarithm', 'natural_log',
+)
+
+_MISSING = object()
+
+
+class ResultCache:
+    """Bounded mapping with least-recently-used eviction and an optional TTL.
+
+    With `maxbytes`, entries are also evicted to keep the total of
+    `sizeof(value)` within it, and a value larger than that is not stored.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=None, clock=time.monotonic, maxbytes=None,
+                 sizeof=None):
+        if maxsize <= 0:
+            raise ValueError("Cache size must be positive")
+        if maxbytes is not None and (maxbytes <= 0 or sizeof is None):
+            raise ValueError("A byte limit must be positive and needs a sizeof function")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Cached value for key, or default (counts a hit or a miss)"""
+        try:
+            value, expires, size = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if expires is not None and expires <= self.clock():
+            del self._data[key]
+            self.nbytes -= size
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store value, evicting the least recently used entries when full"""
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        data = self._data
+        previous = data.pop(key, None)
+        if previous is not None:
+            self.nbytes -= previous[2]
+        size = 0
+        if self.maxbytes is not None:
+            size = self.sizeof(value)
+            if size > self.maxbytes:
+                return
+        data[key] = (value, expires, size)
+        self.nbytes += size
+        while len(data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+            self.nbytes -= data.popitem(last=False)[1][2]
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        self._data.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Counters as a dictionary"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'bytes': self.nbytes,
+            'maxbytes': self.maxbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def normalize(value):
+    """Cache key for an operand.
+
+    The type is part of the key because 5 and 5.0 compare equal but behave
+    differently (factorial(5.0) is an error), and signed zeros and Decimal
+    exponents are kept apart because they can change the result's sign or form.
+    """
+    kind = type(value)
+    if kind is float and value == 0.0:
+        return (kind, math.copysign(1.0, value))
+    if kind is Decimal:
+        return (kind, str(value))
+    return (kind, value)
+
+
+def _memoized(calc, name, method, cache):
+    """Wrap a bound method so results (and their history entry) are cached"""
+
+    def wrapper(*args, **kwargs):
+        if kwargs:
+            return method(*args, **kwargs)
+        key = (name,) + tuple(map(normalize, args))
+        cached = cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            result, entry = cached
+            if entry is not None:
+                calc.history.record(*entry[:4])
+            return result
+
+        history = calc.history
+        before = history.recorded
+        result = method(*args)
+        entry = history.last() if history.recorded != before else None
+        cache.put(key, (result, entry))
+        return result
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def enable_memoization(calc, maxsize=DEFAULT_MAXSIZE, ttl=None, operations=DEFAULT_MEMOIZED,
+                       cache=None):
+    """Memoize pure operations on one Calculator instance and return the cache.
+
+    Hits still record a history entry, exactly as the uncached call would.
+    Pass an existing ResultCache as `cache` to share it between instances
+    of the same calculator type. The cache is also available as calc.cache.
+    """
+    for name in operations:
+        if name not in PURE_OPERATIONS:
+            raise ValueError(f"'{name}' is not a pure Calculator operation")
+    disable_memoization(calc)
+    if cache is None:
+        cache = ResultCache(maxsize, ttl)
+    for name in operations:
+        setattr(calc, name, _memoized(calc, name, getattr(calc, name), cache))
+    calc.cache = cache
+    return cache
+
+
+def disable_memoization(calc):
+    """Remove memoization from a Calculator instance"""
+    for name in PURE_OPERATIONS:
+        calc.__dict__.pop(name, None)
+    calc.__dict__.pop('cache', None)
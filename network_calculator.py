@@ -4,27 +4,68 @@ Network Calculator Web App (No Dependencies)
 A web interface for the Advanced Calculator accessible from any device on the network
 """
 
+import argparse
 import http.server
 import socketserver
 import json
 import urllib.parse
-from calculator import Calculator
+from async_server import serve_async
+from history_log import HistoryLog
+from instrumentation import Instrumentation
+from precision import DEFAULT_PRECISION, MODES, create_calculator
+from sessions import SESSION_HEADER, NoSessions, SessionHistory, SessionStore, request_token
+from prefork import default_workers, serve_prefork
+from web_api import (MAX_BATCH_BYTES, MAX_BATCH_ITEMS, RESULT_CACHE_BYTES, RESULT_CACHE_ITEMS, ROUTES,
+                     StaticPage, add_batch_arguments, add_cache_arguments, cache_stats, calculate_batch,
+                     calculation_response, handle, parse_body, parse_query, result_cache, session_history)
 import datetime
 import socket
+import sys
+
+# Sent with /calculate responses so pages on other hosts can call it
+CORS_HEADERS = [('Access-Control-Allow-Origin', '*'),
+                ('Access-Control-Allow-Methods', 'POST, GET, OPTIONS'),
+                ('Access-Control-Allow-Headers', 'Content-Type')]
 
 class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.calculator = Calculator()
-        super().__init__(*args, **kwargs)
+    numeric_mode = 'float'
+    precision = DEFAULT_PRECISION
+    # Shared by the calculator when the server runs with --instrument
+    instrumentation = None
+    # Shared persistent history_log.HistoryLog when the server runs with --history-file
+    history_log = None
+    # web_api.StaticPage of get_calculator_html(), rendered and compressed once at import
+    page = None
+    # /calculate/batch limits, set by --batch-max-items and --batch-max-bytes
+    batch_max_items = MAX_BATCH_ITEMS
+    batch_max_bytes = MAX_BATCH_BYTES
+    # One calculator for every request, set up by run_server; its history is a
+    # sessions.SessionHistory that records into the requesting client's session
+    calculator = None
+    # sessions.SessionStore of per-client histories, served at /history
+    # (sessions.NoSessions with --workers)
+    sessions = None
+    # memo.ResultCache of /calculate responses (see web_api.result_cache), or
+    # None with --cache-items 0; its counters are served at /cache
+    results = None
     
     def do_GET(self):
         if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
-            html_content = self.get_calculator_html()
-            self.wfile.write(html_content.encode())
+            self.send_validated(*self.page.respond(self.headers.get('Accept-Encoding', ''),
+                                                   self.headers.get('If-None-Match', '')))
+        elif self.path.split('?', 1)[0] == '/calculate':
+            self.send_calculation(parse_query(urllib.parse.urlsplit(self.path).query))
+        elif self.path.split('?', 1)[0] == '/history':
+            self.send_json(*session_history(self.sessions, self.session_token(),
+                                            urllib.parse.urlsplit(self.path).query))
+        elif self.path == '/stats':
+            if self.instrumentation is None:
+                status, response = 404, {'error': 'Instrumentation is off (start the server with --instrument)'}
+            else:
+                status, response = 200, self.instrumentation.snapshot()
+            self.send_json(status, response)
+        elif self.path == '/cache':
+            self.send_json(*cache_stats(self.results))
         else:
             super().do_GET()
     
@@ -32,63 +73,78 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
         if self.path == '/calculate':
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
-            data = urllib.parse.parse_qs(post_data.decode())
-            
-            operation = data.get('operation', [''])[0]
-            num1 = float(data.get('num1', ['0'])[0])
-            num2 = float(data.get('num2', ['0'])[0])
-            
-            result = self.perform_calculation(operation, num1, num2)
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            
-            response = {'result': str(result)}
-            self.wfile.write(json.dumps(response).encode())
+            self.send_calculation(parse_body(self.headers.get('Content-Type', ''), post_data))
+        elif self.path == '/calculate/batch':
+            content_length = int(self.headers['Content-Length'])
+            if content_length > self.batch_max_bytes:
+                self.send_json(413, {'error': f"Batch bodies are limited to {self.batch_max_bytes} bytes"})
+                return
+            body = self.rfile.read(content_length)
+            status, content_type, payload = calculate_batch(self.calculator, body, self.batch_max_items)
+            if status == 200:
+                session, session_headers = self.sessions.resolve(self.session_token())
+                self.send_stream(content_type, self.sessions.stream(session, payload), session_headers)
+            else:
+                self.send_body(status, content_type, payload)
+        elif self.path in ROUTES:
+            content_length = int(self.headers['Content-Length'])
+            body = self.rfile.read(content_length)
+            self.send_body(*handle(self.path, self.headers.get('Content-Type', ''), body))
         else:
             self.send_response(404)
             self.end_headers()
     
-    def perform_calculation(self, operation, num1, num2):
-        try:
-            if operation == 'add':
-                return self.calculator.add(num1, num2)
-            elif operation == 'subtract':
-                return self.calculator.subtract(num1, num2)
-            elif operation == 'multiply':
-                return self.calculator.multiply(num1, num2)
-            elif operation == 'divide':
-                return self.calculator.divide(num1, num2)
-            elif operation == 'power':
-                return self.calculator.power(num1, num2)
-            elif operation == 'sqrt':
-                return self.calculator.square_root(num1)
-            elif operation == 'modulo':
-                return self.calculator.modulo(num1, num2)
-            elif operation == 'factorial':
-                return self.calculator.factorial(int(num1))
-            elif operation == 'sin':
-                return self.calculator.sine(num1)
-            elif operation == 'cos':
-                return self.calculator.cosine(num1)
-            elif operation == 'tan':
-                return self.calculator.tangent(num1)
-            elif operation == 'log':
-                return self.calculator.logarithm(num1, num2)
-            elif operation == 'ln':
-                return self.calculator.natural_log(num1)
-            elif operation == 'abs':
-                return self.calculator.absolute(num1)
-            else:
-                return "Invalid operation"
-        except Exception as e:
-            return f"Error: {str(e)}"
+    def send_calculation(self, params):
+        """Answer /calculate (GET or POST) in the requesting client's session"""
+        session, session_headers = self.sessions.resolve(self.session_token())
+        with self.sessions.use(session):
+            status, headers, body = calculation_response(self.calculator, params, self.results,
+                                                         self.headers.get('If-None-Match', ''))
+        self.send_validated(status, headers + session_headers + CORS_HEADERS, body)
+    
+    def send_validated(self, status, headers, body):
+        """Send a (status, headers, body) response, which may be a 304 Not Modified"""
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if status == 200:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_json(self, status, payload):
+        """Send a JSON response"""
+        self.send_body(status, 'application/json', json.dumps(payload).encode())
+    
+    def send_body(self, status, content_type, body):
+        """Send a response body of any content type"""
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_stream(self, content_type, blocks, headers=()):
+        """Send a 200 response whose body is written block by block as the
+        iterator produces it; with no Content-Length, closing the connection
+        ends the body"""
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        for block in blocks:
+            self.wfile.write(block)
+        self.close_connection = True
     
-    def get_calculator_html(self):
+    def session_token(self):
+        """The requesting client's session token, if it sent one"""
+        return request_token(self.headers.get('Cookie'), self.headers.get(SESSION_HEADER))
+    
+    @staticmethod
+    def get_calculator_html():
         return """
 <!DOCTYPE html>
 <html lang="en">
@@ -307,6 +363,10 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
                 <button class="calc-button" onclick="calculate('sqrt')">√ Square Root</button>
                 <button class="calc-button" onclick="calculate('modulo')">% Modulo</button>
                 <button class="calc-button" onclick="calculate('factorial')">! Factorial</button>
+                <button class="calc-button" onclick="calculate('powmod')">🔐 Power mod m</button>
+            </div>
+            <div class="input-group">
+                <input type="number" id="num3" placeholder="Modulus m (for power mod m)" step="1">
             </div>
         </div>
         
@@ -330,6 +390,17 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
             </div>
         </div>
         
+        <!-- Expressions -->
+        <div class="operation-section">
+            <h3>🧩 Expression</h3>
+            <div class="input-group">
+                <input type="text" id="expression" placeholder="e.g. 2*sin(x) + log(y, 3) with x, y from above">
+            </div>
+            <div class="button-group">
+                <button class="calc-button" onclick="calculate('evaluate')">= Evaluate</button>
+            </div>
+        </div>
+        
         <!-- Result Display -->
         <div class="result-display">
             <h4>Result:</h4>
@@ -345,6 +416,8 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
     
     <script>
         let calculationHistory = [];
+        // Number of the newest history entry shown, the cursor for /history?after=
+        let historyCursor = null;
         
         async function calculate(operation) {
             const num1 = parseFloat(document.getElementById('num1').value) || 0;
@@ -354,38 +427,46 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
             formData.append('operation', operation);
             formData.append('num1', num1);
             formData.append('num2', num2);
+            formData.append('num3', document.getElementById('num3').value || 0);
+            formData.append('expression', document.getElementById('expression').value);
             
             try {
                 const response = await fetch('/calculate', {
                     method: 'POST',
-                    body: formData
+                    body: new URLSearchParams(formData)
                 });
                 
                 const data = await response.json();
                 document.getElementById('result').textContent = data.result;
                 
-                // Add to history
-                const timestamp = new Date().toLocaleTimeString();
-                const historyItem = {
-                    operation: operation,
-                    num1: num1,
-                    num2: num2,
-                    result: data.result,
-                    timestamp: timestamp
-                };
-                
-                calculationHistory.unshift(historyItem);
-                if (calculationHistory.length > 10) {
-                    calculationHistory.pop();
-                }
-                
-                updateHistory();
+                await loadHistory();
                 
             } catch (error) {
                 document.getElementById('result').textContent = 'Error: ' + error.message;
             }
         }
         
+        async function loadHistory() {
+            // The session's history is kept by the server: fetch only entries
+            // newer than those shown, or the newest 10 when starting over
+            let data = null;
+            if (historyCursor !== null) {
+                data = await (await fetch(`/history?after=${historyCursor}`)).json();
+            }
+            if (data === null || data.more) {
+                calculationHistory = [];
+                const response = await fetch('/history?limit=10');
+                if (!response.ok) return;  // no sessions (--workers)
+                data = await response.json();
+            }
+            data.entries.forEach(entry => {
+                calculationHistory.unshift(entry);
+                historyCursor = entry.seq;
+            });
+            calculationHistory = calculationHistory.slice(0, 10);
+            updateHistory();
+        }
+        
         function updateHistory() {
             const historyDiv = document.getElementById('history');
             historyDiv.innerHTML = '';
@@ -393,10 +474,11 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
             calculationHistory.forEach(item => {
                 const historyItem = document.createElement('div');
                 historyItem.className = 'history-item';
-                historyItem.innerHTML = `
-                    <strong>${item.operation}</strong>: ${item.num1}, ${item.num2} = <strong>${item.result}</strong><br>
-                    <small>${item.timestamp}</small>
-                `;
+                const text = document.createElement('strong');
+                text.textContent = item.text;
+                const time = document.createElement('small');
+                time.textContent = new Date(item.timestamp * 1000).toLocaleTimeString();
+                historyItem.append(text, document.createElement('br'), time);
                 historyDiv.appendChild(historyItem);
             });
         }
@@ -405,12 +487,17 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
         document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('num1').value = '';
             document.getElementById('num2').value = '';
+            document.getElementById('num3').value = '';
+            document.getElementById('expression').value = '';
+            loadHistory();
         });
     </script>
 </body>
 </html>
         """
 
+CalculatorHandler.page = StaticPage(CalculatorHandler.get_calculator_html())
+
 def get_local_ip():
     """Get the local IP address"""
     try:
@@ -423,14 +510,34 @@ def get_local_ip():
     except:
         return "127.0.0.1"
 
-def run_server(port=8001):
-    """Run the calculator web server"""
+def run_server(port=8001, mode='float', precision=DEFAULT_PRECISION, instrument=False,
+               history_file=None, workers=None, reuse_port=False, use_async=False,
+               batch_max_items=MAX_BATCH_ITEMS, batch_max_bytes=MAX_BATCH_BYTES,
+               cache_items=RESULT_CACHE_ITEMS, cache_bytes=RESULT_CACHE_BYTES):
+    """Run the calculator web server.
+
+    With `workers`, requests are served by that many forked processes (0
+    for one per CPU) instead of one, without sessions since a client's
+    requests reach different workers; see prefork.serve_prefork. With
+    `use_async`, one asyncio event loop serves every connection, keeping
+    HTTP/1.1 connections open between requests; see async_server.
+    """
     handler = CalculatorHandler
+    handler.numeric_mode = mode
+    handler.precision = precision
+    handler.instrumentation = Instrumentation() if instrument else None
+    handler.history_log = HistoryLog(history_file) if history_file else None
+    handler.batch_max_items = batch_max_items
+    handler.batch_max_bytes = batch_max_bytes
+    handler.sessions = NoSessions() if workers is not None else SessionStore()
+    handler.results = result_cache(cache_items, cache_bytes)
+    handler.calculator = create_calculator(mode, precision, history=SessionHistory(handler.history_log))
+    handler.calculator.instrumentation = handler.instrumentation
     
     # Get local IP
     local_ip = get_local_ip()
     
-    with socketserver.TCPServer(("0.0.0.0", port), handler) as httpd:
+    def banner():
         print("=" * 60)
         print("🧮 Advanced Calculator Web App - Network Access")
         print("=" * 60)
@@ -438,14 +545,76 @@ def run_server(port=8001):
         print(f"📱 Local access: http://localhost:{port}")
         print(f"💻 Mac access: http://10.0.1.112:{port}")
         print(f"🌍 Network access: http://{local_ip}:{port}")
+        if workers is not None:
+            print(f"⚙️  Worker processes: {workers or default_workers()}")
+        if use_async:
+            print("⚡ Asyncio server: keep-alive and pipelined requests")
         print("=" * 60)
         print("🛑 Press Ctrl+C to stop the server")
         print("=" * 60)
+    
+    if workers is not None:
+        banner()
+        sys.stdout.flush()  # or every forked worker would flush its own copy
+        serve_prefork(("0.0.0.0", port), handler, workers, reuse_port)
+        print("\n👋 Calculator server stopped. Goodbye!")
+        return
+    
+    if use_async:
+        try:
+            serve_async(("0.0.0.0", port), handler, ready=banner)
+        except KeyboardInterrupt:
+            print("\n👋 Calculator server stopped. Goodbye!")
+        finally:
+            if handler.history_log is not None:
+                handler.history_log.close()
+        return
+    
+    with socketserver.TCPServer(("0.0.0.0", port), handler) as httpd:
+        banner()
         
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n👋 Calculator server stopped. Goodbye!")
+        finally:
+            if handler.history_log is not None:
+                handler.history_log.close()
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Advanced Calculator web server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--mode", choices=tuple(MODES), default="float",
+                        help="numeric mode for calculations (default: float)")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="significant digits in decimal mode")
+    parser.add_argument("--instrument", action="store_true",
+                        help="collect per-operation counters and latencies, served at /stats")
+    parser.add_argument("--history-file", metavar="PATH",
+                        help="record every calculation in a persistent history log at PATH")
+    parser.add_argument("--workers", type=int, nargs="?", const=0, metavar="N",
+                        help="serve from N forked worker processes (default with no N: one per CPU); "
+                             "/stats then reports the worker that answers, and there are no sessions "
+                             "or /history since each worker has its own memory")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="with --workers, give each worker its own SO_REUSEPORT socket (Linux)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="serve every connection from one asyncio event loop, with HTTP/1.1 "
+                             "keep-alive and pipelining")
+    add_batch_arguments(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.use_async and args.workers is not None:
+        parser.error("--async and --workers are separate server modes")
+    if args.workers is not None and args.history_file:
+        parser.error("--history-file is a single-process log and cannot be used with --workers")
+    if args.workers is not None and args.workers < 0:
+        parser.error("--workers cannot be negative")
+    return args
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    args = parse_args()
+    run_server(args.port, args.mode, args.precision, args.instrument, args.history_file,
+               args.workers, args.reuse_port, args.use_async, args.batch_max_items, args.batch_max_bytes,
+               args.cache_items, args.cache_bytes)
\ No newline at end of file
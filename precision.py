@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Arbitrary-Precision Calculators
+Decimal (configurable precision) and exact Fraction variants of Calculator
+"""
+
+import decimal
+import math
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache, wraps
+
+from calculator import OPERATION_LIST, Calculator, power_bits, power_size_error
+from history import (
+    DEFAULT_CAPACITY, OP_ABSOLUTE, OP_ADD, OP_COSINE, OP_DIVIDE, OP_LOGARITHM,
+    OP_MODULO, OP_MULTIPLY, OP_NATURAL_LOG, OP_POWER, OP_SINE, OP_SQUARE_ROOT,
+    OP_SUBTRACT, OP_TANGENT,
+)
+
+DEFAULT_PRECISION = 28
+
+# Extra digits carried through series evaluation and argument reduction
+GUARD_DIGITS = 10
+
+# Largest decimal exponent accepted in input. Fractions hold 10 ** exponent
+# exactly, and integer operations convert Decimals to int, at a cost that
+# grows quadratically with the digits: "1e99999999" would never finish.
+MAX_EXPONENT = 10000
+
+# Messages for the decimal signals the contexts trap, most specific first
+_SIGNAL_MESSAGES = (
+    (decimal.Overflow, "Result too large!"),
+    (decimal.DivisionByZero, "Division by zero!"),
+    (decimal.DivisionUndefined, "Division by zero!"),
+    (decimal.InvalidOperation, "Undefined result!"),
+)
+
+
+class DecimalMath:
+    """Transcendental functions on Decimals, evaluated in one reusable context.
+
+    A working context with guard digits is created once and every call uses
+    its methods directly, so no context is created or copied per operation.
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.context = decimal.Context(prec=precision)
+        self.work = decimal.Context(prec=precision + GUARD_DIGITS)
+        self.pi = self._compute_pi()
+        self.two_pi = self.work.multiply(self.pi, 2)
+
+    def _compute_pi(self):
+        """π to the working precision (series from the decimal module docs)"""
+        ctx = self.work
+        lasts, t, s, n, na, d, da = 0, Decimal(3), Decimal(3), 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = ctx.divide(ctx.multiply(t, n), d)
+            s = ctx.add(s, t)
+        return s
+
+    def _series(self, term, total, x2, n):
+        """Sum the alternating Taylor series shared by sin and cos"""
+        ctx = self.work
+        while True:
+            term = ctx.divide(ctx.multiply(term, -x2), (n + 1) * (n + 2))
+            n += 2
+            new_total = ctx.add(total, term)
+            if new_total == total:
+                return total
+            total = new_total
+
+    def _reduce(self, x):
+        return self.work.remainder_near(x, self.two_pi)
+
+    def sin(self, x):
+        x = self._reduce(x)
+        return self.context.plus(self._series(x, x, self.work.multiply(x, x), 1))
+
+    def cos(self, x):
+        x = self._reduce(x)
+        one = Decimal(1)
+        return self.context.plus(self._series(one, one, self.work.multiply(x, x), 0))
+
+    def tan(self, x):
+        x = self._reduce(x)
+        x2 = self.work.multiply(x, x)
+        one = Decimal(1)
+        sine = self._series(x, x, x2, 1)
+        cosine = self._series(one, one, x2, 0)
+        return self.context.divide(sine, cosine)
+
+    def ln(self, x):
+        return self.context.ln(x)
+
+    def log(self, x, base):
+        if base == 10:
+            return self.context.log10(x)
+        return self.context.divide(self.work.ln(x), self.work.ln(base))
+
+    def sqrt(self, x):
+        return self.context.sqrt(x)
+
+    def power(self, x, y):
+        return self.context.power(x, y)
+
+
+@lru_cache(maxsize=16)
+def decimal_math(precision):
+    """Shared DecimalMath per precision, so π is only computed once"""
+    return DecimalMath(precision)
+
+
+def _is_integral(value):
+    """Whether a Decimal or Fraction is whole, without converting it to int"""
+    if isinstance(value, Fraction):
+        return value.denominator == 1
+    return value.is_finite() and value == value.to_integral_value()
+
+
+def _check_exponent(text):
+    """Refuse number text whose exponent is over MAX_EXPONENT, before parsing it"""
+    _, separator, exponent = text.lower().partition('e')
+    if not separator:
+        return
+    try:
+        too_large = abs(int(exponent)) > MAX_EXPONENT
+    except ValueError:
+        return  # not a plain exponent; the parser reports what is wrong
+    if too_large:
+        raise ValueError(f"exponent out of range in {text!r} (limit {MAX_EXPONENT:,})")
+
+
+def _signal_errors(method):
+    """Return decimal signals raised by an operation as the "Error: ..."
+    strings Calculator operations return; str() of a signal is only its class"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except decimal.DecimalException as e:
+            message = next((text for signal, text in _SIGNAL_MESSAGES if isinstance(e, signal)),
+                           f"Decimal {type(e).__name__}!")
+            return f"Error: {message}"
+    return wrapper
+
+
+def _exact_factorial(self, a):
+    """Factorial: a! (exact integer)"""
+    if isinstance(a, (Decimal, Fraction)) and a >= 0 and _is_integral(a):
+        error = self.factorials.limit_error(a)  # before int() builds all of a huge operand's digits
+        if error:
+            return error
+        a = int(a)
+    return Calculator.factorial(self, a)
+
+
+def _trap_signals(cls):
+    """Class decorator applying _signal_errors to every registry operation"""
+    for op in OPERATION_LIST:
+        setattr(cls, op.method, _signal_errors(getattr(cls, op.method)))
+    return cls
+
+
+@_trap_signals
+class DecimalCalculator(Calculator):
+    """Calculator running every operation in Decimal at a fixed precision"""
+
+    mode = 'decimal'
+
+    def __init__(self, precision=DEFAULT_PRECISION, history_capacity=DEFAULT_CAPACITY, history=None):
+        super().__init__(history_capacity, history=history)
+        self.precision = precision
+        self.math = decimal_math(precision)
+        self.context = self.math.context
+
+    def parse_number(self, text):
+        """Parse user input exactly as a Decimal"""
+        _check_exponent(text)
+        try:
+            return Decimal(text.strip())
+        except decimal.InvalidOperation:
+            raise ValueError(f"could not convert string to Decimal: {text!r}") from None
+
+    def coerce(self, value):
+        """Convert an operand to Decimal (floats by their shortest repr)"""
+        if type(value) is Decimal:
+            return value
+        if isinstance(value, float):
+            return Decimal(repr(value))
+        if isinstance(value, str):
+            return self.parse_number(value)
+        if isinstance(value, Fraction):
+            return self.context.divide(Decimal(value.numerator), Decimal(value.denominator))
+        return Decimal(value)
+
+    def add(self, a, b):
+        """Addition: a + b"""
+        a, b = self.coerce(a), self.coerce(b)
+        result = self.context.add(a, b)
+        self.history.record(OP_ADD, a, b, result)
+        return result
+
+    def subtract(self, a, b):
+        """Subtraction: a - b"""
+        a, b = self.coerce(a), self.coerce(b)
+        result = self.context.subtract(a, b)
+        self.history.record(OP_SUBTRACT, a, b, result)
+        return result
+
+    def multiply(self, a, b):
+        """Multiplication: a * b"""
+        a, b = self.coerce(a), self.coerce(b)
+        result = self.context.multiply(a, b)
+        self.history.record(OP_MULTIPLY, a, b, result)
+        return result
+
+    def divide(self, a, b):
+        """Division: a / b"""
+        a, b = self.coerce(a), self.coerce(b)
+        if b == 0:
+            return "Error: Division by zero!"
+        result = self.context.divide(a, b)
+        self.history.record(OP_DIVIDE, a, b, result)
+        return result
+
+    def power(self, a, b):
+        """Power: a ** b"""
+        a, b = self.coerce(a), self.coerce(b)
+        if a < 0 and not _is_integral(b):
+            return "Error: Negative base with fractional exponent!"
+        if a == 0 and b < 0:
+            return "Error: Division by zero!"
+        result = self.math.power(a, b)
+        self.history.record(OP_POWER, a, b, result)
+        return result
+
+    def square_root(self, a):
+        """Square root: √a"""
+        a = self.coerce(a)
+        if a < 0:
+            return "Error: Cannot calculate square root of negative number!"
+        result = self.math.sqrt(a)
+        self.history.record(OP_SQUARE_ROOT, a, 0.0, result)
+        return result
+
+    def modulo(self, a, b):
+        """Modulo: a % b (sign follows the divisor, like float)"""
+        a, b = self.coerce(a), self.coerce(b)
+        if b == 0:
+            return "Error: Modulo by zero!"
+        result = self.context.remainder(a, b)
+        if result and (result < 0) != (b < 0):
+            result = self.context.add(result, b)
+        self.history.record(OP_MODULO, a, b, result)
+        return result
+
+    factorial = _exact_factorial
+
+    def sine(self, a):
+        """Sine: sin(a) in radians"""
+        a = self.coerce(a)
+        result = self.math.sin(a)
+        self.history.record(OP_SINE, a, 0.0, result)
+        return result
+
+    def cosine(self, a):
+        """Cosine: cos(a) in radians"""
+        a = self.coerce(a)
+        result = self.math.cos(a)
+        self.history.record(OP_COSINE, a, 0.0, result)
+        return result
+
+    def tangent(self, a):
+        """Tangent: tan(a) in radians"""
+        a = self.coerce(a)
+        result = self.math.tan(a)
+        self.history.record(OP_TANGENT, a, 0.0, result)
+        return result
+
+    def logarithm(self, a, base=10):
+        """Logarithm: log_base(a)"""
+        a, base = self.coerce(a), self.coerce(base)
+        if a <= 0:
+            return "Error: Logarithm of non-positive number!"
+        if base <= 0 or base == 1:
+            return "Error: Invalid logarithm base!"
+        result = self.math.log(a, base)
+        self.history.record(OP_LOGARITHM, a, base, result)
+        return result
+
+    def natural_log(self, a):
+        """Natural logarithm: ln(a)"""
+        a = self.coerce(a)
+        if a <= 0:
+            return "Error: Natural logarithm of non-positive number!"
+        result = self.math.ln(a)
+        self.history.record(OP_NATURAL_LOG, a, 0.0, result)
+        return result
+
+    def absolute(self, a):
+        """Absolute value: |a|"""
+        a = self.coerce(a)
+        result = self.context.abs(a)
+        self.history.record(OP_ABSOLUTE, a, 0.0, result)
+        return result
+
+    def evaluate(self, expression, **variables):
+        """Expression: evaluated in float (expressions compile to float code)"""
+        return super().evaluate(expression, **{name: float(value) for name, value in variables.items()})
+
+
+def _exact_sqrt(value):
+    """Exact square root of a Fraction, or None if it is irrational"""
+    numerator, denominator = value.numerator, value.denominator
+    root_n, root_d = math.isqrt(numerator), math.isqrt(denominator)
+    if root_n * root_n == numerator and root_d * root_d == denominator:
+        return Fraction(root_n, root_d)
+    return None
+
+
+@_trap_signals
+class FractionCalculator(Calculator):
+    """Calculator with exact rational arithmetic.
+
+    +, -, *, /, % and integer powers are exact. Irrational results (roots,
+    trig, logs, fractional powers) are computed in Decimal at `precision`
+    digits and returned as the Fraction of that Decimal.
+    """
+
+    mode = 'fraction'
+
+    def __init__(self, precision=DEFAULT_PRECISION, history_capacity=DEFAULT_CAPACITY, history=None):
+        super().__init__(history_capacity, history=history)
+        self.precision = precision
+        self.math = decimal_math(precision)
+
+    def parse_number(self, text):
+        """Parse user input exactly; accepts decimals, exponents and "p/q\""""
+        _check_exponent(text)
+        try:
+            return Fraction(text.strip())
+        except ZeroDivisionError:
+            raise ValueError(f"zero denominator in {text!r}") from None
+
+    def coerce(self, value):
+        """Convert an operand to Fraction (floats by their shortest repr)"""
+        if type(value) is Fraction:
+            return value
+        if isinstance(value, float):
+            return Fraction(repr(value))
+        if isinstance(value, str):
+            return self.parse_number(value)
+        return Fraction(value)
+
+    def _to_decimal(self, value):
+        return self.math.work.divide(Decimal(value.numerator), Decimal(value.denominator))
+
+    def _approximate(self, function, *args):
+        return Fraction(function(*(self._to_decimal(arg) for arg in args)))
+
+    def add(self, a, b):
+        """Addition: a + b"""
+        return super().add(self.coerce(a), self.coerce(b))
+
+    def subtract(self, a, b):
+        """Subtraction: a - b"""
+        return super().subtract(self.coerce(a), self.coerce(b))
+
+    def multiply(self, a, b):
+        """Multiplication: a * b"""
+        return super().multiply(self.coerce(a), self.coerce(b))
+
+    def divide(self, a, b):
+        """Division: a / b"""
+        return super().divide(self.coerce(a), self.coerce(b))
+
+    def modulo(self, a, b):
+        """Modulo: a % b"""
+        return super().modulo(self.coerce(a), self.coerce(b))
+
+    def absolute(self, a):
+        """Absolute value: |a|"""
+        return super().absolute(self.coerce(a))
+
+    factorial = _exact_factorial
+
+    def power(self, a, b):
+        """Power: a ** b (exact for integer exponents)"""
+        a, b = self.coerce(a), self.coerce(b)
+        if b.denominator == 1:
+            if a == 0 and b < 0:
+                return "Error: Division by zero!"
+            exponent = abs(b.numerator)
+            error = power_size_error(max(power_bits(a.numerator, exponent),
+                                         power_bits(a.denominator, exponent)))
+            if error:
+                return error
+            result = a ** b.numerator
+        else:
+            if a < 0:
+                return "Error: Negative base with fractional exponent!"
+            result = self._approximate(self.math.power, a, b)
+        self.history.record(OP_POWER, a, b, result)
+        return result
+
+    def square_root(self, a):
+        """Square root: √a (exact for perfect squares)"""
+        a = self.coerce(a)
+        if a < 0:
+            return "Error: Cannot calculate square root of negative number!"
+        result = _exact_sqrt(a)
+        if result is None:
+            result = self._approximate(self.math.sqrt, a)
+        self.history.record(OP_SQUARE_ROOT, a, 0.0, result)
+        return result
+
+    def sine(self, a):
+        """Sine: sin(a) in radians"""
+        a = self.coerce(a)
+        result = self._approximate(self.math.sin, a)
+        self.history.record(OP_SINE, a, 0.0, result)
+        return result
+
+    def cosine(self, a):
+        """Cosine: cos(a) in radians"""
+        a = self.coerce(a)
+        result = self._approximate(self.math.cos, a)
+        self.history.record(OP_COSINE, a, 0.0, result)
+        return result
+
+    def tangent(self, a):
+        """Tangent: tan(a) in radians"""
+        a = self.coerce(a)
+        result = self._approximate(self.math.tan, a)
+        self.history.record(OP_TANGENT, a, 0.0, result)
+        return result
+
+    def logarithm(self, a, base=10):
+        """Logarithm: log_base(a)"""
+        a, base = self.coerce(a), self.coerce(base)
+        if a <= 0:
+            return "Error: Logarithm of non-positive number!"
+        if base <= 0 or base == 1:
+            return "Error: Invalid logarithm base!"
+        result = self._approximate(self.math.log, a, base)
+        self.history.record(OP_LOGARITHM, a, base, result)
+        return result
+
+    def natural_log(self, a):
+        """Natural logarithm: ln(a)"""
+        a = self.coerce(a)
+        if a <= 0:
+            return "Error: Natural logarithm of non-positive number!"
+        result = self._approximate(self.math.ln, a)
+        self.history.record(OP_NATURAL_LOG, a, 0.0, result)
+        return result
+
+    def evaluate(self, expression, **variables):
+        """Expression: evaluated in float (expressions compile to float code)"""
+        return super().evaluate(expression, **{name: float(value) for name, value in variables.items()})
+
+
+MODES = {
+    'float': Calculator,
+    'decimal': DecimalCalculator,
+    'fraction': FractionCalculator,
+}
+
+
+def create_calculator(mode='float', precision=DEFAULT_PRECISION, history_capacity=DEFAULT_CAPACITY,
+                      history=None):
+    """Create a Calculator for a numeric mode: 'float', 'decimal' or 'fraction'.
+
+    `history` is an existing HistoryStore or HistoryLog to record into.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown numeric mode '{mode}' (choose from {', '.join(MODES)})")
+    if mode == 'float':
+        return Calculator(history_capacity, history=history)
+    return MODES[mode](precision, history_capacity, history=history)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Server
+Runs a socketserver request handler in N forked worker processes that share
+one listening port, restarting workers that die and shutting all of them
+down cleanly on Ctrl+C or SIGTERM
+"""
+
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+# A worker that exits sooner than this after starting counts towards a crash
+# loop, and its restart is delayed (doubling up to MAX_RESTART_DELAY)
+MIN_UPTIME = 1.0
+MAX_RESTART_DELAY = 5.0
+
+_STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+def default_workers():
+    """One worker per CPU"""
+    return os.cpu_count() or 1
+
+
+class WorkerServer(socketserver.TCPServer):
+    """TCPServer for pre-forked workers: a deeper accept backlog, and
+    optionally SO_REUSEPORT so every worker can bind its own socket"""
+
+    allow_reuse_address = True
+    request_queue_size = 128
+    reuse_port = False
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def _listen(address, handler, reuse_port):
+    server = WorkerServer(address, handler, bind_and_activate=False)
+    server.reuse_port = reuse_port
+    try:
+        server.server_bind()
+        server.server_activate()
+    except BaseException:
+        server.server_close()
+        raise
+    return server
+
+
+def _work(server):
+    """Worker process body: serve until SIGTERM, finishing the request in progress"""
+    # Ctrl+C reaches the whole process group; the supervisor decides what happens
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # shutdown() waits for serve_forever to return, so it must run on another thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, _STOP_SIGNALS)
+    # With a shared socket every idle worker wakes for a new connection and
+    # only one wins accept(); the others must not block in it
+    server.socket.setblocking(False)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def serve_prefork(address, handler, workers=None, reuse_port=False):
+    """Serve `handler` on `address` from `workers` forked processes (default:
+    one per CPU) until SIGINT or SIGTERM.
+
+    Workers share the listening socket, inherited across fork, and the
+    kernel hands each connection to one of them. With `reuse_port`, each
+    worker binds its own SO_REUSEPORT socket instead, and the kernel
+    balances connections between the sockets. This is Linux behaviour;
+    other systems may send everything to one worker. A worker that exits is
+    restarted, with a growing delay if it keeps dying at startup. On
+    shutdown, workers finish the request in progress.
+    """
+    if not hasattr(os, 'fork'):
+        raise RuntimeError("Pre-fork mode needs os.fork, which this platform does not have")
+    if reuse_port and not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("SO_REUSEPORT is not available on this platform")
+    workers = workers or default_workers()
+
+    # Bind in the supervisor either way, so a port in use fails here and not in every worker
+    shared = _listen(address, handler, reuse_port)
+    if reuse_port:
+        shared.server_close()
+        shared = None
+
+    children = {}  # pid -> (worker index, start time)
+    stopping = False
+
+    def spawn(index):
+        # Block the stop signals across fork so a child never runs the supervisor's handler
+        signal.pthread_sigmask(signal.SIG_BLOCK, _STOP_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _work(shared or _listen(address, handler, reuse_port))
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _STOP_SIGNALS)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous = {sig: signal.signal(sig, stop) for sig in _STOP_SIGNALS}
+    try:
+        for index in range(workers):
+            spawn(index)
+        delay = 0.0
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index, started = children.pop(pid, (None, 0.0))
+            if stopping or index is None:
+                continue
+            print(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}; "
+                  f"restarting", file=sys.stderr)
+            if time.monotonic() - started < MIN_UPTIME:
+                delay = min(max(2 * delay, 0.1), MAX_RESTART_DELAY)
+            else:
+                delay = 0.0
+            time.sleep(delay)
+            if not stopping:
+                spawn(index)
+    finally:
+        for sig, handler_ in previous.items():
+            signal.signal(sig, handler_)
+        if shared is not None:
+            shared.server_close()
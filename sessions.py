@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Session History
+Per-client calculation history for the web servers: a bounded,
+memory-capped table of HistoryStores keyed by session token, a history
+object that routes the shared Calculator's records to the current
+request's session, and cursor-paginated pages of a session's history
+"""
+
+import contextvars
+import http.cookies
+import secrets
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from history import BATCH_FLAG, OP_NAMES, HistoryStore, format_entry
+
+SESSION_COOKIE = 'calc_session'
+# Header for clients that keep the token themselves instead of a cookie
+SESSION_HEADER = 'X-Session-Token'
+
+# Entries kept per session, sessions kept, and bytes of history columns
+# across all sessions; the least recently used sessions go first
+DEFAULT_SESSION_CAPACITY = 1000
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Rough fixed cost of a session (its objects and table slot), in bytes
+SESSION_OVERHEAD = 1024
+
+# Entries per /history page, by default and at most
+DEFAULT_PAGE = 100
+MAX_PAGE = 1000
+
+_active = contextvars.ContextVar('calc_session', default=None)
+
+
+class Session:
+    """One client's history, identified by an unguessable token"""
+
+    __slots__ = ('token', 'history', 'nbytes')
+
+    def __init__(self, token, capacity):
+        self.token = token
+        self.history = HistoryStore(capacity)
+        self.nbytes = SESSION_OVERHEAD
+
+
+class SessionStore:
+    """Table of sessions, least recently used first out, held to
+    `max_sessions` sessions and about `max_bytes` of history.
+
+    Memory is counted from each session's history columns when a request
+    that used it finishes (see use), so the total can run over by one
+    request's growth in between. Not thread-safe: the servers use it from
+    one thread (or one event loop) per process.
+    """
+
+    def __init__(self, capacity=DEFAULT_SESSION_CAPACITY, max_sessions=DEFAULT_MAX_SESSIONS,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        if capacity < 0 or max_sessions < 1 or max_bytes < 0:
+            raise ValueError("Session limits must be positive")
+        self.capacity = capacity
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+        self._sessions = OrderedDict()
+
+    def get(self, token):
+        """The session for `token`, or None if it is unknown or was evicted"""
+        session = self._sessions.get(token)
+        if session is not None:
+            self._sessions.move_to_end(token)
+        return session
+
+    def create(self):
+        session = Session(secrets.token_urlsafe(18), self.capacity)
+        self._sessions[session.token] = session
+        self.nbytes += session.nbytes
+        self._evict()
+        return session
+
+    def resolve(self, token):
+        """(session, response headers) for a request's token. An unknown token
+        gets a new session (clients never choose their own token), and the
+        headers then set its cookie and return the token."""
+        session = self.get(token) if token else None
+        if session is not None:
+            return session, []
+        session = self.create()
+        return session, [('Set-Cookie', f"{SESSION_COOKIE}={session.token}; Path=/; HttpOnly; SameSite=Lax"),
+                         (SESSION_HEADER, session.token)]
+
+    @contextmanager
+    def use(self, session):
+        """Make `session` the one SessionHistory records to, in this thread or
+        asyncio task, for the duration of a request"""
+        _active.set(session)
+        try:
+            yield session
+        finally:
+            _active.set(None)
+            self.settle(session)
+
+    def stream(self, session, blocks):
+        """Iterate `blocks` (a streamed response computed as it is sent) with
+        `session` in use"""
+        with self.use(session):
+            yield from blocks
+
+    def settle(self, session):
+        """Recount a session's memory after a request and evict over the limits"""
+        if self._sessions.get(session.token) is not session:
+            return
+        nbytes = session.history.nbytes + SESSION_OVERHEAD
+        self.nbytes += nbytes - session.nbytes
+        session.nbytes = nbytes
+        self._evict()
+
+    def _evict(self):
+        sessions = self._sessions
+        while len(sessions) > self.max_sessions or (self.nbytes > self.max_bytes and len(sessions) > 1):
+            _, session = sessions.popitem(last=False)
+            self.nbytes -= session.nbytes
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """Counters as a dictionary"""
+        return {'sessions': len(self._sessions), 'max_sessions': self.max_sessions,
+                'bytes': self.nbytes, 'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class NoSessions:
+    """Stands in for a SessionStore where per-client history cannot work: in
+    the pre-fork server each worker has its own memory, so a client's
+    requests would land in different sessions. Requests run without a
+    session and no cookie is set; web_api.session_history answers 404.
+    """
+
+    def get(self, token):
+        return None
+
+    def resolve(self, token):
+        return None, []
+
+    @contextmanager
+    def use(self, session):
+        yield session
+
+    def stream(self, session, blocks):
+        return blocks
+
+    def __len__(self):
+        return 0
+
+
+class SessionHistory:
+    """Stands in for a HistoryStore on the servers' shared Calculator.
+
+    Each record goes to the history of the session in use in the current
+    thread or asyncio task (see SessionStore.use), and to `log`, the
+    server's persistent history_log.HistoryLog, when there is one. Outside
+    a session only the log records.
+    """
+
+    def __init__(self, log=None):
+        self.log = log
+
+    def _target(self):
+        session = _active.get()
+        if session is not None:
+            return session.history
+        return self.log
+
+    def record(self, op, a, b, result):
+        session = _active.get()
+        if session is not None:
+            session.history.record(op, a, b, result)
+        if self.log is not None:
+            self.log.record(op, a, b, result)
+
+    def record_batch(self, op, count, errors):
+        self.record(op | BATCH_FLAG, count, errors, float('nan'))
+
+    @property
+    def capacity(self):
+        session = _active.get()
+        return max(session.history.capacity if session is not None else 0,
+                   self.log.capacity if self.log is not None else 0)
+
+    @property
+    def recorded(self):
+        target = self._target()
+        return 0 if target is None else target.recorded
+
+    def last(self):
+        target = self._target()
+        return None if target is None else target.last()
+
+
+def request_token(cookie_header, token_header):
+    """Session token from a request's Cookie or X-Session-Token header"""
+    if token_header:
+        return token_header.strip()
+    if cookie_header:
+        cookies = http.cookies.SimpleCookie()
+        try:
+            cookies.load(cookie_header)
+        except http.cookies.CookieError:
+            return None
+        morsel = cookies.get(SESSION_COOKIE)
+        if morsel is not None:
+            return morsel.value
+    return None
+
+
+def history_page(history, after=None, before=None, limit=DEFAULT_PAGE):
+    """One page of a HistoryStore, oldest entry first.
+
+    With `after` (an entry number), the page is the entries recorded after
+    it, so a client polling with its last seen number gets only new ones.
+    Otherwise it is the newest entries before `before` (default: all), for
+    paging backwards. Entries evicted from the store are skipped, and
+    `missed` counts those between `after` and the oldest entry held.
+    """
+    limit = max(1, min(limit, MAX_PAGE))
+    recorded = history.recorded
+    oldest = recorded - len(history)
+    if after is not None:
+        start = max(after + 1, oldest)
+        stop = start + limit
+        more = stop < recorded
+    else:
+        stop = recorded if before is None else max(min(before, recorded), oldest)
+        start = max(stop - limit, oldest)
+        more = start > oldest
+    entries = []
+    for number, op, a, b, result, timestamp in history.numbered(start, stop):
+        name = OP_NAMES.get(op & ~BATCH_FLAG, 'unknown')
+        entries.append({'seq': number, 'operation': name + '[batch]' if op & BATCH_FLAG else name,
+                        'text': format_entry(op, a, b, result), 'timestamp': timestamp})
+    page = {'entries': entries, 'recorded': recorded, 'oldest': oldest, 'more': more}
+    if after is not None:
+        page['missed'] = max(0, oldest - after - 1)
+    return page
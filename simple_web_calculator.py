@@ -4,26 +4,58 @@ Simple Calculator Web App (No Dependencies)
 A basic web interface for the Advanced Calculator using only built-in modules
 """
 
+import argparse
 import http.server
 import socketserver
 import json
 import urllib.parse
-from calculator import Calculator
+from history_log import HistoryLog
+from instrumentation import Instrumentation
+from precision import DEFAULT_PRECISION, MODES, create_calculator
+from sessions import SESSION_HEADER, SessionHistory, SessionStore, request_token
+from web_api import (MAX_BATCH_BYTES, MAX_BATCH_ITEMS, RESULT_CACHE_BYTES, RESULT_CACHE_ITEMS, ROUTES,
+                     StaticPage, add_batch_arguments, add_cache_arguments, cache_stats, calculate_batch,
+                     calculation_response, handle, parse_body, parse_query, result_cache, session_history)
 import datetime
 
 class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.calculator = Calculator()
-        super().__init__(*args, **kwargs)
+    numeric_mode = 'float'
+    precision = DEFAULT_PRECISION
+    # Shared by the calculator when the server runs with --instrument
+    instrumentation = None
+    # Shared persistent history_log.HistoryLog when the server runs with --history-file
+    history_log = None
+    # web_api.StaticPage of get_calculator_html(), rendered and compressed once at import
+    page = None
+    # /calculate/batch limits, set by --batch-max-items and --batch-max-bytes
+    batch_max_items = MAX_BATCH_ITEMS
+    batch_max_bytes = MAX_BATCH_BYTES
+    # One calculator for every request, set up by run_server; its history is a
+    # sessions.SessionHistory that records into the requesting client's session
+    calculator = None
+    # sessions.SessionStore of per-client histories, served at /history
+    sessions = None
+    # memo.ResultCache of /calculate responses (see web_api.result_cache), or
+    # None with --cache-items 0; its counters are served at /cache
+    results = None
     
     def do_GET(self):
         if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
-            html_content = self.get_calculator_html()
-            self.wfile.write(html_content.encode())
+            self.send_validated(*self.page.respond(self.headers.get('Accept-Encoding', ''),
+                                                   self.headers.get('If-None-Match', '')))
+        elif self.path.split('?', 1)[0] == '/calculate':
+            self.send_calculation(parse_query(urllib.parse.urlsplit(self.path).query))
+        elif self.path.split('?', 1)[0] == '/history':
+            self.send_json(*session_history(self.sessions, self.session_token(),
+                                            urllib.parse.urlsplit(self.path).query))
+        elif self.path == '/stats':
+            if self.instrumentation is None:
+                status, response = 404, {'error': 'Instrumentation is off (start the server with --instrument)'}
+            else:
+                status, response = 200, self.instrumentation.snapshot()
+            self.send_json(status, response)
+        elif self.path == '/cache':
+            self.send_json(*cache_stats(self.results))
         else:
             super().do_GET()
     
@@ -31,60 +63,76 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
         if self.path == '/calculate':
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
-            data = urllib.parse.parse_qs(post_data.decode())
-            
-            operation = data.get('operation', [''])[0]
-            num1 = float(data.get('num1', ['0'])[0])
-            num2 = float(data.get('num2', ['0'])[0])
-            
-            result = self.perform_calculation(operation, num1, num2)
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            
-            response = {'result': str(result)}
-            self.wfile.write(json.dumps(response).encode())
+            self.send_calculation(parse_body(self.headers.get('Content-Type', ''), post_data))
+        elif self.path == '/calculate/batch':
+            content_length = int(self.headers['Content-Length'])
+            if content_length > self.batch_max_bytes:
+                self.send_json(413, {'error': f"Batch bodies are limited to {self.batch_max_bytes} bytes"})
+                return
+            body = self.rfile.read(content_length)
+            status, content_type, payload = calculate_batch(self.calculator, body, self.batch_max_items)
+            if status == 200:
+                session, session_headers = self.sessions.resolve(self.session_token())
+                self.send_stream(content_type, self.sessions.stream(session, payload), session_headers)
+            else:
+                self.send_body(status, content_type, payload)
+        elif self.path in ROUTES:
+            content_length = int(self.headers['Content-Length'])
+            body = self.rfile.read(content_length)
+            self.send_body(*handle(self.path, self.headers.get('Content-Type', ''), body))
         else:
             self.send_response(404)
             self.end_headers()
     
-    def perform_calculation(self, operation, num1, num2):
-        try:
-            if operation == 'add':
-                return self.calculator.add(num1, num2)
-            elif operation == 'subtract':
-                return self.calculator.subtract(num1, num2)
-            elif operation == 'multiply':
-                return self.calculator.multiply(num1, num2)
-            elif operation == 'divide':
-                return self.calculator.divide(num1, num2)
-            elif operation == 'power':
-                return self.calculator.power(num1, num2)
-            elif operation == 'sqrt':
-                return self.calculator.square_root(num1)
-            elif operation == 'modulo':
-                return self.calculator.modulo(num1, num2)
-            elif operation == 'factorial':
-                return self.calculator.factorial(int(num1))
-            elif operation == 'sin':
-                return self.calculator.sine(num1)
-            elif operation == 'cos':
-                return self.calculator.cosine(num1)
-            elif operation == 'tan':
-                return self.calculator.tangent(num1)
-            elif operation == 'log':
-                return self.calculator.logarithm(num1, num2)
-            elif operation == 'ln':
-                return self.calculator.natural_log(num1)
-            elif operation == 'abs':
-                return self.calculator.absolute(num1)
-            else:
-                return "Invalid operation"
-        except Exception as e:
-            return f"Error: {str(e)}"
+    def send_calculation(self, params):
+        """Answer /calculate (GET or POST) in the requesting client's session"""
+        session, session_headers = self.sessions.resolve(self.session_token())
+        with self.sessions.use(session):
+            status, headers, body = calculation_response(self.calculator, params, self.results,
+                                                         self.headers.get('If-None-Match', ''))
+        self.send_validated(status, headers + session_headers, body)
+    
+    def send_validated(self, status, headers, body):
+        """Send a (status, headers, body) response, which may be a 304 Not Modified"""
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if status == 200:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_json(self, status, payload):
+        """Send a JSON response"""
+        self.send_body(status, 'application/json', json.dumps(payload).encode())
+    
+    def send_body(self, status, content_type, body):
+        """Send a response body of any content type"""
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_stream(self, content_type, blocks, headers=()):
+        """Send a 200 response whose body is written block by block as the
+        iterator produces it; with no Content-Length, closing the connection
+        ends the body"""
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        for block in blocks:
+            self.wfile.write(block)
+        self.close_connection = True
+    
+    def session_token(self):
+        """The requesting client's session token, if it sent one"""
+        return request_token(self.headers.get('Cookie'), self.headers.get(SESSION_HEADER))
     
-    def get_calculator_html(self):
+    @staticmethod
+    def get_calculator_html():
         return """
 <!DOCTYPE html>
 <html lang="en">
@@ -277,6 +325,10 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
                 <button class="calc-button" onclick="calculate('sqrt')">√ Square Root</button>
                 <button class="calc-button" onclick="calculate('modulo')">% Modulo</button>
                 <button class="calc-button" onclick="calculate('factorial')">! Factorial</button>
+                <button class="calc-button" onclick="calculate('powmod')">🔐 Power mod m</button>
+            </div>
+            <div class="input-group">
+                <input type="number" id="num3" placeholder="Modulus m (for power mod m)" step="1">
             </div>
         </div>
         
@@ -300,6 +352,17 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
             </div>
         </div>
         
+        <!-- Expressions -->
+        <div class="operation-section">
+            <h3>🧩 Expression</h3>
+            <div class="input-group">
+                <input type="text" id="expression" placeholder="e.g. 2*sin(x) + log(y, 3) with x, y from above">
+            </div>
+            <div class="button-group">
+                <button class="calc-button" onclick="calculate('evaluate')">= Evaluate</button>
+            </div>
+        </div>
+        
         <!-- Result Display -->
         <div class="result-display">
             <h4>Result:</h4>
@@ -315,6 +378,8 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
     
     <script>
         let calculationHistory = [];
+        // Number of the newest history entry shown, the cursor for /history?after=
+        let historyCursor = null;
         
         async function calculate(operation) {
             const num1 = parseFloat(document.getElementById('num1').value) || 0;
@@ -324,38 +389,44 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
             formData.append('operation', operation);
             formData.append('num1', num1);
             formData.append('num2', num2);
+            formData.append('num3', document.getElementById('num3').value || 0);
+            formData.append('expression', document.getElementById('expression').value);
             
             try {
                 const response = await fetch('/calculate', {
                     method: 'POST',
-                    body: formData
+                    body: new URLSearchParams(formData)
                 });
                 
                 const data = await response.json();
                 document.getElementById('result').textContent = data.result;
                 
-                // Add to history
-                const timestamp = new Date().toLocaleTimeString();
-                const historyItem = {
-                    operation: operation,
-                    num1: num1,
-                    num2: num2,
-                    result: data.result,
-                    timestamp: timestamp
-                };
-                
-                calculationHistory.unshift(historyItem);
-                if (calculationHistory.length > 10) {
-                    calculationHistory.pop();
-                }
-                
-                updateHistory();
+                await loadHistory();
                 
             } catch (error) {
                 document.getElementById('result').textContent = 'Error: ' + error.message;
             }
         }
         
+        async function loadHistory() {
+            // The session's history is kept by the server: fetch only entries
+            // newer than those shown, or the newest 10 when starting over
+            let data = null;
+            if (historyCursor !== null) {
+                data = await (await fetch(`/history?after=${historyCursor}`)).json();
+            }
+            if (data === null || data.more) {
+                calculationHistory = [];
+                data = await (await fetch('/history?limit=10')).json();
+            }
+            data.entries.forEach(entry => {
+                calculationHistory.unshift(entry);
+                historyCursor = entry.seq;
+            });
+            calculationHistory = calculationHistory.slice(0, 10);
+            updateHistory();
+        }
+        
         function updateHistory() {
             const historyDiv = document.getElementById('history');
             historyDiv.innerHTML = '';
@@ -363,10 +434,11 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
             calculationHistory.forEach(item => {
                 const historyItem = document.createElement('div');
                 historyItem.className = 'history-item';
-                historyItem.innerHTML = `
-                    <strong>${item.operation}</strong>: ${item.num1}, ${item.num2} = <strong>${item.result}</strong><br>
-                    <small>${item.timestamp}</small>
-                `;
+                const text = document.createElement('strong');
+                text.textContent = item.text;
+                const time = document.createElement('small');
+                time.textContent = new Date(item.timestamp * 1000).toLocaleTimeString();
+                historyItem.append(text, document.createElement('br'), time);
                 historyDiv.appendChild(historyItem);
             });
         }
@@ -375,15 +447,32 @@ class CalculatorHandler(http.server.SimpleHTTPRequestHandler):
         document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('num1').value = '';
             document.getElementById('num2').value = '';
+            document.getElementById('num3').value = '';
+            document.getElementById('expression').value = '';
+            loadHistory();
         });
     </script>
 </body>
 </html>
         """
 
-def run_server(port=8000):
+CalculatorHandler.page = StaticPage(CalculatorHandler.get_calculator_html())
+
+def run_server(port=8000, mode='float', precision=DEFAULT_PRECISION, instrument=False,
+               history_file=None, batch_max_items=MAX_BATCH_ITEMS, batch_max_bytes=MAX_BATCH_BYTES,
+               cache_items=RESULT_CACHE_ITEMS, cache_bytes=RESULT_CACHE_BYTES):
     """Run the calculator web server"""
     handler = CalculatorHandler
+    handler.numeric_mode = mode
+    handler.precision = precision
+    handler.instrumentation = Instrumentation() if instrument else None
+    handler.history_log = HistoryLog(history_file) if history_file else None
+    handler.batch_max_items = batch_max_items
+    handler.batch_max_bytes = batch_max_bytes
+    handler.sessions = SessionStore()
+    handler.results = result_cache(cache_items, cache_bytes)
+    handler.calculator = create_calculator(mode, precision, history=SessionHistory(handler.history_log))
+    handler.calculator.instrumentation = handler.instrumentation
     
     with socketserver.TCPServer(("", port), handler) as httpd:
         print(f"🧮 Advanced Calculator Web App")
@@ -395,6 +484,28 @@ def run_server(port=8000):
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n👋 Calculator server stopped. Goodbye!")
+        finally:
+            if handler.history_log is not None:
+                handler.history_log.close()
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Advanced Calculator web server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", choices=tuple(MODES), default="float",
+                        help="numeric mode for calculations (default: float)")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="significant digits in decimal mode")
+    parser.add_argument("--instrument", action="store_true",
+                        help="collect per-operation counters and latencies, served at /stats")
+    parser.add_argument("--history-file", metavar="PATH",
+                        help="record every calculation in a persistent history log at PATH")
+    add_batch_arguments(parser)
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    args = parse_args()
+    run_server(args.port, args.mode, args.precision, args.instrument, args.history_file,
+               args.batch_max_items, args.batch_max_bytes,
+               args.cache_items, args.cache_bytes)
\ No newline at end of file
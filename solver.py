@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Equation Solver
+Root finding over calculator expressions: Brent's bracketing method, Newton's
+method and a vectorized multi-start scan that finds every sign-changing root
+in an interval in one batch
+"""
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from expression import compile_expression, equation_source
+from vectorized import compile_array_expression
+
+SolveResult = namedtuple("SolveResult", [
+    "root",         # best estimate of the root
+    "residual",     # f(root)
+    "iterations",
+    "evaluations",  # calls of f (and of the derivative)
+    "converged",
+    "reason",       # why the iteration stopped
+])
+
+RootsResult = namedtuple("RootsResult", [
+    "roots",        # sorted array of roots found
+    "residuals",    # f at each root
+    "converged",    # per-root boolean mask
+    "iterations",   # refinement rounds
+    "evaluations",  # integrand evaluations, counted element by element
+])
+
+METHODS = ('brent', 'newton', 'all')
+DEFAULT_METHOD = 'brent'
+DEFAULT_XTOL = 2e-12
+DEFAULT_RTOL = 4 * np.finfo(np.float64).eps
+DEFAULT_MAX_ITERATIONS = 100
+# Sample points for the multi-start scan
+DEFAULT_SAMPLES = 1000
+
+
+class SolverError(ValueError):
+    """Raised for invalid equations, brackets without a sign change and bad arguments"""
+
+
+def _scalar(function):
+    """Wrap f so calls return floats and count themselves in calls[0]"""
+    calls = [0]
+
+    def counted(x):
+        calls[0] += 1
+        return float(function(x))
+    return counted, calls
+
+
+def brent(function, a, b, xtol=DEFAULT_XTOL, rtol=DEFAULT_RTOL, max_iterations=DEFAULT_MAX_ITERATIONS):
+    """Root of f in [a, b] by Brent's method; f(a) and f(b) must differ in sign.
+
+    Inverse quadratic interpolation and secant steps, falling back to
+    bisection whenever they would not shrink the bracket fast enough, so
+    convergence is guaranteed. Stops when the bracket is narrower than
+    xtol + rtol*|root|.
+    """
+    f, calls = _scalar(function)
+    xpre, xcur = float(a), float(b)
+    fpre, fcur = f(xpre), f(xcur)
+    if fpre == 0:
+        return SolveResult(xpre, fpre, 0, calls[0], True, "exact root")
+    if fcur == 0:
+        return SolveResult(xcur, fcur, 0, calls[0], True, "exact root")
+    if math.isnan(fpre) or math.isnan(fcur) or (fpre > 0) == (fcur > 0):
+        raise SolverError(f"f(a) = {fpre:g} and f(b) = {fcur:g} must have opposite signs")
+
+    xblk = fblk = spre = scur = 0.0
+    for iteration in range(1, max_iterations + 1):
+        if (fpre > 0) != (fcur > 0):
+            xblk, fblk = xpre, fpre
+            spre = scur = xcur - xpre
+        if abs(fblk) < abs(fcur):
+            xpre, xcur, xblk = xcur, xblk, xcur
+            fpre, fcur, fblk = fcur, fblk, fcur
+
+        delta = (xtol + rtol * abs(xcur)) / 2
+        bisect = (xblk - xcur) / 2
+        if fcur == 0 or abs(bisect) < delta:
+            return SolveResult(xcur, fcur, iteration, calls[0], True,
+                               "exact root" if fcur == 0 else "bracket within tolerance")
+
+        if abs(spre) > delta and abs(fcur) < abs(fpre):
+            if xpre == xblk:
+                step = -fcur * (xcur - xpre) / (fcur - fpre)  # secant
+            else:
+                dpre = (fpre - fcur) / (xpre - xcur)
+                dblk = (fblk - fcur) / (xblk - xcur)
+                step = -fcur * (fblk * dblk - fpre * dpre) / (dblk * dpre * (fblk - fpre))
+            if 2 * abs(step) < min(abs(spre), 3 * abs(bisect) - delta):
+                spre, scur = scur, step
+            else:
+                spre = scur = bisect
+        else:
+            spre = scur = bisect
+
+        xpre, fpre = xcur, fcur
+        xcur += scur if abs(scur) > delta else math.copysign(delta, bisect)
+        fcur = f(xcur)
+        if math.isnan(fcur):
+            return SolveResult(xcur, fcur, iteration, calls[0], False, "f is undefined inside the bracket")
+
+    return SolveResult(xcur, fcur, max_iterations, calls[0], False, "iteration limit reached")
+
+
+def _central_difference(f):
+    def derivative(x):
+        h = 6.0554544523933395e-06 * max(1.0, abs(x))  # cube root of machine epsilon
+        return (f(x + h) - f(x - h)) / (2 * h)
+    return derivative
+
+
+def newton(function, x0, derivative=None, xtol=DEFAULT_XTOL, rtol=DEFAULT_RTOL,
+           max_iterations=DEFAULT_MAX_ITERATIONS):
+    """Root of f near x0 by Newton's method.
+
+    `derivative` is f' if known, otherwise a central difference is used (two
+    extra evaluations per step). Stops when a step is smaller than
+    xtol + rtol*|x|; convergence is only local, so the result reports why
+    it stopped.
+    """
+    f, calls = _scalar(function)
+    df = _central_difference(f) if derivative is None else _scalar(derivative)[0]
+    x = float(x0)
+    fx = f(x)
+    for iteration in range(1, max_iterations + 1):
+        if fx == 0:
+            return SolveResult(x, fx, iteration - 1, calls[0], True, "exact root")
+        slope = df(x)
+        if derivative is not None:
+            calls[0] += 1
+        if slope == 0 or not math.isfinite(slope):
+            return SolveResult(x, fx, iteration - 1, calls[0], False, "derivative is zero or undefined")
+        step = fx / slope
+        x -= step
+        if not math.isfinite(x):
+            return SolveResult(x, math.nan, iteration, calls[0], False, "diverged")
+        fx = f(x)
+        if abs(step) <= xtol + rtol * abs(x):
+            return SolveResult(x, fx, iteration, calls[0], True, "step within tolerance")
+    return SolveResult(x, fx, max_iterations, calls[0], False, "iteration limit reached")
+
+
+def find_roots(function, a, b, samples=DEFAULT_SAMPLES, xtol=DEFAULT_XTOL, rtol=DEFAULT_RTOL,
+               max_iterations=DEFAULT_MAX_ITERATIONS):
+    """Every root of f in [a, b] where f changes sign, refined in one batch.
+
+    `function` takes and returns NumPy arrays. f is sampled at `samples` + 1
+    evenly spaced points; each sign change is a bracket, and all brackets
+    are bisected together, one array evaluation per round. Sign changes
+    across poles (where |f| grows instead of shrinking) are dropped.
+    Roots where f touches zero without changing sign (such as x^2 at 0) are
+    only found if a sample lands on them; use newton for those.
+    """
+    a, b = float(a), float(b)
+    if not (math.isfinite(a) and math.isfinite(b) and a < b):
+        raise SolverError("The interval must be finite with a < b")
+    if samples < 1:
+        raise SolverError("At least one sample interval is needed")
+
+    def sample(x):
+        with np.errstate(all='ignore'):
+            return np.broadcast_to(np.asarray(function(x), dtype=np.float64), x.shape)
+
+    x = np.linspace(a, b, int(samples) + 1)
+    y = sample(x)
+    evaluations = x.size
+    exact = x[y == 0]
+    change = (np.signbit(y[:-1]) != np.signbit(y[1:])) & (y[:-1] != 0) & (y[1:] != 0)
+    change &= np.isfinite(y[:-1]) & np.isfinite(y[1:])
+    lo, hi = x[:-1][change], x[1:][change]
+    f_lo = y[:-1][change]
+    bound = np.maximum(np.abs(f_lo), np.abs(y[1:][change]))
+
+    iterations = 0
+    while lo.size and iterations < max_iterations:
+        middle = 0.5 * (lo + hi)
+        active = (hi - lo) > xtol + rtol * np.abs(middle)
+        if not active.any():
+            break
+        iterations += 1
+        f_middle = sample(middle)
+        evaluations += middle.size
+        left = (np.signbit(f_middle) == np.signbit(f_lo)) & active & (f_middle != 0)
+        right = ~left & active
+        lo = np.where(left, middle, lo)
+        f_lo = np.where(left, f_middle, f_lo)
+        hi = np.where(right, middle, hi)
+        done = f_middle == 0
+        lo = np.where(done, middle, lo)
+
+    roots = 0.5 * (lo + hi)
+    residuals = sample(roots)
+    evaluations += roots.size
+    converged = (hi - lo) <= xtol + rtol * np.abs(roots)
+    keep = np.abs(residuals) <= bound  # poles have |f| blowing up at the "root"
+
+    roots = np.concatenate([exact, roots[keep]])
+    residuals = np.concatenate([np.zeros(exact.size), residuals[keep]])
+    converged = np.concatenate([np.ones(exact.size, dtype=bool), converged[keep]])
+    order = np.argsort(roots, kind='stable')
+    return RootsResult(roots[order], residuals[order], converged[order], iterations, evaluations)
+
+
+def solve_equation(equation, method=DEFAULT_METHOD, a=None, b=None, x0=None, variable='x',
+                   derivative=None, samples=DEFAULT_SAMPLES, max_iterations=DEFAULT_MAX_ITERATIONS,
+                   **values):
+    """Solve an equation such as "x^3 - 2*x = 5" for `variable`.
+
+    'brent' needs a bracket [a, b], 'newton' a starting point x0 (and takes
+    an optional `derivative` expression), 'all' scans [a, b] for every root
+    with find_roots. Other variables are fixed at `values`. Returns a
+    SolveResult, or a RootsResult for 'all'.
+    """
+    if method not in METHODS:
+        raise SolverError(f"Unknown solver method '{method}' (use {', '.join(METHODS)})")
+    source = equation_source(equation)
+    values = {name: float(value) for name, value in values.items()}
+    if method == 'newton':
+        if x0 is None:
+            raise SolverError("Newton's method needs a starting point x0")
+        slope = None if derivative is None else compile_expression(derivative).bind(variable, **values)
+        return newton(compile_expression(source).bind(variable, **values), x0, slope,
+                      max_iterations=max_iterations)
+    if a is None or b is None:
+        raise SolverError(f"The '{method}' method needs an interval [a, b]")
+    if method == 'all':
+        return find_roots(compile_array_expression(source).bind(variable, **values), a, b, samples,
+                          max_iterations=max_iterations)
+    return brent(compile_expression(source).bind(variable, **values), a, b,
+                 max_iterations=max_iterations)
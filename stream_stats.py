@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Streaming Statistics
+Single-pass, constant-memory summary statistics over iterators or NumPy
+chunks: compensated sum and product, Welford mean and variance, min/max and
+a mergeable relative-error quantile sketch
+"""
+
+import math
+import re
+from array import array
+
+import numpy as np
+
+DEFAULT_CHUNK = 65536
+DEFAULT_ACCURACY = 0.01
+DEFAULT_MAX_BUCKETS = 2048
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Veltkamp splitting constant 2**27 + 1
+_SPLIT = 134217729.0
+
+
+def _two_product_error(a, b, p):
+    """Exact rounding error of p = a*b (Dekker), for scalars or arrays.
+
+    Operands must be normalized mantissas so the split cannot overflow.
+    """
+    c = _SPLIT * a
+    a_hi = c - (c - a)
+    a_lo = a - a_hi
+    c = _SPLIT * b
+    b_hi = c - (c - b)
+    b_lo = b - b_hi
+    return a_lo * b_lo - (((p - a_hi * b_hi) - a_lo * b_hi) - a_hi * b_lo)
+
+
+class CompensatedSum:
+    """Neumaier summation: a running sum plus the rounding error it has lost"""
+
+    __slots__ = ('total', 'compensation')
+
+    def __init__(self, total=0.0, compensation=0.0):
+        self.total = total
+        self.compensation = compensation
+
+    def add(self, value):
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    def add_array(self, values):
+        """Add a chunk; NumPy's pairwise sum keeps the in-chunk error O(log n)"""
+        self.add(float(np.sum(values)))
+
+    def merge(self, other):
+        self.add(other.total)
+        self.add(other.compensation)
+
+    @property
+    def value(self):
+        return self.total + self.compensation
+
+
+class CompensatedProduct:
+    """Product kept as (mantissa + error) * 2**exponent.
+
+    Each step multiplies normalized mantissas and carries the exact rounding
+    error forward (Graillat's compensated product), and the binary exponent
+    is tracked separately, so long products neither lose precision nor
+    overflow until `value` converts back to a float.
+    """
+
+    __slots__ = ('mantissa', 'error', 'exponent')
+
+    def __init__(self, mantissa=1.0, error=0.0, exponent=0):
+        self.mantissa = mantissa
+        self.error = error
+        self.exponent = exponent
+
+    def _combine(self, mantissa, error, exponent):
+        product = self.mantissa * mantissa
+        error = (self.mantissa * error + mantissa * self.error
+                 + _two_product_error(self.mantissa, mantissa, product))
+        normalized, shift = math.frexp(product)
+        self.mantissa = normalized
+        self.error = math.ldexp(error, -shift) if shift else error
+        self.exponent += exponent + shift
+
+    def add(self, value):
+        """Multiply in one value"""
+        mantissa, exponent = math.frexp(value)
+        self._combine(mantissa, 0.0, exponent)
+
+    def add_array(self, values):
+        """Multiply in a chunk by a pairwise tree, compensated at every level"""
+        mantissas, exponents = np.frexp(values)
+        exponent = int(exponents.sum())
+        errors = np.zeros_like(mantissas)
+        while mantissas.size > 1:
+            if mantissas.size % 2:
+                mantissas = np.append(mantissas, 1.0)
+                errors = np.append(errors, 0.0)
+            a, b = mantissas[0::2], mantissas[1::2]
+            product = a * b
+            errors = a * errors[1::2] + b * errors[0::2] + _two_product_error(a, b, product)
+            mantissas, shifts = np.frexp(product)
+            errors = np.ldexp(errors, -shifts)
+            exponent += int(shifts.sum())
+        if mantissas.size:
+            self._combine(float(mantissas[0]), float(errors[0]), exponent)
+
+    def merge(self, other):
+        self._combine(other.mantissa, other.error, other.exponent)
+
+    @property
+    def value(self):
+        """The product as a float (inf or 0.0 when it is out of float range)"""
+        try:
+            return math.ldexp(self.mantissa + self.error, self.exponent)
+        except OverflowError:
+            return math.copysign(math.inf, self.mantissa)
+
+    @property
+    def log10(self):
+        """log10 of |product|, available even when the product overflows a float"""
+        magnitude = abs(self.mantissa + self.error)
+        if not magnitude:
+            return -math.inf
+        return math.log10(magnitude) + self.exponent * math.log10(2)
+
+
+class Moments:
+    """Count, mean and sum of squared deviations (Welford; Chan et al. to merge)"""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def add_array(self, values):
+        if values.size:
+            mean = float(values.mean())
+            deviations = values - mean
+            self.merge(Moments(int(values.size), mean, float(np.dot(deviations, deviations))))
+
+    def merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1 denominator)"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def population_variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+    Values are counted in logarithmic buckets of ratio gamma =
+    (1 + accuracy) / (1 - accuracy), so any quantile is returned within
+    `accuracy` relative error of a value at that rank. Memory is at most
+    `max_buckets` per sign; beyond that the smallest-magnitude buckets are
+    collapsed, which only affects the lowest quantiles. Sketches with the
+    same accuracy merge by adding bucket counts.
+    """
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY, max_buckets=DEFAULT_MAX_BUCKETS):
+        if not 0 < accuracy < 1:
+            raise ValueError("Sketch accuracy must be between 0 and 1")
+        self.accuracy = accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _bucket(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def add(self, value):
+        self.count += 1
+        if value > 0:
+            key = self._bucket(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+            if len(self.positive) > self.max_buckets:
+                self._collapse(self.positive)
+        elif value < 0:
+            key = self._bucket(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+            if len(self.negative) > self.max_buckets:
+                self._collapse(self.negative)
+        else:
+            self.zeros += 1
+
+    def _add_keys(self, store, magnitudes):
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        unique, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(unique.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+        if len(store) > self.max_buckets:
+            self._collapse(store)
+
+    def add_array(self, values):
+        self.count += int(values.size)
+        positive = values[values > 0]
+        negative = values[values < 0]
+        self.zeros += int(values.size - positive.size - negative.size)
+        if positive.size:
+            self._add_keys(self.positive, positive)
+        if negative.size:
+            self._add_keys(self.negative, -negative)
+
+    def _collapse(self, store):
+        """Fold the smallest-magnitude buckets into one to respect max_buckets"""
+        keys = sorted(store)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        store[target] += sum(store.pop(key) for key in keys[:excess])
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+            if len(mine) > self.max_buckets:
+                self._collapse(mine)
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0 <= q <= 1), or nan when empty"""
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def to_dict(self):
+        return {
+            'accuracy': self.accuracy,
+            'max_buckets': self.max_buckets,
+            'positive': {str(key): count for key, count in self.positive.items()},
+            'negative': {str(key): count for key, count in self.negative.items()},
+            'zeros': self.zeros,
+            'count': self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['accuracy'], data['max_buckets'])
+        sketch.positive = {int(key): count for key, count in data['positive'].items()}
+        sketch.negative = {int(key): count for key, count in data['negative'].items()}
+        sketch.zeros = data['zeros']
+        sketch.count = data['count']
+        return sketch
+
+
+class StreamStats:
+    """Single-pass summary of a stream of numbers.
+
+    Feed scalars with `update`, NumPy chunks with `update_array`, or any
+    iterable of either with `consume`. Memory is constant in the stream
+    length. Non-finite values (nan, +-inf) are counted in `skipped` and left
+    out of every statistic. Partial results from other chunks, threads or
+    processes combine with `merge` (use to_dict/from_dict to ship them).
+    """
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY, max_buckets=DEFAULT_MAX_BUCKETS):
+        self.sum = CompensatedSum()
+        self.product = CompensatedProduct()
+        self.moments = Moments()
+        self.sketch = QuantileSketch(accuracy, max_buckets)
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.skipped = 0
+
+    @property
+    def count(self):
+        return self.moments.count
+
+    def update(self, value):
+        """Add one number"""
+        value = float(value)
+        if not math.isfinite(value):
+            self.skipped += 1
+            return
+        self.sum.add(value)
+        self.product.add(value)
+        self.moments.add(value)
+        self.sketch.add(value)
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    def update_array(self, values):
+        """Add a chunk of numbers (any array-like; NumPy arrays are not copied)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        finite = np.isfinite(values)
+        if not finite.all():
+            self.skipped += int(values.size - np.count_nonzero(finite))
+            values = values[finite]
+        if not values.size:
+            return
+        self.sum.add_array(values)
+        self.product.add_array(values)
+        self.moments.add_array(values)
+        self.sketch.add_array(values)
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+    def consume(self, source, chunk_size=DEFAULT_CHUNK):
+        """Add every item of `source`: NumPy arrays go in whole, scalars are
+        buffered into chunks of `chunk_size`. Returns self."""
+        pending = array('d')
+        for item in source:
+            if isinstance(item, np.ndarray):
+                self.update_array(item)
+                continue
+            pending.append(item)
+            if len(pending) >= chunk_size:
+                self.update_array(np.frombuffer(pending, dtype=np.float64))
+                pending = array('d')
+        if pending:
+            self.update_array(np.frombuffer(pending, dtype=np.float64))
+        return self
+
+    def merge(self, other):
+        """Fold another StreamStats into this one. Returns self."""
+        self.sum.merge(other.sum)
+        self.product.merge(other.product)
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.skipped += other.skipped
+        return self
+
+    def quantile(self, q):
+        """Approximate quantile, clamped to the exact min and max"""
+        if not self.count:
+            return math.nan
+        if q <= 0:
+            return self.minimum
+        if q >= 1:
+            return self.maximum
+        return min(max(self.sketch.quantile(q), self.minimum), self.maximum)
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        """Plain-dict summary, safe to serialize as JSON once non-finite values are handled"""
+        count = self.count
+        return {
+            'count': count,
+            'skipped': self.skipped,
+            'sum': self.sum.value,
+            'product': self.product.value if count else math.nan,
+            'product_log10': self.product.log10 if count else math.nan,
+            'mean': self.moments.mean if count else math.nan,
+            'variance': self.moments.variance,
+            'stdev': math.sqrt(self.moments.variance),
+            'min': self.minimum if count else math.nan,
+            'max': self.maximum if count else math.nan,
+            'quantiles': {f"p{q * 100:g}": self.quantile(q) for q in quantiles},
+        }
+
+    def to_dict(self):
+        """Full mergeable state as plain data"""
+        return {
+            'sum': [self.sum.total, self.sum.compensation],
+            'product': [self.product.mantissa, self.product.error, self.product.exponent],
+            'moments': [self.moments.count, self.moments.mean, self.moments.m2],
+            'sketch': self.sketch.to_dict(),
+            'min': self.minimum,
+            'max': self.maximum,
+            'skipped': self.skipped,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = QuantileSketch.from_dict(data['sketch'])
+        stats = cls(sketch.accuracy, sketch.max_buckets)
+        stats.sum = CompensatedSum(*data['sum'])
+        stats.product = CompensatedProduct(*data['product'])
+        stats.moments = Moments(*data['moments'])
+        stats.sketch = sketch
+        stats.minimum = data['min']
+        stats.maximum = data['max']
+        stats.skipped = data['skipped']
+        return stats
+
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def parse_numbers(lines):
+    """Yield floats from text lines of numbers separated by whitespace, commas or
+    semicolons; blank lines and # comments are skipped"""
+    for line in lines:
+        line = line.split('#', 1)[0]
+        for field in _SEPARATORS.split(line):
+            if field:
+                yield float(field)
+
+
+def summarize(values, quantiles=DEFAULT_QUANTILES, **options):
+    """Summary statistics for an iterable of numbers or NumPy chunks"""
+    return StreamStats(**options).consume(values).summary(quantiles)
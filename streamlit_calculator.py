@@ -4,10 +4,19 @@ Streamlit Calculator Web App
 A beautiful web interface for the Advanced Calculator
 """
 
+import io
 import streamlit as st
 import math
+import numpy as np
 import pandas as pd
-from calculator import Calculator
+from calculator import OPERATION_LIST, Calculator, dispatch
+from factorial import FACTORIALS, format_number
+from history_log import HistoryLog
+from instrumentation import Instrumentation
+from linalg import OPERATIONS as MATRIX_OPERATIONS, summarize as summarize_matrix
+from precision import DEFAULT_PRECISION, MODES, create_calculator
+from stream_stats import StreamStats, parse_numbers
+from tabulate import Axis, axis, parse_ranges, tabulate, write_csv
 import plotly.express as px
 import plotly.graph_objects as go
 
@@ -84,8 +93,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize calculator
+if 'instrumentation' not in st.session_state:
+    st.session_state.instrumentation = Instrumentation()
+
 if 'calculator' not in st.session_state:
     st.session_state.calculator = Calculator()
+    st.session_state.calculator.instrumentation = st.session_state.instrumentation
 
 if 'calculation_history' not in st.session_state:
     st.session_state.calculation_history = []
@@ -100,9 +113,33 @@ with st.sidebar:
     # Operation type selector
     operation_type = st.selectbox(
         "Select Operation Type",
-        ["Basic Operations", "Advanced Operations", "Trigonometric", "Logarithmic", "Other Functions"]
+        ["Basic Operations", "Advanced Operations", "Trigonometric", "Logarithmic", "Other Functions", "Expression", "Integration", "Equation Solver", "Statistics", "Tables & Plots", "Matrices"]
     )
     
+    # Numeric mode: fast floats, Decimal at a chosen precision, or exact fractions
+    numeric_mode = st.selectbox("Numeric Mode", list(MODES))
+    precision = DEFAULT_PRECISION
+    if numeric_mode != "float":
+        precision = int(st.number_input("Precision (digits)", value=DEFAULT_PRECISION,
+                                        min_value=5, max_value=1000, step=1))
+    
+    # Optional persistent history log, kept across sessions
+    history_file = st.text_input("History Log File", value="",
+                                 help="Path of a persistent history log (leave empty for in-memory history)")
+    if history_file != st.session_state.get('history_file', ""):
+        if st.session_state.get('history_log') is not None:
+            st.session_state.history_log.close()
+        st.session_state.history_log = HistoryLog(history_file) if history_file else None
+        st.session_state.history_file = history_file
+    history_log = st.session_state.get('history_log')
+    
+    calculator = st.session_state.calculator
+    if (calculator.mode != numeric_mode or getattr(calculator, 'precision', precision) != precision
+            or (history_log is not None or isinstance(calculator.history, HistoryLog))
+            and calculator.history is not history_log):
+        st.session_state.calculator = create_calculator(numeric_mode, precision, history=history_log)
+        st.session_state.calculator.instrumentation = st.session_state.instrumentation
+    
     # Clear history button
     if st.button("🗑️ Clear History", type="secondary"):
         st.session_state.calculator.clear_history()
@@ -119,6 +156,30 @@ with st.sidebar:
             file_name="calculator_history.csv",
             mime="text/csv"
         )
+    if history_log is not None and len(history_log):
+        log_csv = io.StringIO()
+        history_log.export_csv(log_csv)
+        st.download_button(
+            label="📥 Download History Log",
+            data=log_csv.getvalue(),
+            file_name="calculator_history_log.csv",
+            mime="text/csv"
+        )
+    
+    # Per-operation counters from the shared instrumentation
+    snapshot = st.session_state.instrumentation.snapshot()
+    if snapshot['operations']:
+        with st.expander("📈 Operation Stats"):
+            st.dataframe(pd.DataFrame([
+                {
+                    "Operation": name,
+                    "Calls": stats['calls'],
+                    "Errors": stats['errors'],
+                    "Mean (µs)": round(stats['mean_ns'] / 1000, 2),
+                    "p99 (µs)": round(stats['p99_ns'] / 1000, 2),
+                }
+                for name, stats in snapshot['operations'].items()
+            ]), hide_index=True)
 
 # Main calculator interface
 col1, col2 = st.columns([2, 1])
@@ -142,7 +203,7 @@ with col1:
         
         with col_add:
             if st.button("➕ Add", key="add"):
-                result = st.session_state.calculator.add(a, b)
+                result = dispatch(st.session_state.calculator, 'add', a, b)
                 st.session_state.calculation_history.append({
                     "Operation": "Addition",
                     "Input": f"{a} + {b}",
@@ -153,7 +214,7 @@ with col1:
         
         with col_sub:
             if st.button("➖ Subtract", key="sub"):
-                result = st.session_state.calculator.subtract(a, b)
+                result = dispatch(st.session_state.calculator, 'subtract', a, b)
                 st.session_state.calculation_history.append({
                     "Operation": "Subtraction",
                     "Input": f"{a} - {b}",
@@ -164,7 +225,7 @@ with col1:
         
         with col_mul:
             if st.button("✖️ Multiply", key="mul"):
-                result = st.session_state.calculator.multiply(a, b)
+                result = dispatch(st.session_state.calculator, 'multiply', a, b)
                 st.session_state.calculation_history.append({
                     "Operation": "Multiplication",
                     "Input": f"{a} × {b}",
@@ -175,7 +236,7 @@ with col1:
         
         with col_div:
             if st.button("➗ Divide", key="div"):
-                result = st.session_state.calculator.divide(a, b)
+                result = dispatch(st.session_state.calculator, 'divide', a, b)
                 st.session_state.calculation_history.append({
                     "Operation": "Division",
                     "Input": f"{a} ÷ {b}",
@@ -188,7 +249,7 @@ with col1:
         st.markdown("#### 🔢 Advanced Mathematical Operations")
         
         operation = st.selectbox("Select Operation", [
-            "Power (a^b)", "Square Root", "Modulo", "Factorial"
+            "Power (a^b)", "Modular Power", "Square Root", "Modulo", "Factorial"
         ])
         
         if operation == "Power (a^b)":
@@ -199,7 +260,7 @@ with col1:
                 b = st.number_input("Exponent", value=2.0, step=0.1)
             
             if st.button("🔢 Calculate Power", key="power"):
-                result = st.session_state.calculator.power(a, b)
+                result = dispatch(st.session_state.calculator, 'power', a, b)
                 st.session_state.calculation_history.append({
                     "Operation": "Power",
                     "Input": f"{a}^{b}",
@@ -208,10 +269,32 @@ with col1:
                 })
                 st.success(f"Result: {result}")
         
+        elif operation == "Modular Power":
+            col_a, col_b, col_m = st.columns(3)
+            with col_a:
+                a = st.text_input("Base", value="4")
+            with col_b:
+                b = st.text_input("Exponent", value="13")
+            with col_m:
+                m = st.text_input("Modulus", value="497")
+            
+            if st.button("🔐 Calculate Modular Power", key="powmod"):
+                try:
+                    result = dispatch(st.session_state.calculator, 'powmod', int(a), int(b), int(m))
+                except ValueError:
+                    result = "Error: Modular power only for integers!"
+                st.session_state.calculation_history.append({
+                    "Operation": "Modular Power",
+                    "Input": f"{a}^{b} mod {m}",
+                    "Result": result,
+                    "Timestamp": pd.Timestamp.now()
+                })
+                st.success(f"Result: {format_number(result)}")
+        
         elif operation == "Square Root":
             a = st.number_input("Number", value=16.0, step=0.1)
             if st.button("√ Calculate Square Root", key="sqrt"):
-                result = st.session_state.calculator.square_root(a)
+                result = dispatch(st.session_state.calculator, 'square_root', a)
                 st.session_state.calculation_history.append({
                     "Operation": "Square Root",
                     "Input": f"√{a}",
@@ -228,7 +311,7 @@ with col1:
                 b = st.number_input("Divisor", value=3.0, step=0.1)
             
             if st.button("% Calculate Modulo", key="mod"):
-                result = st.session_state.calculator.modulo(a, b)
+                result = dispatch(st.session_state.calculator, 'modulo', a, b)
                 st.session_state.calculation_history.append({
                     "Operation": "Modulo",
                     "Input": f"{a} % {b}",
@@ -238,9 +321,9 @@ with col1:
                 st.success(f"Result: {result}")
         
         elif operation == "Factorial":
-            a = st.number_input("Integer", value=5, step=1, min_value=0, max_value=170)
+            a = st.number_input("Integer", value=5, step=1, min_value=0, max_value=FACTORIALS.max_n)
             if st.button("! Calculate Factorial", key="fact"):
-                result = st.session_state.calculator.factorial(int(a))
+                result = format_number(dispatch(st.session_state.calculator, 'factorial', int(a)))
                 st.session_state.calculation_history.append({
                     "Operation": "Factorial",
                     "Input": f"{int(a)}!",
@@ -259,7 +342,7 @@ with col1:
         
         with col_sin:
             if st.button("sin", key="sin"):
-                result = st.session_state.calculator.sine(angle)
+                result = dispatch(st.session_state.calculator, 'sine', angle)
                 st.session_state.calculation_history.append({
                     "Operation": "Sine",
                     "Input": f"sin({angle})",
@@ -270,7 +353,7 @@ with col1:
         
         with col_cos:
             if st.button("cos", key="cos"):
-                result = st.session_state.calculator.cosine(angle)
+                result = dispatch(st.session_state.calculator, 'cosine', angle)
                 st.session_state.calculation_history.append({
                     "Operation": "Cosine",
                     "Input": f"cos({angle})",
@@ -281,7 +364,7 @@ with col1:
         
         with col_tan:
             if st.button("tan", key="tan"):
-                result = st.session_state.calculator.tangent(angle)
+                result = dispatch(st.session_state.calculator, 'tangent', angle)
                 st.session_state.calculation_history.append({
                     "Operation": "Tangent",
                     "Input": f"tan({angle})",
@@ -301,6 +384,25 @@ with col1:
             radians_input = st.number_input("Radians", value=math.pi/2, step=0.1)
             degrees_output = radians_input * 180 / math.pi
             st.write(f"Degrees: {degrees_output:.2f}°")
+        
+        with st.expander("📋 Angle Table"):
+            col_start, col_stop, col_step = st.columns(3)
+            with col_start:
+                start_degrees = st.number_input("From (°)", value=0.0, step=15.0)
+            with col_stop:
+                stop_degrees = st.number_input("To (°)", value=360.0, step=15.0)
+            with col_step:
+                step_degrees = st.number_input("Step (°)", value=15.0, min_value=0.001, step=5.0)
+            try:
+                degrees_axis = axis("degrees", start_degrees, stop_degrees, step_degrees)
+            except ValueError as e:
+                st.error(f"Error: {e}")
+            else:
+                radians_axis = Axis("radians", degrees_axis.values * (math.pi / 180))
+                angle_table = pd.DataFrame({"Degrees": degrees_axis.values, "Radians": radians_axis.values})
+                for name, operation in [("sin", "sine"), ("cos", "cosine"), ("tan", "tangent")]:
+                    angle_table[name] = tabulate(operation, radians_axis).values
+                st.dataframe(angle_table, use_container_width=True)
     
     elif operation_type == "Logarithmic":
         st.markdown("#### 📊 Logarithmic Functions")
@@ -315,7 +417,7 @@ with col1:
                 base = st.number_input("Base", value=10.0, step=0.1)
             
             if st.button("log Calculate Logarithm", key="log"):
-                result = st.session_state.calculator.logarithm(number, base)
+                result = dispatch(st.session_state.calculator, 'logarithm', number, base)
                 st.session_state.calculation_history.append({
                     "Operation": "Logarithm",
                     "Input": f"log_{base}({number})",
@@ -327,7 +429,7 @@ with col1:
         else:  # Natural Logarithm
             number = st.number_input("Number", value=math.e, step=0.1)
             if st.button("ln Calculate Natural Log", key="ln"):
-                result = st.session_state.calculator.natural_log(number)
+                result = dispatch(st.session_state.calculator, 'natural_log', number)
                 st.session_state.calculation_history.append({
                     "Operation": "Natural Log",
                     "Input": f"ln({number})",
@@ -336,6 +438,196 @@ with col1:
                 })
                 st.success(f"Result: {result}")
     
+    elif operation_type == "Expression":
+        st.markdown("#### 🧩 Expression")
+        
+        expression = st.text_input("Expression", value="2*sin(x) + log(y, 3)")
+        col_x, col_y = st.columns(2)
+        with col_x:
+            x = st.number_input("x", value=1.0, step=0.1)
+        with col_y:
+            y = st.number_input("y", value=9.0, step=0.1)
+        
+        if st.button("= Evaluate", key="evaluate"):
+            result = st.session_state.calculator.evaluate(expression, x=x, y=y)
+            st.session_state.calculation_history.append({
+                "Operation": "Expression",
+                "Input": expression,
+                "Result": result,
+                "Timestamp": pd.Timestamp.now()
+            })
+            st.success(f"Result: {result}")
+    
+    elif operation_type == "Integration":
+        st.markdown("#### ∫ Integration")
+        
+        integrand = st.text_input("Integrand in x", value="sin(x)^2")
+        col_a, col_b = st.columns(2)
+        with col_a:
+            lower = st.text_input("Lower limit", value="0", help="A number, or -inf")
+        with col_b:
+            upper = st.text_input("Upper limit", value="pi", help="A number, or inf")
+        method = st.radio("Method", ["gauss-kronrod", "tanh-sinh"], horizontal=True)
+        
+        if st.button("∫ Integrate", key="integrate"):
+            try:
+                # Limits may be expressions of constants, such as pi/2
+                limits = [float(text) if "inf" in text else st.session_state.calculator.evaluate(text)
+                          for text in (lower, upper)]
+            except ValueError as e:
+                limits = [f"Error: {e}"]
+            error = next((limit for limit in limits if isinstance(limit, str)), None)
+            result = error or st.session_state.calculator.integrate(integrand, *limits, method=method)
+            st.session_state.calculation_history.append({
+                "Operation": "Integration",
+                "Input": f"∫ {integrand} dx from {lower} to {upper}",
+                "Result": result,
+                "Timestamp": pd.Timestamp.now()
+            })
+            if isinstance(result, str):
+                st.error(result)
+            else:
+                st.success(f"Result: {result}")
+    
+    elif operation_type == "Equation Solver":
+        st.markdown("#### 🎯 Equation Solver")
+        
+        equation = st.text_input("Equation in x", value="x^3 - 2*x = 5")
+        method = st.radio("Method", ["brent", "newton", "all"], horizontal=True,
+                          format_func={"brent": "Brent (bracket)", "newton": "Newton (start point)",
+                                       "all": "All roots in interval"}.get)
+        if method == "newton":
+            x0 = st.number_input("Starting point", value=2.0, step=0.1)
+        else:
+            col_a, col_b = st.columns(2)
+            with col_a:
+                lower = st.number_input("Interval start", value=2.0, step=0.1)
+            with col_b:
+                upper = st.number_input("Interval end", value=3.0, step=0.1)
+        max_iterations = st.slider("Iteration limit", 10, 1000, 100)
+        
+        if st.button("🎯 Solve", key="solve"):
+            if method == "newton":
+                result = st.session_state.calculator.solve(equation, method, x0=x0,
+                                                           max_iterations=max_iterations)
+            else:
+                result = st.session_state.calculator.solve(equation, method, lower, upper,
+                                                            max_iterations=max_iterations)
+            st.session_state.calculation_history.append({
+                "Operation": "Equation Solver",
+                "Input": equation,
+                "Result": result,
+                "Timestamp": pd.Timestamp.now()
+            })
+            if isinstance(result, str):
+                st.error(result)
+            elif isinstance(result, list):
+                st.success(f"{len(result)} root(s) found")
+                st.dataframe(pd.DataFrame({"x": result}), use_container_width=True)
+            else:
+                st.success(f"x = {result}")
+    
+    elif operation_type == "Statistics":
+        st.markdown("#### 📐 Statistics")
+        
+        numbers_text = st.text_area("Numbers (separated by spaces, commas or new lines)",
+                                    value="4 8 15 16 23 42")
+        uploaded = st.file_uploader("...or upload a CSV / text file", type=["csv", "txt"])
+        
+        if st.button("Σ Summarize", key="summarize"):
+            stats = StreamStats()
+            try:
+                if uploaded is not None:
+                    stats.consume(parse_numbers(io.TextIOWrapper(uploaded, encoding="utf-8")))
+                else:
+                    stats.consume(parse_numbers(numbers_text.splitlines()))
+            except ValueError as e:
+                st.error(f"Error: {e}")
+            else:
+                summary = stats.summary()
+                metric_cols = st.columns(4)
+                for column, name in zip(metric_cols, ["count", "mean", "stdev", "sum"]):
+                    with column:
+                        st.metric(name.capitalize(), summary[name])
+                st.dataframe(pd.DataFrame(
+                    [(name, summary[name]) for name in ["min", "max", "variance", "product"]]
+                    + list(summary["quantiles"].items()),
+                    columns=["Statistic", "Value"]
+                ), use_container_width=True)
+                st.session_state.calculation_history.append({
+                    "Operation": "Statistics",
+                    "Input": f"{summary['count']} values",
+                    "Result": f"mean {summary['mean']}",
+                    "Timestamp": pd.Timestamp.now()
+                })
+    
+    elif operation_type == "Tables & Plots":
+        st.markdown("#### 📋 Tables & Plots")
+        
+        targets = [f"{op.title} ({op.name})" for op in OPERATION_LIST if op.vectorized] + ["Custom expression"]
+        choice = st.selectbox("Function", targets)
+        if choice == "Custom expression":
+            target = st.text_input("Expression in x (and y)", value="sin(x) * cos(y)")
+        else:
+            target = choice.rsplit("(", 1)[1].rstrip(")")
+        x_range = st.text_input("x range", value="0:2*pi:65j",
+                                help="start:stop:step, or start:stop:Nj for N points; limits may use pi and e")
+        y_range = st.text_input("y range (optional, for two-variable functions)", value="")
+        
+        try:
+            table = tabulate(target, *parse_ranges([spec for spec in (x_range, y_range) if spec.strip()]))
+        except ValueError as e:
+            st.error(f"Error: {e}")
+        else:
+            x_axis = table.axes[0]
+            if len(table.axes) == 1:
+                frame = pd.DataFrame({x_axis.name: x_axis.values, "result": table.values})
+                st.plotly_chart(px.line(frame, x=x_axis.name, y="result", title=target),
+                                use_container_width=True)
+            else:
+                y_axis = table.axes[1]
+                frame = pd.DataFrame(table.values, index=pd.Index(x_axis.values, name=x_axis.name),
+                                     columns=pd.Index(y_axis.values, name=y_axis.name))
+                st.plotly_chart(px.imshow(table.values.T, x=x_axis.values, y=y_axis.values, origin="lower",
+                                          labels={"x": x_axis.name, "y": y_axis.name}, title=target),
+                                use_container_width=True)
+            st.dataframe(frame, use_container_width=True)
+            if table.errors.any():
+                st.warning(f"{int(table.errors.sum())} point(s) outside the function's domain")
+            csv_text = io.StringIO()
+            write_csv(csv_text, target, *table.axes)
+            st.download_button("💾 Download CSV", csv_text.getvalue(), file_name="table.csv", mime="text/csv")
+    
+    elif operation_type == "Matrices":
+        st.markdown("#### 🔢 Matrices")
+        
+        operation = st.selectbox("Operation", ["determinant", "inverse", "solve", "multiply", "transpose",
+                                               "qr", "cholesky", "svd", "eigen", "rank"])
+        st.caption(MATRIX_OPERATIONS[operation].description)
+        first = st.text_area("Matrix A (rows separated by ';' or new lines)", value="4 1\n1 3")
+        operands = [first]
+        if MATRIX_OPERATIONS[operation].arity == 2:
+            operands.append(st.text_area("b (vector or matrix)" if operation == "solve" else "Matrix B",
+                                         value="1 2"))
+        
+        if st.button("🔢 Compute", key="matrix"):
+            results = st.session_state.calculator.matrix(operation, *operands)
+            if isinstance(results, str):
+                st.error(results)
+            else:
+                for name, value in results.items():
+                    if np.ndim(value):
+                        st.markdown(f"**{name}**")
+                        st.dataframe(pd.DataFrame(np.atleast_2d(value)), use_container_width=True)
+                    else:
+                        st.metric(name, value)
+                st.session_state.calculation_history.append({
+                    "Operation": "Matrices",
+                    "Input": operation,
+                    "Result": ", ".join(f"{name}={value}" for name, value in summarize_matrix(results).items()),
+                    "Timestamp": pd.Timestamp.now()
+                })
+    
     else:  # Other Functions
         st.markdown("#### 🔧 Other Functions")
         
@@ -344,7 +636,7 @@ with col1:
         if other_function == "Absolute Value":
             number = st.number_input("Number", value=-5.0, step=0.1)
             if st.button("|x| Calculate Absolute Value", key="abs"):
-                result = st.session_state.calculator.absolute(number)
+                result = dispatch(st.session_state.calculator, 'absolute', number)
                 st.session_state.calculation_history.append({
                     "Operation": "Absolute Value",
                     "Input": f"|{number}|",
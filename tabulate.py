@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Grid Tabulation
+Evaluates a Calculator operation or an expression over one or more ranges
+in vectorized passes: whole grids for tables and plots, or lazy chunks and
+streamed CSV for grids too large to hold in memory
+"""
+
+import csv
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from calculator import OPERATIONS
+from expression import ExpressionError, compile_expression
+from vectorized import compile_array_expression, evaluate_batch
+
+Axis = namedtuple("Axis", ["name", "values"])
+Table = namedtuple("Table", ["axes", "values", "errors"])
+# One slice of the flattened grid: flat index of its first point, one
+# coordinate array per axis, and the results
+Chunk = namedtuple("Chunk", ["start", "coordinates", "values", "errors"])
+
+# Grid points per chunk for tabulate_chunks and write_csv
+DEFAULT_CHUNK = 65536
+# Largest grid tabulate() builds in memory; larger grids go through chunks
+MAX_TABLE_SIZE = 10000000
+# Points allowed on one axis (axes are held in memory even when the grid is streamed)
+MAX_AXIS_POINTS = 10000000
+# Default axis names for ranges given without one
+AXIS_NAMES = ('x', 'y', 'z')
+
+
+class GridTooLarge(ValueError):
+    """Raised by parse_ranges when the grid would have more than its max_points"""
+
+
+def _number(text):
+    """A number or constant expression such as "2*pi" """
+    try:
+        return float(text)
+    except ValueError:
+        compiled = compile_expression(text.strip())
+        if compiled.variables:
+            raise ExpressionError(f"Range limits must be constant, got {text.strip()!r}") from None
+        try:
+            return float(compiled.function())
+        except OverflowError:
+            raise ExpressionError(f"Range limit {text.strip()!r} is out of range") from None
+
+
+def _points(start, stop, step=None, count=None):
+    """(start, stop, step, count) of an axis, checked, with the count worked
+    out from the step, so the size is known before any array is built"""
+    start, stop = float(start), float(stop)
+    if not (math.isfinite(start) and math.isfinite(stop)):
+        raise ValueError("Range limits must be finite")
+    if count is None:
+        step = 1.0 if step is None else float(step)
+        if step == 0 or not math.isfinite(step) or (stop - start) / step < 0:
+            raise ValueError(f"Step {step:g} does not lead from {start:g} to {stop:g}")
+        steps = (stop - start) / step
+        if steps >= MAX_AXIS_POINTS:  # also an infinite number of steps
+            raise ValueError(f"A range needs 1 to {MAX_AXIS_POINTS} points, got more")
+        # The tolerance keeps stop itself when rounding leaves it a hair past the last step
+        count = math.floor(steps * (1 + 1e-12) + 1e-9) + 1
+    if not 1 <= count <= MAX_AXIS_POINTS:
+        raise ValueError(f"A range needs 1 to {MAX_AXIS_POINTS} points, got {count}")
+    return start, stop, step, int(count)
+
+
+def _build(name, start, stop, step, count):
+    if step is None:
+        return Axis(name, np.linspace(start, stop, count))
+    return Axis(name, start + step * np.arange(count))
+
+
+def axis(name, start, stop, step=None, count=None):
+    """An Axis from start to stop (inclusive) by `step`, or with `count` evenly spaced points"""
+    return _build(name, *_points(start, stop, step, count))
+
+
+def _range_spec(spec, name):
+    """(name, start, stop, step, count) of a range spec, checked but not built"""
+    if '=' in spec:
+        name, spec = (part.strip() for part in spec.split('=', 1))
+    parts = spec.split(':')
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Range {spec!r} is not start:stop[:step] or start:stop:Nj")
+    start, stop = _number(parts[0]), _number(parts[1])
+    if len(parts) == 3 and parts[2].strip().lower().endswith('j'):
+        return (name, *_points(start, stop, count=int(parts[2].strip()[:-1])))
+    return (name, *_points(start, stop, _number(parts[2]) if len(parts) == 3 else None))
+
+
+def parse_range(spec, name=AXIS_NAMES[0]):
+    """Axis from "[name=]start:stop[:step]", or "start:stop:Nj" for N points
+    (NumPy's mgrid convention). Limits may be constant expressions: "0:2*pi:65j"."""
+    return _build(*_range_spec(spec, name))
+
+
+def parse_ranges(specs, max_points=None):
+    """Axes for several range specs; unnamed ones are x, y, z, then x4, x5, ...
+
+    With `max_points`, raises GridTooLarge as soon as the specs read so far
+    span more grid points, before any axis is built.
+    """
+    ranges = []
+    size = 1
+    for i, spec in enumerate(specs):
+        ranges.append(_range_spec(spec, AXIS_NAMES[i] if i < len(AXIS_NAMES) else f"x{i + 1}"))
+        size *= ranges[-1][-1]
+        if max_points is not None and size > max_points:
+            raise GridTooLarge(f"At most {max_points} points per table, got {size} or more")
+    return [_build(*spec) for spec in ranges]
+
+
+def grid_shape(axes):
+    return tuple(len(a.values) for a in axes)
+
+
+def _evaluator(target, axes, fast_math=False):
+    """function(*coordinates) -> (values, errors) for an operation name or expression.
+
+    Operations take the axes positionally (logarithm's base axis is
+    optional); expressions bind their variables to axes by name.
+    """
+    op = OPERATIONS.get(target)
+    if op is not None and op.vectorized is not None:
+        if not op.required <= len(axes) <= op.arity:
+            raise ValueError(f"'{target}' takes {op.arity} range(s), got {len(axes)}")
+
+        def operation(*coordinates):
+            a, b = (coordinates + (None,))[:2]
+            return evaluate_batch(op.vectorized, a, b, op.domain, fast_math)
+        return operation
+
+    compiled = compile_array_expression(target)
+    names = [a.name for a in axes]
+    missing = [name for name in compiled.variables if name not in names]
+    if missing:
+        raise ExpressionError(f"No range given for variable(s) {', '.join(missing)}")
+    if len(set(names)) != len(names):
+        raise ValueError("Range names must be unique")
+
+    def expression(*coordinates):
+        with np.errstate(all='ignore'):
+            values = np.asarray(compiled(**dict(zip(names, coordinates))), dtype=np.float64)
+        return values, ~np.isfinite(values)
+    return expression
+
+
+def tabulate(target, *axes, fast_math=False):
+    """Evaluate `target` (an operation name such as 'sin' or an expression
+    such as "x^2 + y") on the grid spanned by `axes`.
+
+    The grid is never materialized as coordinates: each axis is broadcast
+    along its own dimension. Returns a Table whose values and errors have
+    one dimension per axis; values at errors are NaN.
+    """
+    if not axes:
+        raise ValueError("At least one range is needed")
+    shape = grid_shape(axes)
+    size = math.prod(shape)
+    if size > MAX_TABLE_SIZE:
+        raise ValueError(f"Grid of {size} points is larger than {MAX_TABLE_SIZE}; "
+                         f"use tabulate_chunks or write_csv")
+    evaluate = _evaluator(target, axes, fast_math)
+    values, errors = evaluate(*np.ix_(*(a.values for a in axes)))
+    values = np.array(np.broadcast_to(values, shape))
+    errors = np.array(np.broadcast_to(errors, shape))
+    values[errors] = np.nan
+    return Table(axes, values, errors)
+
+
+def tabulate_chunks(target, *axes, chunk_size=DEFAULT_CHUNK, fast_math=False):
+    """Lazily evaluate `target` over the grid in row-major order, yielding a
+    Chunk per `chunk_size` points, so memory stays constant in the grid size"""
+    if not axes:
+        raise ValueError("At least one range is needed")
+    # Validate now, not on the first next()
+    return _chunks(_evaluator(target, axes, fast_math), axes, chunk_size)
+
+
+def _chunks(evaluate, axes, chunk_size):
+    shape = grid_shape(axes)
+    size = math.prod(shape)
+    for start in range(0, size, chunk_size):
+        indices = np.unravel_index(np.arange(start, min(start + chunk_size, size)), shape)
+        coordinates = tuple(a.values[index] for a, index in zip(axes, indices))
+        values, errors = evaluate(*coordinates)
+        values = np.array(np.broadcast_to(values, coordinates[0].shape))
+        errors = np.broadcast_to(errors, values.shape)
+        values[errors] = np.nan
+        yield Chunk(start, coordinates, values, errors)
+
+
+def write_csv(file, target, *axes, chunk_size=DEFAULT_CHUNK, fast_math=False):
+    """Stream the grid to an open text file as CSV: one column per axis and a
+    'result' column, with "Error" for domain errors. Returns the row count.
+
+    Formatting floats dominates the cost, so each axis value is formatted
+    once and only the results are formatted per row.
+    """
+    chunks = tabulate_chunks(target, *axes, chunk_size=chunk_size, fast_math=fast_math)
+    writer = csv.writer(file)
+    writer.writerow([a.name for a in axes] + ['result'])
+    labels = [np.array([repr(value) for value in a.values.tolist()], dtype=object) for a in axes]
+    shape = grid_shape(axes)
+    row = ",".join(["{}"] * (len(axes) + 1)) + "\r\n"
+    rows = 0
+    for chunk in chunks:
+        results = [repr(value) for value in chunk.values.tolist()]
+        for index in np.flatnonzero(chunk.errors):
+            results[index] = "Error"
+        indices = np.unravel_index(np.arange(chunk.start, chunk.start + len(results)), shape)
+        columns = [label[index].tolist() for label, index in zip(labels, indices)]
+        file.write("".join(map(row.format, *columns, results)))
+        rows += len(results)
+    return rows
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Vectorized Calculator Kernels
+NumPy implementations of the Calculator operations for whole-array evaluation
+"""
+
+import math
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import fastmath
+from expression import CACHE_SIZE, FUNCTIONS, _compile, _power as _scalar_power
+
+BatchResult = namedtuple("BatchResult", ["values", "errors"])
+
+# 0! .. 170! as doubles; anything larger overflows float64
+FACTORIAL_TABLE = np.array([float(math.factorial(n)) for n in range(171)])
+
+
+def as_array(values):
+    """Convert an array, buffer, sequence or scalar to a float64 array without copying when possible"""
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        return np.frombuffer(values, dtype=np.float64)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _add(a, b):
+    return np.add(a, b), None
+
+
+def _subtract(a, b):
+    return np.subtract(a, b), None
+
+
+def _multiply(a, b):
+    return np.multiply(a, b), None
+
+
+def _divide(a, b):
+    return np.divide(a, b), b == 0
+
+
+def _power(a, b):
+    result = np.power(a, b)
+    # Overflow and complex results (negative base, fractional exponent)
+    errors = ~np.isfinite(result) & np.isfinite(a) & np.isfinite(b)
+    return result, errors
+
+
+def _square_root(a, b):
+    return np.sqrt(a), a < 0
+
+
+def _modulo(a, b):
+    return np.mod(a, b), b == 0
+
+
+def _factorial(a, b):
+    errors = (a < 0) | (a != np.floor(a)) | (a > 170)
+    index = np.where(errors, 0, a).astype(np.intp)
+    return FACTORIAL_TABLE[index], errors
+
+
+def _sine(a, b):
+    return np.sin(a), None
+
+
+def _cosine(a, b):
+    return np.cos(a), None
+
+
+def _tangent(a, b):
+    return np.tan(a), None
+
+
+def _logarithm(a, b):
+    return np.log(a) / np.log(b), (a <= 0) | (b <= 0) | (b == 1)
+
+
+def _natural_log(a, b):
+    return np.log(a), a <= 0
+
+
+def _absolute(a, b):
+    return np.abs(a), None
+
+
+# Kernel table keyed by Calculator method name: (kernel, arity, default second operand)
+KERNELS = {
+    'add': (_add, 2, None),
+    'subtract': (_subtract, 2, None),
+    'multiply': (_multiply, 2, None),
+    'divide': (_divide, 2, None),
+    'power': (_power, 2, None),
+    'square_root': (_square_root, 1, None),
+    'modulo': (_modulo, 2, None),
+    'factorial': (_factorial, 1, None),
+    'sine': (_sine, 1, None),
+    'cosine': (_cosine, 1, None),
+    'tangent': (_tangent, 1, None),
+    'logarithm': (_logarithm, 2, 10.0),
+    'natural_log': (_natural_log, 1, None),
+    'absolute': (_absolute, 1, None),
+}
+
+
+def _fast_sine(a, b):
+    return fastmath.sin(a), None
+
+
+def _fast_cosine(a, b):
+    return fastmath.cos(a), None
+
+
+def _fast_tangent(a, b):
+    return fastmath.tan(a), None
+
+
+def _fast_logarithm(a, b):
+    return fastmath.log(a, b), (a <= 0) | (b <= 0) | (b == 1)
+
+
+def _fast_natural_log(a, b):
+    return fastmath.ln(a), a <= 0
+
+
+# fast_math=True replacements; error bounds are in fastmath.MAX_ERROR
+FAST_KERNELS = {
+    'sine': _fast_sine,
+    'cosine': _fast_cosine,
+    'tangent': _fast_tangent,
+    'logarithm': _fast_logarithm,
+    'natural_log': _fast_natural_log,
+}
+
+
+def evaluate_batch(operation, a, b=None, domain=None, fast_math=False):
+    """Evaluate a Calculator operation over whole arrays.
+
+    `domain` is the operation's registry predicate; elements where it is false
+    are errors, as are any the kernel itself flags (overflow, the 170! float
+    limit). With `fast_math`, trig and log use the fastmath approximations.
+    Returns a BatchResult of (values, errors), where errors is a boolean
+    mask; values at those positions are NaN.
+    """
+    try:
+        kernel, arity, default = KERNELS[operation]
+    except KeyError:
+        raise ValueError(f"Unknown batch operation: {operation}") from None
+    if fast_math:
+        kernel = FAST_KERNELS.get(operation, kernel)
+
+    a = as_array(a)
+    if arity == 2:
+        if b is None:
+            if default is None:
+                raise ValueError(f"Operation '{operation}' needs a second operand")
+            b = default
+        b = as_array(b)
+
+    with np.errstate(all='ignore'):
+        values, errors = kernel(a, b)
+        if domain is not None:
+            invalid = ~np.asarray(domain(a, b if b is not None else 0.0), dtype=bool)
+            errors = invalid if errors is None else errors | invalid
+        values = np.asarray(values, dtype=np.float64)
+        if errors is None:
+            errors = np.zeros(values.shape, dtype=bool)
+        else:
+            errors = np.broadcast_to(errors, values.shape).copy()
+            if errors.any():
+                values = values.copy() if not values.flags.writeable else values
+                values[errors] = np.nan
+
+    return BatchResult(values, errors)
+
+
+# ---------------------------------------------------------------------------
+# Array expressions: the expression language compiled to NumPy calls
+# ---------------------------------------------------------------------------
+
+def _nan_where(invalid, values):
+    """values with NaN wherever the scalar function would raise a domain error"""
+    return np.where(invalid, np.nan, values)
+
+
+def _array_divide(a, b):
+    return _nan_where(np.equal(b, 0), np.true_divide(a, b))
+
+
+def _array_modulo(a, b):
+    return _nan_where(np.equal(b, 0), np.mod(a, b))
+
+
+def _array_sqrt(a):
+    return np.sqrt(a)  # NaN below zero
+
+
+def _array_factorial(a):
+    a = np.asarray(a, dtype=np.float64)
+    invalid = (a < 0) | (a != np.floor(a)) | (a > 170)
+    return _nan_where(invalid, FACTORIAL_TABLE[np.where(invalid, 0, a).astype(np.intp)])
+
+
+def _array_log(a, base=10):
+    invalid = (np.less_equal(a, 0) | np.less_equal(base, 0) | np.equal(base, 1))
+    return _nan_where(invalid, np.log(a) / np.log(base))
+
+
+def _array_ln(a):
+    return _nan_where(np.less_equal(a, 0), np.log(a))
+
+
+_ARRAY_FUNCTIONS = {
+    'sqrt': _array_sqrt,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'log': _array_log,
+    'ln': _array_ln,
+    'abs': np.abs,
+    'factorial': _array_factorial,
+    'pow': np.power,
+    'mod': _array_modulo,
+}
+assert _ARRAY_FUNCTIONS.keys() == FUNCTIONS.keys()
+
+_ARRAY_NAMESPACE = {f"_f_{name}": function for name, function in _ARRAY_FUNCTIONS.items()}
+# Python's ** on arrays; constant integer powers get the scalar size check
+_ARRAY_NAMESPACE.update(_f_divide=_array_divide, _f_modulo=_array_modulo, _f_power=_scalar_power, __builtins__={})
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_array_expression(source):
+    """Compile an expression to a function of NumPy arrays.
+
+    Same language and variable order as expression.compile_expression, but
+    each call evaluates whole arrays: domain errors give NaN elements
+    instead of raising, and the result broadcasts like the inputs (a
+    constant expression returns a scalar). Call under np.errstate to
+    silence the floating-point warnings.
+    """
+    return _compile(source, _ARRAY_NAMESPACE)
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Web API Routes
+Request handling shared by simple_web_calculator, network_calculator and
+async_server: /calculate and the JSON endpoints, so every server exposes
+the same API
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import sys
+import urllib.parse
+import zlib
+
+from calculator import OPERATIONS, dispatch, parse_operand
+from factorial import format_number
+from history import HistoryStore
+from memo import ResultCache, normalize
+from sessions import NoSessions, history_page
+
+# Largest number of values accepted in one /statistics request
+MAX_VALUES = 1000000
+
+# Integrand evaluations allowed per /integrate request, whatever the client asks for
+MAX_INTEGRATION_EVALS = 1000000
+
+# Largest grid returned by one /tabulate request
+MAX_TABLE_POINTS = 100000
+
+# Iteration and sample limits per /solve request
+MAX_SOLVER_ITERATIONS = 10000
+MAX_SOLVER_SAMPLES = 1000000
+
+# Default /calculate/batch limits; the servers' --batch-max-items and
+# --batch-max-bytes options override them
+MAX_BATCH_ITEMS = 100000
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+# Result lines written per block of a streamed batch response
+BATCH_BLOCK_ITEMS = 256
+
+# Default /calculate result cache limits; the servers' --cache-items and
+# --cache-bytes options override them (--cache-items 0 turns it off)
+RESULT_CACHE_ITEMS = 10000
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
+# Rough fixed cost of a cached response (key, tuples, ETag), in bytes
+RESULT_OVERHEAD = 400
+# Every /calculate request must reach the server, since it adds to the
+# client's history: caches may keep a response but must revalidate it
+# (If-None-Match), and shared caches may not keep it
+RESULT_CACHE_CONTROL = 'private, no-cache'
+
+# path -> function(params) returning (status, payload), or (status, payload,
+# content type) for a payload that is already encoded bytes
+ROUTES = {}
+
+JSON_TYPE = 'application/json'
+HTML_TYPE = 'text/html; charset=utf-8'
+NDJSON_TYPE = 'application/x-ndjson'
+# linalg.CONTENT_TYPE, kept here so parsing other bodies does not import NumPy
+MATRIX_TYPE = 'application/x-calc-matrix'
+
+# Seconds a browser may reuse the page without asking; after that it
+# revalidates with If-None-Match and usually gets a 304
+PAGE_MAX_AGE = 300
+
+def route(path):
+    """Register a POST handler for `path`"""
+    def register(function):
+        ROUTES[path] = function
+        return function
+    return register
+
+
+def parse_body(content_type, body):
+    """Request parameters from a JSON object, a binary matrix message or a
+    urlencoded form body"""
+    content_type = content_type.split(';')[0].strip()
+    if content_type == JSON_TYPE:
+        params = json.loads(body or b'{}')
+        if not isinstance(params, dict):
+            raise ValueError("JSON body must be an object")
+        return params
+    if content_type == MATRIX_TYPE:
+        # Operands stay views into the body; see linalg.decode
+        from linalg import decode
+
+        operation, entries = decode(body)
+        return {'operation': operation, 'operands': list(entries.values()), 'binary': True}
+    return parse_query(body.decode())
+
+
+def parse_query(query):
+    """Parameters of a urlencoded query string or form, first value of each"""
+    return {name: values[0] for name, values in urllib.parse.parse_qs(query).items()}
+
+
+def perform_calculation(calculator, operation, *texts):
+    """Result of a registry operation on operand texts, or an error string"""
+    try:
+        op = OPERATIONS.get(operation)
+        if op is None:
+            return "Invalid operation"
+        # Integer operations (factorial, powmod) parse their operands exactly
+        operands = [parse_operand(text, calculator, op.integer_only) for text in texts]
+        return dispatch(calculator, op, *operands)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def calculate(calculator, params):
+    """/calculate response payload for form parameters `operation`, operands
+    `num1`..`num3` and, for operation 'evaluate', `expression` (with num1 and
+    num2 as x and y)"""
+    operation = params.get('operation', '')
+    texts = [params.get(name, '0') for name in ('num1', 'num2', 'num3')]
+    if operation == 'evaluate':
+        num1, num2 = (calculator.parse_number(text) for text in texts[:2])
+        expression = params.get('expression', '')
+        instrumentation = calculator.instrumentation
+        if instrumentation is None:
+            result = calculator.evaluate(expression, x=num1, y=num2)
+        else:
+            result = instrumentation.call('evaluate', lambda: calculator.evaluate(expression, x=num1, y=num2))
+    else:
+        result = perform_calculation(calculator, operation, *texts)
+    return {'result': format_number(result)}
+
+
+def _etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header lists `etag` (weakly) or is *"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def _result_size(value):
+    body, etag, entry = value
+    size = RESULT_OVERHEAD + len(body)
+    if entry is not None:
+        # Operands and result can be big integers (factorial, powmod)
+        size += sys.getsizeof(entry[1]) + sys.getsizeof(entry[2]) + sys.getsizeof(entry[3])
+    return size
+
+
+def result_cache(max_items=RESULT_CACHE_ITEMS, max_bytes=RESULT_CACHE_BYTES):
+    """memo.ResultCache for calculation_response, held to `max_items`
+    responses and about `max_bytes`; None (no cache) when either is 0"""
+    if max_items <= 0 or max_bytes <= 0:
+        return None
+    return ResultCache(max_items, maxbytes=max_bytes, sizeof=_result_size)
+
+
+def _cached_calculation(calculator, params, cache):
+    """(body, ETag) of a pure registry operation's /calculate response, from
+    `cache` or computed and stored; None for requests it does not cache"""
+    op = OPERATIONS.get(params.get('operation', ''))
+    if op is None or not op.pure:
+        return None
+    try:
+        operands = [parse_operand(params.get(name, '0'), calculator, op.integer_only)
+                    for name in ('num1', 'num2', 'num3')[:op.arity]]
+    except Exception:
+        return None  # perform_calculation reports the error
+    # Keyed on the parsed operands, so "2", "2.0" and " 2" share an entry
+    key = (op.code, *map(normalize, operands))
+    history = calculator.history
+    cached = cache.get(key)
+    if cached is not None:
+        body, etag, entry = cached
+        if entry is not None:
+            history.record(*entry[:4])
+        return body, etag
+    before = history.recorded
+    try:
+        result = dispatch(calculator, op, *operands)
+    except Exception as e:
+        result = f"Error: {str(e)}"
+    body = _encode_json({'result': format_number(result)}).encode()
+    etag = _etag(body)
+    cache.put(key, (body, etag, history.last() if history.recorded != before else None))
+    return body, etag
+
+
+def calculation_response(calculator, params, cache=None, if_none_match=''):
+    """(status, [(header, value)], body) for /calculate with form parameters
+    `params` (see calculate).
+
+    With a `cache` (see result_cache), pure registry operations are
+    answered from it when the same normalized request was answered before;
+    a hit records the history entry the calculation would have. Responses
+    carry an ETag and RESULT_CACHE_CONTROL, and a matching If-None-Match
+    gets 304 with no body, after the calculation is recorded.
+    """
+    cached = _cached_calculation(calculator, params, cache) if cache is not None else None
+    if cached is None:
+        body = _encode_json(calculate(calculator, params)).encode()
+        etag = _etag(body)
+    else:
+        body, etag = cached
+    headers = [('ETag', etag), ('Cache-Control', RESULT_CACHE_CONTROL)]
+    if etag_matches(if_none_match, etag):
+        return 304, headers, b''
+    return 200, headers + [('Content-Type', JSON_TYPE)], body
+
+
+def cache_stats(cache):
+    """GET /cache: (status, payload) of the result cache's counters"""
+    if cache is None:
+        return 404, {'error': 'The result cache is off (start the server with --cache-items above 0)'}
+    return 200, cache.stats()
+
+
+def json_safe(value):
+    """Replace non-finite floats (not valid JSON) with None, recursively"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {name: json_safe(item) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    return value
+
+
+_decode_json = json.JSONDecoder().decode
+_encode_json = json.JSONEncoder().encode
+
+
+def _batch_operand(value, calculator, integer):
+    # JSON numbers go straight to the calculator, which converts them for its
+    # numeric mode; integers stay exact, as in Python
+    if type(value) is float or type(value) is int:
+        return value
+    if isinstance(value, str):
+        return parse_operand(value, calculator, integer)
+    raise TypeError(f"operands must be numbers or numeric strings, got {json.dumps(value)}")
+
+
+def _batch_item(calculator, item):
+    """Result of one batch item (an error string on failure)"""
+    if isinstance(item, str):
+        item = _decode_json(item)
+    if not isinstance(item, dict):
+        raise TypeError("each item must be an object")
+    name = item.get('operation', '')
+    if name == 'evaluate':
+        return calculator.evaluate(item['expression'], **item.get('variables', {}))
+    op = OPERATIONS.get(name)
+    if op is None:
+        return f"Error: Unknown operation '{name}'"
+    operands = item.get('operands')
+    if operands is None:
+        operands = [item[key] for key in ('num1', 'num2', 'num3') if key in item]
+    if not isinstance(operands, list) or not op.required <= len(operands) <= op.arity:
+        return f"Error: '{name}' takes {op.arity} operand(s)"
+    return dispatch(calculator, op, *(_batch_operand(value, calculator, op.integer_only) for value in operands))
+
+
+def _batch_lines(calculator, items):
+    """NDJSON result lines, BATCH_BLOCK_ITEMS to a bytes block"""
+    encode = _encode_json
+    block = []
+    for index, item in enumerate(items):
+        try:
+            result = _batch_item(calculator, item)
+        except KeyError as e:
+            result = f"Error: Missing parameter {e}"
+        except (ValueError, TypeError, ArithmeticError) as e:
+            result = f"Error: {e}"
+        # Formatted directly: json.dumps on a dict per line costs more than the operation
+        if isinstance(result, str) and result.startswith("Error"):
+            block.append(f'{{"index": {index}, "error": {encode(result.removeprefix("Error: "))}}}')
+        else:
+            block.append(f'{{"index": {index}, "result": {encode(format_number(result))}}}')
+        if len(block) == BATCH_BLOCK_ITEMS:
+            block.append('')
+            yield '\n'.join(block).encode()
+            block.clear()
+    if block:
+        block.append('')
+        yield '\n'.join(block).encode()
+
+
+def calculate_batch(calculator, body, max_items=MAX_BATCH_ITEMS):
+    """/calculate/batch: run a JSON array or NDJSON stream of operations.
+
+    Items are objects like /calculate's form, with the operands as a list:
+    {"operation": "power", "operands": [2, 10]}. num1..num3 fields also
+    work, and {"operation": "evaluate", "expression": "x*y", "variables":
+    {"x": 2, "y": 3}} evaluates an expression. Returns (status, content
+    type, body). On success the body is an iterator of NDJSON blocks, one
+    {"index": i, "result": ...} or {"index": i, "error": ...} line per
+    item, computed as the blocks are consumed so the caller can stream them.
+    NDJSON lines are parsed as they are reached, so a malformed line fails
+    only its own item.
+    """
+    try:
+        text = body.decode()
+    except UnicodeDecodeError:
+        return 400, JSON_TYPE, json.dumps({'error': "Batch body must be UTF-8"}).encode()
+    if text.lstrip()[:1] == '[':
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            return 400, JSON_TYPE, json.dumps({'error': f"Invalid JSON array: {e}"}).encode()
+    else:
+        items = [line for line in text.split('\n') if line.strip()]
+    if len(items) > max_items:
+        return 413, JSON_TYPE, json.dumps({'error': f"At most {max_items} operations per batch, "
+                                                    f"got {len(items)}"}).encode()
+    return 200, NDJSON_TYPE, _batch_lines(calculator, items)
+
+
+def session_history(sessions, token, query):
+    """GET /history: a page of the session's history, selected by the query
+    parameters `after` or `before` (entry numbers) and `limit`; see
+    sessions.history_page. An unknown session has no entries."""
+    if isinstance(sessions, NoSessions):
+        return 404, {'error': "Sessions are off with --workers: each worker process has its own memory"}
+    params = parse_query(query)
+    try:
+        cursors = {name: int(params[name]) for name in ('after', 'before', 'limit') if name in params}
+    except ValueError:
+        return 400, {'error': "after, before and limit must be integers"}
+    session = sessions.get(token) if token else None
+    return 200, history_page(session.history if session is not None else HistoryStore(0), **cursors)
+
+
+def add_batch_arguments(parser):
+    """--batch-max-items and --batch-max-bytes, for the servers' command lines"""
+    parser.add_argument("--batch-max-items", type=int, default=MAX_BATCH_ITEMS, metavar="N",
+                        help=f"most operations in one /calculate/batch request (default {MAX_BATCH_ITEMS})")
+    parser.add_argument("--batch-max-bytes", type=int, default=MAX_BATCH_BYTES, metavar="N",
+                        help=f"largest /calculate/batch request body (default {MAX_BATCH_BYTES})")
+
+
+def add_cache_arguments(parser):
+    """--cache-items and --cache-bytes, for the servers' command lines"""
+    parser.add_argument("--cache-items", type=int, default=RESULT_CACHE_ITEMS, metavar="N",
+                        help=f"/calculate responses kept in the result cache, 0 for none "
+                             f"(default {RESULT_CACHE_ITEMS})")
+    parser.add_argument("--cache-bytes", type=int, default=RESULT_CACHE_BYTES, metavar="N",
+                        help=f"memory for the result cache (default {RESULT_CACHE_BYTES})")
+
+
+def handle(path, content_type, body):
+    """Run the route for `path`; returns (status, content type, body bytes)"""
+    try:
+        status, payload, *encoded = ROUTES[path](parse_body(content_type, body))
+    except KeyError as e:
+        status, payload, encoded = 400, {'error': f"Missing parameter {e}"}, None
+    except (ValueError, TypeError, ArithmeticError) as e:
+        status, payload, encoded = 400, {'error': str(e)}, None
+    if encoded:
+        return status, encoded[0], payload
+    return status, JSON_TYPE, json.dumps(json_safe(payload)).encode()
+
+
+def _brotli():
+    """The optional brotli module, or None"""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _accepted_encodings(header):
+    """{content coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.lower().split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class StaticPage:
+    """A page rendered, encoded and compressed once, for serving from memory.
+
+    Holds the identity bytes plus gzip and brotli variants (deflate when
+    the brotli package is not installed), each with its own strong ETag.
+    respond() picks a variant by Accept-Encoding and answers a matching
+    If-None-Match with 304 and no body.
+    """
+
+    # Server preference among encodings the client accepts equally
+    PREFERENCE = ('br', 'gzip', 'deflate', 'identity')
+
+    def __init__(self, html, content_type=HTML_TYPE, max_age=PAGE_MAX_AGE):
+        body = html.encode()
+        self.content_type = content_type
+        self.cache_control = f"public, max-age={max_age}"
+        self.variants = {'identity': body, 'gzip': gzip.compress(body, 9, mtime=0)}
+        brotli = _brotli()
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body, quality=11)
+        else:
+            self.variants['deflate'] = zlib.compress(body, 9)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {encoding: f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+                      for encoding in self.variants}
+
+    def encoding(self, accept_encoding):
+        """Best variant for an Accept-Encoding header: highest q, then PREFERENCE"""
+        accepted = _accepted_encodings(accept_encoding or '')
+        wildcard = accepted.get('*', 0.0)
+        choices = [(accepted.get(encoding, wildcard), -self.PREFERENCE.index(encoding), encoding)
+                   for encoding in self.variants]
+        q, _, encoding = max(choices)
+        # identity is the fallback even when not listed (or refused: there is nothing else to send)
+        return encoding if q > 0 else 'identity'
+
+    def respond(self, accept_encoding='', if_none_match=''):
+        """(status, [(header, value)], body) for a GET of the page"""
+        encoding = self.encoding(accept_encoding)
+        etag = self.etags[encoding]
+        headers = [('ETag', etag), ('Cache-Control', self.cache_control), ('Vary', 'Accept-Encoding')]
+        if etag_matches(if_none_match, etag):
+            return 304, headers, b''
+        headers.append(('Content-Type', self.content_type))
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        return 200, headers, self.variants[encoding]
+
+
+@route('/statistics')
+def statistics(params):
+    """Summary statistics of `values`: a JSON list of numbers, or text of numbers
+    separated by whitespace or commas. Optional `quantiles`: list or comma-separated."""
+    from stream_stats import DEFAULT_QUANTILES, StreamStats, parse_numbers
+
+    values = params.get('values', '')
+    if isinstance(values, str):
+        values = list(parse_numbers(values.splitlines()))
+    if len(values) > MAX_VALUES:
+        return 413, {'error': f"At most {MAX_VALUES} values per request"}
+    quantiles = params.get('quantiles', DEFAULT_QUANTILES)
+    if isinstance(quantiles, str):
+        quantiles = [float(q) for q in quantiles.split(',') if q.strip()]
+    stats = StreamStats()
+    stats.update_array(values)
+    return 200, stats.summary(quantiles)
+
+
+@route('/integrate')
+def integral(params):
+    """Integral of `expression` over `variable` (default x) from `a` to `b`; the
+    limits may be "inf"/"-inf". Optional `method` ('gauss-kronrod' or
+    'tanh-sinh'), `tol` and `max_evals` (capped at MAX_INTEGRATION_EVALS);
+    any other parameter sets a variable of the expression."""
+    from integrate import DEFAULT_MAX_EVALS, DEFAULT_METHOD, DEFAULT_TOLERANCE, integrate_expression
+
+    params = dict(params)
+    expression = params.pop('expression')
+    a, b = float(params.pop('a')), float(params.pop('b'))
+    variable = params.pop('variable', 'x')
+    method = params.pop('method', DEFAULT_METHOD)
+    tol = float(params.pop('tol', DEFAULT_TOLERANCE))
+    max_evals = min(int(params.pop('max_evals', DEFAULT_MAX_EVALS)), MAX_INTEGRATION_EVALS)
+    result = integrate_expression(expression, a, b, variable, method, tol, max_evals, **params)
+    return 200, result._asdict()
+
+
+@route('/solve')
+def solve(params):
+    """Root of `equation` ("lhs = rhs", or an expression equal to zero) in
+    `variable` (default x). `method` 'brent' (default) and 'all' need the
+    interval `a`, `b`; 'newton' needs `x0` and takes an optional `derivative`
+    expression. Optional `max_iterations` and, for 'all', `samples` are
+    capped at MAX_SOLVER_ITERATIONS and MAX_SOLVER_SAMPLES. Any other
+    parameter sets a variable of the equation."""
+    from solver import DEFAULT_MAX_ITERATIONS, DEFAULT_METHOD, DEFAULT_SAMPLES, solve_equation
+
+    params = dict(params)
+    equation = params.pop('equation')
+    method = params.pop('method', DEFAULT_METHOD)
+    limits = {name: float(params.pop(name)) for name in ('a', 'b', 'x0') if name in params}
+    variable = params.pop('variable', 'x')
+    derivative = params.pop('derivative', None) or None
+    samples = min(int(params.pop('samples', DEFAULT_SAMPLES)), MAX_SOLVER_SAMPLES)
+    max_iterations = min(int(params.pop('max_iterations', DEFAULT_MAX_ITERATIONS)), MAX_SOLVER_ITERATIONS)
+    result = solve_equation(equation, method, variable=variable, derivative=derivative, samples=samples,
+                            max_iterations=max_iterations, **limits, **params)
+    return 200, {name: value.tolist() if hasattr(value, 'tolist') else value
+                 for name, value in result._asdict().items()}
+
+
+@route('/tabulate')
+def table(params):
+    """Grid of `target` (an operation name or expression) over `ranges`: a JSON
+    list of range specs such as "x=0:2*pi:65j", or specs separated by ';'.
+    Returns the axis values and the nested list of results (null for errors)."""
+    from tabulate import GridTooLarge, parse_ranges, tabulate
+
+    ranges = params.get('ranges', '')
+    if isinstance(ranges, str):
+        ranges = [spec for spec in ranges.split(';') if spec.strip()]
+    try:
+        axes = parse_ranges(ranges, MAX_TABLE_POINTS)
+    except GridTooLarge as e:
+        return 413, {'error': str(e)}
+    result = tabulate(params['target'], *axes)
+    return 200, {'axes': {a.name: a.values.tolist() for a in result.axes},
+                 'values': result.values.tolist()}
+
+
+@route('/matrix')
+def matrix(params):
+    """Linear algebra `operation` (see linalg.OPERATIONS) on `operands`.
+
+    With a JSON body the operands are nested lists (or text such as
+    "1 2; 3 4") and the results come back as JSON. With a binary matrix body
+    (Content-Type application/x-calc-matrix, see linalg.encode) the results
+    come back in the same format, so large matrices are never parsed or
+    formatted as text.
+    """
+    from linalg import CONTENT_TYPE, compute, encode
+
+    operation = params['operation']
+    operands = params['operands']
+    if not isinstance(operands, list):
+        raise ValueError(f"operands must be a list of matrices, sent as {JSON_TYPE} or {MATRIX_TYPE}")
+    results = compute(operation, *operands)
+    if params.get('binary'):
+        return 200, encode(operation, results), CONTENT_TYPE
+    return 200, {'operation': operation,
+                 'results': {name: value.tolist() if hasattr(value, 'tolist') else value
+                             for name, value in results.items()}}